@@ -0,0 +1,199 @@
+"""Benchmark harness for generate_docx.py
+
+Renders synthetic payloads (see make_payload.py) of increasing size, each in a
+fresh process, and records wall time, peak RSS, output size and the per-stage
+breakdown of --profile runs (fastest of the repeats). Results can be stored as a
+baseline and later runs compared against it; regressions beyond the threshold
+make the run fail.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from make_payload import make_payload
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_GENERATOR = os.path.join(BENCHMARKS_DIR, '..', 'public', 'generate_docx.py')
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+# Differences below these floors are treated as noise whatever their ratio
+NOISE_FLOORS = {'wall_ms': 20.0, 'peak_rss_kb': 4096, 'output_bytes': 1024, 'stage_ms': 10.0}
+
+def generator_command(generator):
+    """Command line prefix running a generator script or a built executable"""
+    if generator.endswith('.py'):
+        return [sys.executable, generator]
+    return [generator]
+
+def run_generator(command, payload_path, output_path, extra_args=()):
+    """Run one generation; returns (wall ms, peak RSS in KiB or None)"""
+    args = command + [payload_path, output_path, '--log-level', 'WARNING', *extra_args]
+    started = time.perf_counter()
+    process = subprocess.Popen(args)
+    if hasattr(os, 'wait4'):
+        # wait4 reports the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        peak_rss_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    else:
+        process.wait()
+        peak_rss_kb = None
+    wall_ms = (time.perf_counter() - started) * 1000
+    if process.returncode != 0:
+        raise RuntimeError(f'generator failed with code {process.returncode}: {" ".join(args)}')
+    return wall_ms, peak_rss_kb
+
+def stage_group(name):
+    """Fold per-category hazard table spans into one stage"""
+    return 'hazard_tables' if name.startswith('section:hazards:') else name
+
+def profile_stages(report):
+    """Sum the wall time of the top-level profile spans and headers per stage"""
+    stages = {}
+    for span in report['spans']:
+        if span['depth'] == 0 or span['name'] == 'header':
+            group = stage_group(span['name'])
+            stages[group] = round(stages.get(group, 0.0) + span['wall_ms'], 2)
+    return stages
+
+def bench_size(command, hazards, repeat, work_dir):
+    """Benchmark one payload size"""
+    payload_path = os.path.join(work_dir, f'payload_{hazards}.json')
+    output_path = os.path.join(work_dir, f'report_{hazards}.docx')
+    profile_path = os.path.join(work_dir, f'profile_{hazards}.json')
+    with open(payload_path, 'w', encoding='utf-8') as f:
+        json.dump(make_payload(hazards), f, ensure_ascii=False)
+    
+    walls = []
+    peaks = []
+    for _ in range(repeat):
+        wall_ms, peak_rss_kb = run_generator(command, payload_path, output_path)
+        walls.append(wall_ms)
+        if peak_rss_kb is not None:
+            peaks.append(peak_rss_kb)
+    
+    # Separate runs for the stage breakdown, as allocation tracing slows rendering down
+    stages = {}
+    for _ in range(repeat):
+        run_generator(command, payload_path, output_path, ['--profile', profile_path])
+        with open(profile_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        for stage, ms in profile_stages(report).items():
+            stages[stage] = min(ms, stages.get(stage, ms))
+    
+    return {
+        'hazards': hazards,
+        'wall_ms': round(statistics.median(walls), 1),
+        'wall_ms_min': round(min(walls), 1),
+        'peak_rss_kb': max(peaks) if peaks else report.get('peak_rss_kb'),
+        'output_bytes': os.path.getsize(output_path),
+        'traced_peak_kb': report.get('traced_peak_kb'),
+        'stages': stages
+    }
+
+def print_results(results):
+    """Print a summary table and the stage breakdown of each size"""
+    print(f"{'hazards':>8} {'wall ms':>10} {'min ms':>10} {'peak RSS KiB':>13} {'output bytes':>13}")
+    for result in results:
+        print(f"{result['hazards']:>8} {result['wall_ms']:>10.1f} {result['wall_ms_min']:>10.1f} "
+              f"{result['peak_rss_kb'] or 0:>13} {result['output_bytes']:>13}")
+    print()
+    print('Stages (fastest profiled run, ms):')
+    for result in results:
+        slowest = sorted(result['stages'].items(), key=lambda item: item[1], reverse=True)
+        print(f"  {result['hazards']:>6}: " + ', '.join(f'{name} {ms:.1f}' for name, ms in slowest[:6]))
+
+def compare(results, baseline, threshold):
+    """Return the regressions of results against a baseline, as readable lines"""
+    regressions = []
+    previous = {entry['hazards']: entry for entry in baseline['results']}
+    
+    def check(label, current, reference, floor):
+        if current is None or not reference:
+            return
+        if current - reference > floor and current > reference * (1 + threshold):
+            regressions.append(f'{label}: {reference} -> {current} (+{(current / reference - 1) * 100:.0f}%)')
+    
+    for result in results:
+        reference = previous.get(result['hazards'])
+        if reference is None:
+            continue
+        size = f"{result['hazards']} hazards"
+        # The fastest run is the least sensitive to machine noise
+        check(f'{size} wall ms', result['wall_ms_min'], reference['wall_ms_min'], NOISE_FLOORS['wall_ms'])
+        check(f'{size} peak RSS KiB', result['peak_rss_kb'], reference['peak_rss_kb'], NOISE_FLOORS['peak_rss_kb'])
+        check(f'{size} output bytes', result['output_bytes'], reference['output_bytes'], NOISE_FLOORS['output_bytes'])
+        for stage, ms in result['stages'].items():
+            check(f'{size} stage {stage} ms', ms, reference['stages'].get(stage), NOISE_FLOORS['stage_ms'])
+    return regressions
+
+def main():
+    """Run the benchmark, optionally storing or comparing against a baseline"""
+    parser = argparse.ArgumentParser(description='Benchmark generate_docx.py on synthetic payloads.')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated hazard counts (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs, and profiled runs, per size (default: 3)')
+    parser.add_argument('--generator', default=DEFAULT_GENERATOR,
+                        help='generate_docx.py or a built generate_docx executable')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file (default: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='regression threshold in percent (default: 20)')
+    parser.add_argument('--json', metavar='PATH', help='also write the results to PATH')
+    args = parser.parse_args()
+    
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    command = generator_command(args.generator)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='hazid-bench-') as work_dir:
+        for hazards in sizes:
+            print(f'Benchmarking {hazards} hazards...', flush=True)
+            results.append(bench_size(command, hazards, args.repeat, work_dir))
+    
+    run = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'generator': os.path.basename(args.generator),
+        'repeat': args.repeat,
+        'results': results
+    }
+    print()
+    print_results(results)
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+    
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+        print(f'\nBaseline saved to {args.baseline}')
+        return 0
+    
+    if not os.path.exists(args.baseline):
+        print(f'\nNo baseline at {args.baseline}; run with --save-baseline to store one.')
+        return 0
+    
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('platform') != run['platform']:
+        print(f"\nWarning: baseline recorded on {baseline.get('platform')}, comparing anyway.")
+    regressions = compare(results, baseline, args.threshold / 100)
+    if regressions:
+        print(f'\nRegressions beyond {args.threshold:.0f}%:')
+        for line in regressions:
+            print(f'  {line}')
+        return 1
+    print(f'\nNo regressions beyond {args.threshold:.0f}% against {args.baseline}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Synthetic payload generator for benchmarking generate_docx.py
+
+Payloads have the shape the app sends to generate_hazard_document: the form
+fields, a hazard definitions catalogue, hazardDetails grouped by category with
+"<category>_<index>" sub-hazard ids, contactData and uploadedFiles.
+"""
+import argparse
+import json
+import random
+import sys
+
+# Hazard categories of the CMS Safety catalogue
+CATEGORIES = [
+    'Chemical', 'Mechanical', 'Non ionizing radiation', 'Ionizing radiation', 'Fire',
+    'Electrical', 'Biological', 'Work conditions', 'Emergency preparedness',
+    'Environmental protection', 'Other Hazards'
+]
+
+WORDS = (
+    'access alarm area beam cable chamber clearance crane cryogenic detector '
+    'electrical emergency equipment evacuation exposure gas helium installation '
+    'ladder lifting magnet maintenance nitrogen operation oxygen platform pressure '
+    'procedure protection radiation risk scaffolding shielding supervision tooling '
+    'training transport vacuum ventilation welding work zone'
+).split()
+
+WEB_CONTACTS = [
+    {'title': 'CERN HSE', 'url': 'https://hse.cern/', 'description': 'Website'},
+    {'title': 'Contacts CMS Safety', 'url': 'https://cmssafety.web.cern.ch/who-are-we', 'description': 'group of CMS Safety referents'},
+    {'title': 'CMS RP', 'url': 'https://cmssafety.web.cern.ch/radiation-protection', 'description': 'CMS radiation protection information'},
+    {'title': 'CERN Learning Hub', 'url': 'https://lms.cern.ch/', 'description': 'for the catalogue and registration to available training courses'},
+    {'title': 'IMPACT', 'url': 'https://impact.cern.ch/impact/secure/', 'description': 'tool for the declaration of an activity'}
+]
+
+EMAIL_CONTACTS = [
+    {'email': 'Cms-safety@cern.ch', 'description': 'group of CMS Safety (TC, LEXGLIMOS, DLEXGLIMOS)'},
+    {'email': 'Cms-rso@cern.ch', 'description': 'group of CMS Radiation Safety Officers (RSO, DRSO)'}
+]
+
+def sentence(rng, min_words=6, max_words=18):
+    """Return a random sentence made of catalogue vocabulary"""
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return ' '.join(words).capitalize() + '.'
+
+def paragraph(rng, sentences):
+    """Return a paragraph of the given number of sentences"""
+    return ' '.join(sentence(rng) for _ in range(sentences))
+
+def category_names(hazard_count):
+    """Return the categories used for a payload, adding synthetic ones for large catalogues"""
+    names = list(CATEGORIES)
+    # Keep categories to roughly 50 sub-hazards each, like the real catalogue
+    for index in range(len(names), max(len(names), hazard_count // 50)):
+        names.append(f'Category {index + 1}')
+    return names
+
+def make_payload(hazard_count, seed=0, selected_ratio=0.6):
+    """Build a payload with hazard_count sub-hazards spread over the hazard categories"""
+    rng = random.Random(seed)
+    categories = category_names(hazard_count)
+    
+    hazard_details = {}
+    for index in range(hazard_count):
+        category = categories[index % len(categories)]
+        sub_hazards = hazard_details.setdefault(category, {})
+        hazard_id = f'{category}_{len(sub_hazards)}'
+        measures = '\n'.join(sentence(rng) for _ in range(rng.randint(1, 4)))
+        sub_hazards[hazard_id] = {
+            'selected': rng.random() < selected_ratio,
+            'name': sentence(rng, 2, 5).rstrip('.'),
+            'details': paragraph(rng, rng.randint(1, 3)),
+            'recommendations': measures if rng.random() < 0.5 else '',
+            'defaultRecommendations': measures
+        }
+    
+    selected = [category for category, sub_hazards in hazard_details.items()
+                if any(hazard['selected'] for hazard in sub_hazards.values())]
+    
+    definitions = []
+    for index, category in enumerate(categories, 1):
+        definitions.append({
+            'section': f'§ 4.{index}',
+            'hazard': category,
+            'definition': paragraph(rng, 2),
+            # Most catalogue references are links, a few are plain text
+            'ref': f"https://hse.cern/{category.lower().replace(' ', '-')}" if index % 5 else 'See HSE rules'
+        })
+    
+    return {
+        'title': 'Replacement of the endcap muon chambers',
+        'creatorName': 'Benchmark Author',
+        'creatorDepartment': 'EP-CMX',
+        'responsiblePerson': 'Activity Responsible',
+        'participantCount': '6',
+        'startDate': '2026-01-12',
+        'endDate': '2026-03-27T00:00:00Z',
+        'building': '3562',
+        'room': 'R-012',
+        'location': 'Point 5',
+        'cernSupport': 'EN-HE',
+        'cmsSupport': 'Muon integration team',
+        'reference': 'CMS-HAZID-BENCH',
+        'edms': '2999999',
+        'validity': 'EDMS',
+        'activityDescription': '\n'.join(paragraph(rng, 6) for _ in range(8)),
+        'safetyDocuments': 'VIC, risk assessment, lifting plan',
+        'technicalDocuments': 'Tooling drawings',
+        'otherDocuments': 'Work procedure',
+        'hseSupport': 'HSE-RP',
+        'referenceDocuments': 'RP survey report',
+        'selectedHazards': selected,
+        'hazardDetails': hazard_details,
+        'hazardDefinitions': definitions,
+        'contactData': {'webContacts': WEB_CONTACTS, 'emailContacts': EMAIL_CONTACTS},
+        'uploadedFiles': []
+    }
+
+def main():
+    """Write a synthetic payload to a file or stdout"""
+    parser = argparse.ArgumentParser(description='Generate a synthetic generate_docx payload.')
+    parser.add_argument('hazards', type=int, help='number of sub-hazards')
+    parser.add_argument('output', nargs='?', default='-', help="output JSON file, or '-' for stdout")
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--selected', type=float, default=0.6, help='share of selected sub-hazards (default: 0.6)')
+    args = parser.parse_args()
+    
+    payload = make_payload(args.hazards, args.seed, args.selected)
+    if args.output == '-':
+        json.dump(payload, sys.stdout, ensure_ascii=False)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+if __name__ == '__main__':
+    main()
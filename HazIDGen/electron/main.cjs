@@ -544,6 +544,11 @@ app.on('window-all-closed', () => {
   }
 });
 
+app.on('will-quit', () => {
+  // Stop the warm document generation worker, if one was started
+  require('../public/hazard-document-generator.cjs').shutdownWarmWorker();
+});
+
 // IPC Handlers);
 
 
@@ -773,6 +778,17 @@ ipcMain.handle('export-document', async (event, data) => {
   }
 });
 
+ipcMain.handle('preview-document', async (event, data) => {
+  try {
+    const hazardDocGenerator = require('../public/hazard-document-generator.cjs');
+    const html = await hazardDocGenerator.previewHazardDocument(data);
+    return { success: true, html };
+  } catch (error) {
+    console.error('Error previewing document:', error);
+    return { success: false, error: error.message };
+  }
+});
+
 ipcMain.handle('open-external', async (event, url) => {
   try {
     await shell.openExternal(url);
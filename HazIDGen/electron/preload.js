@@ -9,6 +9,7 @@ contextBridge.exposeInMainWorld('electronAPI', {
   loadDraft: () => ipcRenderer.invoke('load-draft'),
   selectFile: (options) => ipcRenderer.invoke('select-file', options),
   exportDocument: (data) => ipcRenderer.invoke('export-document', data),
+  previewDocument: (data) => ipcRenderer.invoke('preview-document', data),
   openExternal: (url) => ipcRenderer.invoke('open-external', url),
   showMessageDialog: (options) => ipcRenderer.invoke('show-message-dialog', options),
   
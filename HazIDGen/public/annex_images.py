@@ -0,0 +1,112 @@
+"""Annex pictures for generate_docx.py
+
+Photos attached in the DocumentUpload step (uploadedFiles saved to disk) are
+embedded in the "ANNEX: PICTURES" section. Identical files are found by the
+SHA-256 of their content and processed once. Each picture is decoded, downscaled
+to fit the page text area and re-encoded in a thread pool, and the result is
+spooled to a scratch directory, so the backends read one picture at a time when
+they write the package and the originals are never held in memory together.
+
+Pillow is imported only when a report has pictures; without it the annex keeps
+its text and the pictures are left out with a warning.
+"""
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('generate_docx')
+
+# Re-encoding quality of JPEG pictures (1-95)
+DEFAULT_QUALITY = 85
+# Resolution of the downscaled pictures, and the largest area they may cover on the page, in inches
+ANNEX_DPI = 150
+MAX_WIDTH = 7.5
+MAX_HEIGHT = 8.5
+EMU_PER_INCH = 914400
+
+_READ_CHUNK = 1024 * 1024
+
+class AnnexImage:
+    """Processed picture: file name, content digest, spooled file and display size in EMU"""
+    __slots__ = ('name', 'digest', 'path', 'width', 'height')
+    
+    def __init__(self, name, digest, path, width, height):
+        self.name = name
+        self.digest = digest
+        self.path = path
+        self.width = width
+        self.height = height
+
+def file_digest(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def scan_files(files):
+    """Return the (name, digest, path) of the distinct readable pictures of annex_files(), in upload order"""
+    pictures = []
+    seen = set()
+    for name, path in files:
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            logger.warning(f"Annex picture {name} cannot be read, skipped: {e}")
+            continue
+        if digest in seen:
+            logger.debug(f"Annex picture {name} is a duplicate, embedded once")
+            continue
+        seen.add(digest)
+        pictures.append((name, digest, path))
+    return pictures
+
+def _downscale(source, directory, digest, quality):
+    """Decode, fit to the page and re-encode one picture; returns (path, width, height) in pixels"""
+    from PIL import Image, ImageOps
+    
+    max_size = (round(MAX_WIDTH * ANNEX_DPI), round(MAX_HEIGHT * ANNEX_DPI))
+    with Image.open(source) as image:
+        # JPEG pictures are decoded straight at a reduced scale when much larger than needed
+        image.draft('RGB', max_size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(max_size, Image.LANCZOS)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            path = os.path.join(directory, f'{digest}.png')
+            image.save(path, 'PNG', optimize=True)
+        else:
+            path = os.path.join(directory, f'{digest}.jpeg')
+            image.convert('RGB').save(path, 'JPEG', quality=quality, optimize=True)
+        return path, image.width, image.height
+
+def _display_size(width, height):
+    """Size in EMU of a picture shown at ANNEX_DPI"""
+    return round(width * EMU_PER_INCH / ANNEX_DPI), round(height * EMU_PER_INCH / ANNEX_DPI)
+
+def prepare_images(pictures, directory, quality=DEFAULT_QUALITY, workers=None):
+    """Downscale the pictures of scan_files() into directory; returns their AnnexImage in the same order
+    
+    Pictures that cannot be decoded are skipped with a warning.
+    """
+    if not pictures:
+        return []
+    try:
+        import PIL.Image  # noqa: F401
+    except ImportError:
+        logger.warning(f"Pillow is not installed, {len(pictures)} annex picture(s) left out of the report")
+        return []
+    
+    workers = workers or min(len(pictures), os.cpu_count() or 1)
+    images = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_downscale, path, directory, digest, quality) for _, digest, path in pictures]
+        for (name, digest, _), future in zip(pictures, futures):
+            try:
+                path, width, height = future.result()
+            except Exception as e:
+                logger.warning(f"Annex picture {name} cannot be decoded, skipped: {e}")
+                continue
+            images.append(AnnexImage(name, digest, path, *_display_size(width, height)))
+    return images
@@ -0,0 +1,359 @@
+"""Compiled hazard catalogue for generate_docx.py
+
+Reads the hazard definitions ("HSE Sheet") and the preventive and protective
+measures ("ENG List of hazards") straight from the CMS Safety workbook, the way
+src/utils/hazardLoader.js does, and keeps the result in a compact binary cache.
+The cache is invalidated by the workbook's mtime and size, then by its SHA-256,
+so touching the file without changing it only refreshes the cache header.
+"""
+import hashlib
+import io
+import logging
+import marshal
+import os
+import re
+import struct
+import tempfile
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger('generate_docx')
+
+CATALOGUE_WORKBOOK = 'CMS_Safety-List_Preventive_Protective_Measures.xlsx'
+DEFINITIONS_SHEET = 'HSE Sheet'
+MEASURES_SHEET = 'ENG List of hazards'
+# The measures sheet starts with a title row, its header is the second row
+MEASURES_HEADER_ROW = 1
+
+# Bump when the compiled layout changes, so older cache files are recompiled
+CACHE_FORMAT = 1
+CACHE_MAGIC = b'HZCAT'
+_CACHE_HEADER = struct.Struct('<5sHqq32s')
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_DOC_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+# Same tables as hazardLoader.js
+SECTION_MAP = {
+    'chemical': '§ 4.1',
+    'mechanical': '§ 4.2',
+    'non ionizing radiation': '§ 4.3',
+    'ionizing radiation': '§ 4.4',
+    'fire': '§ 4.5',
+    'electrical': '§ 4.6',
+    'biological': '§ 4.7',
+    'work conditions': '§ 4.8',
+    'emergency preparedness': '§ 4.9',
+    'environmental protection': '§ 5'
+}
+DEFAULT_SECTION = '§ 4.10'
+DEFAULT_REF = 'Link HSE'
+
+FALLBACK_DEFINITIONS = {
+    'chemical': 'All hazardous situations involving chemicals (product whether marketed or not, of natural origin or manufactured, used or emitted in different forms (solid, powder, liquid, gas, dust, smoke, fog, particles, fibers, etc.)), in the conditions of use and/or exposure.',
+    'mechanical': 'All dangerous situations involving moving parts that can come into contact with a part of the human body and cause injury. These elements are often related to equipment or machines but can also relate to tools, parts, loads, projections of materials or fluids.',
+    'non ionizing radiation': 'A type of low-energy radiation that does not have enough energy to remove an electron (negative particle) from an atom or molecule. Non-ionizing radiation includes visible, infrared and ultraviolet light; microwave; radio waves; and radio frequency energy from cell phones.',
+    'ionizing radiation': 'Ionizing radiation consists of charged particles (e.g. positive or negative electrons, protons or other heavy ions and/or uncharged particles (e.g. photons or neutrons) capable of causing process ionization primary or secondary Ionizing radiation can be direct and indirect.',
+    'fire': 'Set of dangerous situations involving elements that can trigger an uncontrolled fire, the main characteristic of which is to spread.',
+    'electrical': 'All dangerous situations involving the risk of contact, direct or otherwise, with a bare live part, the risk of short circuits, and the risk of electric arcing. Its consequences are electrification, electrocution, fire, explosion ...',
+    'biological': 'All dangerous situations involving organisms or substances derived from an organism which represent a threat to health. This includes wastes, microorganisms, viruses or toxins.',
+    'work conditions': 'All dangerous situations concerning the entire working environment as well as ergonomics.',
+    'emergency preparedness': 'Set of dangerous situations involving all elements that may have an impact on the response to emergency situations',
+    'environmental protection': 'Activity interacting or likely to interact with the environment (environment in which an organism operates, including air, water, soil, natural resources, flora, fauna, humans and their interrelationships)'
+}
+
+# Compiled catalogues of this process, per workbook path: (mtime_ns, size, catalogue)
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+class Workbook:
+    """Minimal streaming reader for the cell values of an .xlsx workbook"""
+    
+    def __init__(self, source):
+        self.zip = zipfile.ZipFile(source)
+        self.shared_strings = self._read_shared_strings()
+        self.sheets = self._read_sheet_paths()
+    
+    def close(self):
+        self.zip.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def _read_shared_strings(self):
+        try:
+            stream = self.zip.open('xl/sharedStrings.xml')
+        except KeyError:
+            return []
+        strings = []
+        with stream:
+            for _, element in ET.iterparse(stream):
+                if element.tag == _MAIN_NS + 'si':
+                    # Rich text strings are split into runs, each with its own <t>
+                    strings.append(''.join(t.text or '' for t in element.iter(_MAIN_NS + 't')))
+                    element.clear()
+        return strings
+    
+    def _read_sheet_paths(self):
+        rels = ET.fromstring(self.zip.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(_REL_NS + 'Relationship')}
+        workbook = ET.fromstring(self.zip.read('xl/workbook.xml'))
+        sheets = {}
+        for sheet in workbook.iter(_MAIN_NS + 'sheet'):
+            target = targets.get(sheet.get(_DOC_REL_NS + 'id'), '')
+            sheets[sheet.get('name')] = target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+        return sheets
+    
+    def _cell_value(self, cell):
+        cell_type = cell.get('t', 'n')
+        if cell_type == 'inlineStr':
+            return ''.join(t.text or '' for t in cell.iter(_MAIN_NS + 't'))
+        value = cell.find(_MAIN_NS + 'v')
+        if value is None or value.text is None:
+            return None
+        text = value.text
+        if cell_type == 's':
+            return self.shared_strings[int(text)]
+        if cell_type == 'b':
+            return text == '1'
+        if cell_type == 'n':
+            number = float(text)
+            return int(number) if number.is_integer() else number
+        return text
+    
+    def rows(self, sheet_name):
+        """Yield (row index, {column index: value}) for the non-empty rows of a sheet"""
+        if sheet_name not in self.sheets:
+            raise KeyError(f"Sheet '{sheet_name}' not found in the workbook")
+        with self.zip.open(self.sheets[sheet_name]) as stream:
+            next_row = 0
+            for _, element in ET.iterparse(stream):
+                if element.tag != _MAIN_NS + 'row':
+                    continue
+                row_index = int(element.get('r', next_row + 1)) - 1
+                next_row = row_index + 1
+                values = {}
+                next_column = 0
+                for cell in element.iter(_MAIN_NS + 'c'):
+                    match = _CELL_REF.match(cell.get('r', ''))
+                    column = column_index(match.group(1)) if match else next_column
+                    next_column = column + 1
+                    value = self._cell_value(cell)
+                    if value is not None and value != '':
+                        values[column] = value
+                element.clear()
+                if values:
+                    yield row_index, values
+    
+    def records(self, sheet_name, header_row=0):
+        """Yield the rows below header_row as dicts keyed by header, like SheetJS sheet_to_json"""
+        header = None
+        for row_index, values in self.rows(sheet_name):
+            if row_index < header_row:
+                continue
+            if header is None:
+                header = sheet_header(values)
+                continue
+            yield {name: values.get(column, '') for column, name in header.items()}
+
+def column_index(letters):
+    """Return the zero-based index of a column given by its letters ('A' is 0)"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+def sheet_header(values):
+    """Map column indexes to header names, suffixing duplicates the way SheetJS does"""
+    header = {}
+    seen = {}
+    for column in range(max(values) + 1):
+        name = str(values.get(column, '')).strip() or '__EMPTY'
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        header[column] = name if count == 0 else f'{name}_{count}'
+    return header
+
+def normalize_hazard_name(name):
+    """Normalize a category name like hazardLoader.js normalizeHazardName"""
+    name = name.lower().replace('non-ionizing', 'non ionizing').replace('other hazards', 'others')
+    return re.sub(r'\s+', ' ', name).strip()
+
+def _text(value):
+    return str(value).strip() if value is not None else ''
+
+def compile_catalogue(source, version):
+    """Compile the workbook at source (path or bytes) into a catalogue dict"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    definitions_map = {}
+    links_map = {}
+    hazards = {}
+    measure_keys = {}
+    with Workbook(source) as workbook:
+        for item in workbook.records(DEFINITIONS_SHEET):
+            original_key = _text(item.get('Hazard Category') or item.get('Category')).lower()
+            keys = [original_key]
+            normalized_key = normalize_hazard_name(original_key)
+            if normalized_key != original_key:
+                keys.append(normalized_key)
+            definition = _text(item.get('Definition'))
+            link = _text(item.get('HSE Link(s)') or item.get('HSE Link'))
+            for key in keys:
+                if key and link:
+                    links_map[key] = link
+                if key and definition:
+                    definitions_map[key] = definition
+        
+        for item in workbook.records(MEASURES_SHEET, MEASURES_HEADER_ROW):
+            category = _text(item.get('Hazards'))
+            specific_hazard = _text(item.get('Specific Hazards'))
+            measures = _text(item.get('Safety Measures'))
+            if not category or category == 'Hazards' or not specific_hazard:
+                continue
+            entries = hazards.setdefault(category, [])
+            position = measure_keys.get((category, specific_hazard))
+            if position is None:
+                measure_keys[(category, specific_hazard)] = len(entries)
+                entries.append([specific_hazard, measures])
+            elif measures and measures not in entries[position][1]:
+                entries[position][1] += '\n\n' + measures
+    
+    if not definitions_map:
+        definitions_map = dict(FALLBACK_DEFINITIONS)
+    
+    definitions = []
+    for category, definition in definitions_map.items():
+        name = category[:1].upper() + category[1:]
+        if category == 'other hazards':
+            name = 'Other Hazards'
+        definitions.append({
+            'section': SECTION_MAP.get(category, DEFAULT_SECTION),
+            'hazard': name,
+            'definition': definition,
+            'ref': links_map.get(category, DEFAULT_REF)
+        })
+    
+    return {'version': version, 'definitions': definitions, 'hazards': hazards}
+
+class Catalogue:
+    """Compiled catalogue with the lookups generate_docx.py needs"""
+    
+    def __init__(self, compiled, path=None):
+        self.version = compiled['version']
+        self.definitions = compiled['definitions']
+        self.hazards = compiled['hazards']
+        self.path = path
+        self._by_name = {}
+        for category, entries in self.hazards.items():
+            for name, measures in entries:
+                self._by_name[(category.lower(), name.lower())] = measures
+    
+    def default_recommendations(self, category, hazard_id=None, name=None):
+        """Return the catalogue measures of a sub-hazard, or None if it is not catalogued
+        
+        Sub-hazards are found by their "<category>_<index>" id, as assigned by the
+        form, or else by category and name.
+        """
+        entries = self.hazards.get(category)
+        if entries and hazard_id and hazard_id.startswith(f'{category}_'):
+            index = hazard_id[len(category) + 1:]
+            if index.isdigit() and int(index) < len(entries):
+                entry_name, measures = entries[int(index)]
+                if not name or entry_name == name:
+                    return measures
+        if name:
+            return self._by_name.get((category.lower(), name.lower()))
+        return None
+    
+    def stats(self):
+        return {
+            'version': self.version,
+            'source': self.path,
+            'definitions': len(self.definitions),
+            'categories': len(self.hazards),
+            'hazards': sum(len(entries) for entries in self.hazards.values())
+        }
+
+def default_cache_dir():
+    return os.path.join(tempfile.gettempdir(), 'hazid-catalogue')
+
+def _cache_path(path, cache_dir, extension='cat'):
+    name = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{name}.{extension}')
+
+def _read_cache(cache_path, magic=CACHE_MAGIC, fmt=CACHE_FORMAT):
+    """Return (header fields, body bytes) of a cache file, or None if unusable"""
+    try:
+        with open(cache_path, 'rb') as f:
+            blob = f.read()
+        cache_magic, cache_fmt, mtime_ns, size, digest = _CACHE_HEADER.unpack_from(blob)
+    except (OSError, struct.error):
+        return None
+    if cache_magic != magic or cache_fmt != fmt:
+        return None
+    return (mtime_ns, size, digest), blob[_CACHE_HEADER.size:]
+
+def _write_cache(cache_path, stat, digest, body, magic=CACHE_MAGIC, fmt=CACHE_FORMAT):
+    header = _CACHE_HEADER.pack(magic, fmt, stat.st_mtime_ns, stat.st_size, digest)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=os.path.dirname(cache_path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header + body)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Cannot write the workbook cache {cache_path}: {e}")
+
+def load_compiled(path, stat, compile_workbook, cache_dir=None, extension='cat', magic=CACHE_MAGIC,
+                  fmt=CACHE_FORMAT):
+    """Return compile_workbook(source bytes, version) for the workbook at path, through the cache file
+    
+    The cache file is reused while the workbook's stat (mtime and size) matches,
+    then while its SHA-256 does. extension, magic and fmt tell apart the caches
+    of different compilers of the same workbook.
+    """
+    cache_path = _cache_path(path, cache_dir or default_cache_dir(), extension)
+    cached = _read_cache(cache_path, magic, fmt)
+    compiled = None
+    if cached and cached[0][:2] == (stat.st_mtime_ns, stat.st_size):
+        compiled = _unmarshal(cached[1])
+    if compiled is None:
+        with open(path, 'rb') as f:
+            source = f.read()
+        digest = hashlib.sha256(source).digest()
+        if cached and cached[0][2] == digest:
+            compiled = _unmarshal(cached[1])
+            if compiled is not None:
+                # Same content under a new mtime: only the header is stale
+                _write_cache(cache_path, stat, digest, cached[1], magic, fmt)
+        if compiled is None:
+            logger.debug(f"Compiling {path}")
+            compiled = compile_workbook(source, digest.hex()[:16])
+            _write_cache(cache_path, stat, digest, marshal.dumps(compiled), magic, fmt)
+    return compiled
+
+def load_catalogue(path, cache_dir=None):
+    """Return the Catalogue of a workbook, compiling it only when the workbook changed"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    with _loaded_lock:
+        loaded = _loaded.get(path)
+        if loaded and loaded[:2] == (stat.st_mtime_ns, stat.st_size):
+            return loaded[2]
+        
+        catalogue = Catalogue(load_compiled(path, stat, compile_catalogue, cache_dir), path)
+        _loaded[path] = (stat.st_mtime_ns, stat.st_size, catalogue)
+        return catalogue
+
+def _unmarshal(body):
+    try:
+        return marshal.loads(body)
+    except (EOFError, ValueError, TypeError):
+        return None
@@ -1,116 +1,1011 @@
+import argparse
+import collections.abc
+import contextlib
+import copy
+import hashlib
+import io
 import json
+import logging
+import multiprocessing
+import platform
 import sys
 import os
-from datetime import datetime
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT
-from docx.oxml.shared import OxmlElement, qn
-from docx.oxml.ns import nsdecls
-from docx.oxml import parse_xml
-
-def merge_cells_horizontally(table, row_idx, start_col, end_col):
-    """Merge cells horizontally in a table row"""
+import shutil
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import tracemalloc
+import weakref
+import zipfile
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import annex_images
+import excel_catalogue
+import html_preview
+import location_reference
+import ooxml_writer
+import package_writer
+import payload_stream
+import report_model
+import report_patch
+from report_content import (
+    ANNEX_HEADING, ANNEX_TEXT, AREA_HEADING, CONTACTS_HEADING,
+    DEFAULT_EMAIL_CONTACTS, DEFAULT_WEB_CONTACTS, DEFINITIONS_HEADER, DEFINITIONS_HEADING,
+    DEFINITIONS_INSTRUCTIONS, DEFINITIONS_MISSING_ROW, DESCRIPTION_HEADING, DISTRIBUTION_LABEL,
+    DISTRIBUTION_TEXT, DOCUMENTS_HEADING, GUIDELINE_LINK, GUIDELINE_TEXT, HAZARD_TABLE_HEADER,
+    HAZARDS_HEADING, HEADER_LOGOS, HISTORY_HEADING, HISTORY_ROWS, HSE_HEADING, ISO_DEFINITION,
+    ISO_LINK, LOCATION_LINE, NO_HAZARD_DETAILS, SIGNATURE_ROWS, SUBTITLE, SUMMARY_HEADING, SUMMARY_WIDTHS,
+    TITLE, TableLink, activity_summary_rows, annex_files, build_hazard_index, contact_lists, definition_rows,
+    description_text, document_rows, fill_placeholders, get_assets_dir, hazard_rows,
+    header_metadata_texts, hse_rows, load_asset, report_sections, summary_spans, title_values
+)
+from report_model import HYPERLINK_STYLE_ID, REPORT_HEADING_STYLES, REPORT_PARAGRAPH_STYLES
+
+logger = logging.getLogger('generate_docx')
+
+# python-docx names, bound by _ensure_docx() when rendering starts so that argument
+# checks, --validate and result cache hits never pay for importing the docx stack
+Document = None
+Emu = Inches = Pt = RGBColor = None
+WD_STYLE_TYPE = WD_ALIGN_PARAGRAPH = WD_TABLE_ALIGNMENT = None
+OxmlElement = qn = nsdecls = parse_xml = None
+RT = CT_Tc = Table = Paragraph = None
+
+def _ensure_docx():
+    """Import python-docx and bind its names in this module, once"""
+    global Document, Emu, Inches, Pt, RGBColor, WD_STYLE_TYPE, WD_ALIGN_PARAGRAPH, WD_TABLE_ALIGNMENT
+    global OxmlElement, qn, nsdecls, parse_xml, RT, CT_Tc, Table, Paragraph
+    if Document is not None:
+        return
+    from docx import Document
+    from docx.shared import Emu, Inches, Pt, RGBColor
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.enum.table import WD_TABLE_ALIGNMENT
+    from docx.oxml.shared import OxmlElement, qn
+    from docx.oxml.ns import nsdecls
+    from docx.oxml import parse_xml
+    from docx.opc.constants import RELATIONSHIP_TYPE as RT
+    from docx.oxml.table import CT_Tc
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+# Bump whenever a change alters the document produced for a payload: it keys the result cache
+GENERATOR_VERSION = '1.4.1'
+DEFAULT_CACHE_SIZE_MB = 256
+# Document backends: python-docx (the reference) and the streaming OOXML writer
+BACKENDS = ('docx', 'stream')
+
+# Process-wide caches kept warm across jobs in --serve mode
+_template_blob = None
+_generation_lock = threading.Lock()
+# Header table prototype and, per document part, the rIds of its logo images
+_header_prototype = None
+_header_image_rids = weakref.WeakKeyDictionary()
+# Pre-formatted elements deep-copied by the bulk table builder
+_cell_templates = {}
+_header_shading = None
+# Hyperlink element template and, per part, the URL -> rId index of hyperlink relationships
+_hyperlink_template = None
+_hyperlink_rids = weakref.WeakKeyDictionary()
+
+# Static report sections compiled once per process (see render_fragment)
+_fragments = {}
+_fragment_scratch = None
+
+# Rendered report sections and the fingerprint of their inputs, kept by warm processes
+_section_cache = {}
+_section_caching = False
+
+# Generation options set from the command line (see configure_generation)
+_reproducible_default = False
+_backend_default = 'docx'
+_image_quality = annex_images.DEFAULT_QUALITY
+_package_policy = package_writer.PackagePolicy()
+_fsync = False
+_result_cache = None
+# SQLite index of the generated reports (--index)
+_report_index = None
+# Parse 'input' payload files incrementally (--stream-input, see payload_stream)
+_stream_input = False
+# Hazard catalogue workbook (--catalogue) for payloads that reference a catalogueVersion
+_catalogue_path = None
+_catalogue_cache_dir = None
+# Building/room reference workbook (--locations) resolving TSOs and checking locations
+_locations_path = None
+
+# Active --profile span collector (see stage)
+_profiler = None
+# Progress callback of the running job service job (see report_progress)
+_progress_hook = None
+# Exception _progress_hook raises for a cancelled job, bound with it so job_service loads only with --service
+_job_cancelled = ()
+def _default_file_mode():
+    """Permissions a newly created file would get under the current umask"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+def configure_logging(level='INFO'):
+    """Send the generator's diagnostics to stderr at the given level"""
+    logging.basicConfig(level=level, format='%(levelname)s: %(message)s', stream=sys.stderr, force=True)
+
+def _windows_peak_rss_kb():
+    """Peak working set of the current process, from the Win32 process memory counters"""
+    import ctypes
+    from ctypes import wintypes
+    
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+    
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+    get_current_process.restype = wintypes.HANDLE
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(get_current_process(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize // 1024
+
+def peak_rss_kb():
+    """Peak resident set size of the current process in KiB, or None when unavailable"""
     try:
-        row = table.rows[row_idx]
-        # Get the first cell to merge into
-        merged_cell = row.cells[start_col]
-        
-        # Merge subsequent cells
-        for col_idx in range(start_col + 1, end_col + 1):
-            if col_idx < len(row.cells):
-                cell_to_merge = row.cells[col_idx]
-                merged_cell.merge(cell_to_merge)
-        
-        return merged_cell
-    except Exception as e:
-        print(f"Error merging cells: {e}")
+        if resource is None:
+            return _windows_peak_rss_kb()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in KiB elsewhere
+        return peak // 1024 if sys.platform == 'darwin' else peak
+    except Exception:
         return None
-def merge_cells_vertically(table, start_row, col_idx):
-    """Merge cells vertically in a table column"""
+
+class Profiler:
+    """Collect nested wall-time, allocation and peak-RSS spans for --profile
+    
+    Allocations are traced with tracemalloc, which slows rendering down, so
+    spans are only recorded while a profiler is active (see stage).
+    """
+    
+    def __init__(self):
+        self.spans = []
+        self.notes = {}
+        self._stack = []
+        self._started = time.perf_counter()
+        tracemalloc.start()
+    
+    @contextlib.contextmanager
+    def span(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            # Keep the enclosing span's peak before resetting it for this one
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        
+        record = {'name': name, 'depth': len(self._stack),
+                  'start_ms': round((time.perf_counter() - self._started) * 1000, 2)}
+        self.spans.append(record)
+        frame = {'start': current, 'peak': current}
+        self._stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            current, peak = tracemalloc.get_traced_memory()
+            self._stack.pop()
+            frame['peak'] = max(frame['peak'], peak)
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], frame['peak'])
+            record.update({
+                'wall_ms': round(wall * 1000, 2),
+                'allocated_kb': round((current - frame['start']) / 1024, 1),
+                'peak_allocated_kb': round((frame['peak'] - frame['start']) / 1024, 1),
+                'peak_rss_kb': peak_rss_kb()
+            })
+    
+    def report(self):
+        """Return the spans in start order with per-name totals"""
+        totals = {}
+        for record in self.spans:
+            if 'wall_ms' not in record:
+                continue
+            total = totals.setdefault(record['name'], {'count': 0, 'wall_ms': 0.0, 'allocated_kb': 0.0})
+            total['count'] += 1
+            total['wall_ms'] = round(total['wall_ms'] + record['wall_ms'], 2)
+            total['allocated_kb'] = round(total['allocated_kb'] + record['allocated_kb'], 1)
+        return {
+            'generator_version': GENERATOR_VERSION,
+            'python': platform.python_version(),
+            'total_ms': round((time.perf_counter() - self._started) * 1000, 2),
+            'traced_peak_kb': round(tracemalloc.get_traced_memory()[1] / 1024, 1),
+            'peak_rss_kb': peak_rss_kb(),
+            'spans': self.spans,
+            'totals': totals,
+            'notes': self.notes
+        }
+
+def stage(name):
+    """Context manager recording a profile span for one stage, when --profile is active"""
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.span(name)
+
+def report_progress(event):
+    """Send a progress event to the job service, which raises job_service.JobCancelled for a cancelled job"""
+    if _progress_hook is not None:
+        _progress_hook(event)
+
+def annotate(name, value):
+    """Attach a value to the profile report under notes, when --profile is active"""
+    if _profiler is not None:
+        _profiler.notes[name] = value
+
+def start_profiling():
+    """Start recording stage spans"""
+    global _profiler
+    _profiler = Profiler()
+
+def stop_profiling():
+    """Stop recording stage spans and return the profile report"""
+    global _profiler
+    report = _profiler.report()
+    tracemalloc.stop()
+    _profiler = None
+    return report
+
+def write_profile_report(report, path):
+    """Write a profile report as JSON to a file, or to stderr for '-'"""
+    if path == '-':
+        sys.stderr.write(json.dumps(report, indent=2) + '\n')
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+def _fsync_directory(path):
+    """Flush a directory entry (a rename) to disk, where the platform allows opening directories"""
+    if os.name != 'posix':
+        return
+    fd = os.open(path, os.O_RDONLY)
     try:
-        # Get the first cell to merge into
-        merged_cell = table.cell(start_row, col_idx)
-        # Merge subsequent cells
-        for row_idx in range(start_row + 1, len(table.rows)):
-            cell_to_merge = table.cell(row_idx, col_idx)
-            merged_cell.merge(cell_to_merge)
-        return merged_cell
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextlib.contextmanager
+def open_output(output, fsync=None):
+    """Open a writable binary stream, or a file path for an atomic write, as a binary file
+    
+    File outputs are written to a private temporary file in the destination
+    directory and renamed over the target once the block completes, so readers
+    never see a partial file and concurrent jobs never share a path. With fsync
+    (default: the --fsync option) the file and then the rename are flushed to
+    disk before returning, so a crash cannot leave a truncated report behind.
+    """
+    if fsync is None:
+        fsync = _fsync
+    if hasattr(output, 'write'):
+        yield output
+        output.flush()
+        return
+    
+    output_dir = os.path.dirname(os.path.abspath(output))
+    fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=f'.{os.path.basename(output)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(temp_path, _default_file_mode())
+        os.replace(temp_path, output)
+        if fsync:
+            _fsync_directory(output_dir)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+def write_output(blob, output):
+    """Write document bytes to a writable binary stream, or atomically to a file path (see open_output)"""
+    with open_output(output) as f:
+        f.write(blob)
+
+def save_document(doc, output, timestamp=None):
+    """Save the document to a stream or file path (see open_output); returns the package_writer.PackageStats
+    
+    Parts are compressed under the --compress-level/--deflate-media policy. With a
+    timestamp every member is dated with it and the members are sorted by name,
+    so identical documents are identical bytes.
+    """
+    with open_output(output) as target:
+        return package_writer.write_docx(doc, target, _package_policy, timestamp, sort=timestamp is not None)
+
+def report_package(stats, output_name):
+    """Log the size and compression time of a written package and add them to the profile report"""
+    logger.info(f"Package {output_name}: {stats.bytes_written} bytes, {stats.parts} parts "
+                f"({stats.stored_parts} stored), {stats.compress_seconds * 1000:.1f} ms compressing")
+    annotate('package', stats.as_dict())
+
+def index_report(data, output_path, generated, hazard_index=None):
+    """Add a written report to the --index database; a failure is logged, the report is kept
+    
+    Reports are indexed by their absolute path, or by the digest of their payload
+    when written to a stream.
+    """
+    if _report_index is None:
+        return
+    if isinstance(output_path, str):
+        document = os.path.abspath(output_path)
+    else:
+        document = f"sha256:{hashlib.sha256(canonical_json(data).encode('utf-8')).hexdigest()}"
+    try:
+        with stage('index'):
+            hazards = _report_index.add(document, data, hazard_index or build_hazard_index(data), generated)
+        logger.debug(f"Indexed {document} with {hazards} hazards in {_report_index.path}")
     except Exception as e:
-        print(f"Error merging cells: {e}")
+        logger.warning(f"Could not index the report in {_report_index.path}: {e}")
+
+def _json_default(value):
+    # Spooled hazardDetails of a streamed payload stand for the digest of their content
+    if isinstance(value, payload_stream.SpooledCategories):
+        return {'spooled': value.digest}
+    return str(value)
+
+def canonical_json(value):
+    """Serialize a JSON value with sorted keys and no insignificant whitespace"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=_json_default)
+
+def generation_date(data, reproducible=False):
+    """Return the date the report is generated for
+    
+    The payload's 'generationDate' (ISO 8601) pins it. Otherwise reproducible
+    output uses SOURCE_DATE_EPOCH and normal output uses the current time.
+    """
+    pinned = data.get('generationDate')
+    if pinned:
+        return datetime.fromisoformat(str(pinned).replace('Z', '+00:00')).replace(tzinfo=None)
+    if not reproducible:
+        return datetime.now()
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if not epoch:
+        raise ValueError("Reproducible output needs a pinned date: set 'generationDate' in the payload or SOURCE_DATE_EPOCH")
+    return datetime.fromtimestamp(int(epoch), timezone.utc).replace(tzinfo=None)
+
+# Payload structure checked by --validate (see compile_schema for the keywords)
+_TEXT = {'type': 'string'}
+PAYLOAD_SCHEMA = {
+    'type': 'object',
+    'required': ['selectedHazards', 'hazardDetails'],
+    # Definitions are embedded, or looked up in the compiled catalogue of that version
+    'requiredAny': [('hazardDefinitions', 'catalogueVersion')],
+    'properties': {
+        **{field: _TEXT for field in (
+            'reference', 'edms', 'validity', 'title', 'creatorName', 'creatorDepartment',
+            'responsiblePerson', 'startDate', 'endDate', 'location', 'building', 'room',
+            'cernSupport', 'cmsSupport', 'safetyDocuments', 'technicalDocuments',
+            'otherDocuments', 'hseSupport', 'referenceDocuments', 'activityDescription')},
+        'participantCount': {'type': ['string', 'number']},
+        'generationDate': {'type': 'string', 'format': 'date-time'},
+        'catalogueVersion': _TEXT,
+        'safetyOfficers': {'type': 'object', 'properties': {'tso': _TEXT, 'dtso': _TEXT}},
+        'selectedHazards': {'type': 'array', 'items': _TEXT},
+        'hazardDetails': {
+            'type': 'object',
+            'additionalProperties': {
+                'type': ['object', 'null'],
+                'additionalProperties': {
+                    'type': 'object',
+                    'properties': {
+                        'selected': {'type': ['boolean', 'string']},
+                        'name': _TEXT,
+                        'details': _TEXT,
+                        'recommendations': _TEXT,
+                        'defaultRecommendations': _TEXT
+                    }
+                }
+            }
+        },
+        'hazardDefinitions': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'requiredAny': [('hazard', 'Hazard')],
+                'properties': {
+                    'hazard': _TEXT, 'Hazard': _TEXT,
+                    'definition': _TEXT, 'Definition': _TEXT,
+                    'ref': _TEXT, 'Ref.': _TEXT
+                }
+            }
+        },
+        'contactData': {
+            'type': 'object',
+            'properties': {
+                'webContacts': {'type': 'array', 'items': {
+                    'type': 'object', 'required': ['title', 'url', 'description'],
+                    'properties': {'title': _TEXT, 'url': _TEXT, 'description': _TEXT}}},
+                'emailContacts': {'type': 'array', 'items': {
+                    'type': 'object', 'required': ['email', 'description'],
+                    'properties': {'email': _TEXT, 'description': _TEXT}}}
+            }
+        },
+        'uploadedFiles': {'type': 'array', 'items': {'type': 'object'}}
+    }
+}
+
+_JSON_TYPES = {
+    'object': (collections.abc.Mapping,), 'array': (list,), 'string': (str,), 'number': (int, float),
+    'boolean': (bool,), 'null': (type(None),)
+}
+
+def _is_iso_datetime(value):
+    """Return True when value parses as an ISO 8601 date or date-time"""
+    try:
+        datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return False
+    return True
+
+_FORMATS = {'date-time': _is_iso_datetime}
+
+def compile_schema(schema):
+    """Compile a schema into a validator function(value, path, errors)
+    
+    Supported keywords: type (name or list of names), required, requiredAny
+    (groups of alternative keys), properties, additionalProperties, items,
+    minItems and format. Each schema node is turned into a list of checks once,
+    so validating a payload is a plain walk over it.
+    """
+    checks = []
+    
+    type_names = schema.get('type')
+    if type_names:
+        type_names = [type_names] if isinstance(type_names, str) else list(type_names)
+        python_types = tuple(t for name in type_names for t in _JSON_TYPES[name])
+        expected = ' or '.join(type_names)
+        accepts_bool = 'boolean' in type_names
+        
+        def check_type(value, path, errors):
+            # bool is an int subclass, but JSON true/false are not numbers
+            if not isinstance(value, python_types) or (isinstance(value, bool) and not accepts_bool):
+                errors.append(f'{path}: expected {expected}, got {type(value).__name__}')
+                return False
+            return True
+        checks.append(check_type)
+    
+    required = schema.get('required', ())
+    required_any = schema.get('requiredAny', ())
+    properties = {key: compile_schema(child) for key, child in schema.get('properties', {}).items()}
+    additional = schema.get('additionalProperties')
+    additional = compile_schema(additional) if additional else None
+    if required or required_any or properties or additional:
+        def check_object(value, path, errors):
+            if not isinstance(value, collections.abc.Mapping):
+                return True
+            for key in required:
+                if key not in value:
+                    errors.append(f'{path}: missing required field {key!r}')
+            for keys in required_any:
+                if not any(key in value for key in keys):
+                    errors.append(f"{path}: missing required field {' or '.join(repr(key) for key in keys)}")
+            for key, item in value.items():
+                validator = properties.get(key, additional)
+                if validator is not None:
+                    validator(item, f'{path}.{key}', errors)
+            return True
+        checks.append(check_object)
+    
+    items = schema.get('items')
+    items = compile_schema(items) if items else None
+    min_items = schema.get('minItems')
+    if items or min_items:
+        def check_array(value, path, errors):
+            if not isinstance(value, list):
+                return True
+            if min_items and len(value) < min_items:
+                errors.append(f'{path}: expected at least {min_items} item(s), got {len(value)}')
+            if items is not None:
+                for index, item in enumerate(value):
+                    items(item, f'{path}[{index}]', errors)
+            return True
+        checks.append(check_array)
+    
+    format_name = schema.get('format')
+    if format_name:
+        is_valid = _FORMATS[format_name]
+        
+        def check_format(value, path, errors):
+            if isinstance(value, str) and not is_valid(value):
+                errors.append(f'{path}: not a valid {format_name}: {value!r}')
+            return True
+        checks.append(check_format)
+    
+    def validate(value, path, errors):
+        for check in checks:
+            # A failed type check makes the structural checks meaningless
+            if not check(value, path, errors):
+                return
+    return validate
+
+_validate_payload_schema = compile_schema(PAYLOAD_SCHEMA)
+
+def validate_payload(data):
+    """Check a payload against PAYLOAD_SCHEMA; returns the list of problems, empty when valid"""
+    errors = []
+    _validate_payload_schema(data, 'payload', errors)
+    return errors
+
+class ResultCache:
+    """On-disk store of generated documents, addressed by the hash of their inputs
+    
+    Reading an entry refreshes its modification time, and the least recently used
+    entries are evicted once the directory grows beyond max_bytes.
+    """
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+    
+    def key(self, data, generated, reproducible, backend='docx', images=(), image_quality=None, package=None):
+        """Hash the payload with everything else that decides the output bytes
+        
+        images are the content digests of the annex pictures, which the payload
+        only references by path, and package the PackagePolicy.as_dict() of the
+        package writer.
+        """
+        # Without reproducible output, a document stays valid for the rest of its day
+        date = generated.isoformat() if reproducible else generated.strftime('%Y-%m-%d')
+        source = canonical_json({
+            'version': GENERATOR_VERSION,
+            'backend': backend,
+            'reproducible': reproducible,
+            'date': date,
+            'images': list(images),
+            'image_quality': image_quality if images else None,
+            'package': package,
+            'data': data
+        })
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+    
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.docx')
+    
+    def get(self, key):
+        """Return the stored document bytes, or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return blob
+    
+    def put(self, key, blob):
+        """Store document bytes, then evict the oldest entries beyond the size bound"""
+        write_output(blob, self._path(key))
+        self.evict()
+    
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            # Skip the temporary files of writes in progress
+            if entry.name.endswith('.docx') and not entry.name.startswith('.'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+def configure_generation(reproducible=False, cache_dir=None, cache_size_mb=None, catalogue=None, backend='docx',
+                         image_quality=annex_images.DEFAULT_QUALITY,
+                         compress_level=package_writer.DEFAULT_COMPRESS_LEVEL, store_media=True, fsync=False,
+                         index=None, stream_input=False, locations=None):
+    """Set the process-wide generation options from the command line"""
+    global _reproducible_default, _backend_default, _image_quality, _package_policy, _fsync
+    global _result_cache, _catalogue_path, _catalogue_cache_dir, _report_index, _stream_input, _locations_path
+    _reproducible_default = reproducible
+    _backend_default = backend
+    _image_quality = image_quality
+    _package_policy = package_writer.PackagePolicy(compress_level, store_media)
+    _fsync = fsync
+    if cache_dir:
+        _result_cache = ResultCache(cache_dir, int((cache_size_mb or DEFAULT_CACHE_SIZE_MB) * 1024 * 1024))
+    _catalogue_path = catalogue
+    _catalogue_cache_dir = cache_dir
+    _report_index = None
+    if index:
+        # sqlite3 is only loaded for --index
+        import report_index
+        _report_index = report_index.ReportIndex(index)
+    _stream_input = stream_input
+    _locations_path = locations
+
+def default_workbook_path(workbook=excel_catalogue.CATALOGUE_WORKBOOK):
+    """Find a workbook in data/excel, next to the working directory or the app"""
+    if getattr(sys, 'frozen', False):
+        script_dir = os.path.dirname(sys.executable)
+    else:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+    for base in (os.getcwd(), os.path.join(script_dir, '..')):
+        path = os.path.join(base, 'data', 'excel', workbook)
+        if os.path.exists(path):
+            return path
+    return None
+
+def get_catalogue():
+    """Return the compiled hazard catalogue, recompiled only when the workbook changed"""
+    path = _catalogue_path or default_workbook_path()
+    if not path:
+        raise ValueError(f"Hazard catalogue workbook '{excel_catalogue.CATALOGUE_WORKBOOK}' not found, "
+                         "pass its path with --catalogue")
+    return excel_catalogue.load_catalogue(path, _catalogue_cache_dir)
+
+def resolve_catalogue(data):
+    """Fill in what a payload takes from the catalogue named by its 'catalogueVersion'
+    
+    Missing hazardDefinitions come from the catalogue, as do the defaultRecommendations
+    of catalogued sub-hazards that do not carry their own. Returns a new payload.
+    """
+    catalogue = get_catalogue()
+    if data['catalogueVersion'] != catalogue.version:
+        raise ValueError(f"Payload references hazard catalogue {data['catalogueVersion']}, "
+                         f"but {catalogue.path} is version {catalogue.version}")
+    
+    def resolve_category(category, category_data):
+        if isinstance(category_data, dict):
+            category_data = dict(category_data)
+            for hazard_id, hazard_data in category_data.items():
+                if isinstance(hazard_data, dict) and not hazard_data.get('defaultRecommendations'):
+                    measures = catalogue.default_recommendations(category, hazard_id, hazard_data.get('name'))
+                    if measures:
+                        category_data[hazard_id] = {**hazard_data, 'defaultRecommendations': measures}
+        return category_data
+    
+    resolved = dict(data)
+    if not data.get('hazardDefinitions'):
+        resolved['hazardDefinitions'] = catalogue.definitions
+    hazard_details = data.get('hazardDetails') or {}
+    if isinstance(hazard_details, payload_stream.SpooledCategories):
+        # Resolved as each category is loaded
+        resolved['hazardDetails'] = hazard_details.transformed(resolve_category)
+    else:
+        resolved['hazardDetails'] = {category: resolve_category(category, category_data)
+                                     for category, category_data in hazard_details.items()}
+    return resolved
+
+def get_locations():
+    """Return the compiled location reference, or None when there is no workbook to read it from"""
+    path = _locations_path or default_workbook_path(location_reference.LOCATION_WORKBOOK)
+    if not path:
         return None
+    return location_reference.load_locations(path, _catalogue_cache_dir)
+
+def check_locations(data):
+    """Resolve the building, room and location of a payload against the location reference
+
+    Returns (payload, problems). The payload gets the 'safetyOfficers' (TSO and
+    dTSO) of its building, and the workbook's contacts and links when it has no
+    contactData; values it already carries are kept. problems describe a
+    building or room the reference does not know. Without a workbook the
+    payload is returned as it is.
+    """
+    locations = get_locations()
+    if locations is None:
+        return data, []
+    building, _, problems = locations.resolve(data.get('building'), data.get('room'), data.get('location'))
+    resolved = dict(data)
+    if building is not None and (building.tso or building.dtso) and not data.get('safetyOfficers'):
+        resolved['safetyOfficers'] = {'tso': building.tso, 'dtso': building.dtso}
+    if 'contactData' not in data and (locations.web_contacts or locations.email_contacts):
+        resolved['contactData'] = {'webContacts': locations.web_contacts, 'emailContacts': locations.email_contacts}
+    return resolved, problems
 
-def format_paragraph(paragraph, font_size=11, bold=False, alignment=WD_ALIGN_PARAGRAPH.LEFT):
-    """Apply consistent formatting to a paragraph"""
-    for run in paragraph.runs:
-        run.font.name = 'Arial'
-        run.font.size = Pt(font_size)
-        run.font.bold = bold
-    paragraph.alignment = alignment
+def resolve_locations(data):
+    """check_locations(), logging the problems as warnings; returns the resolved payload"""
+    try:
+        data, problems = check_locations(data)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        logger.warning(f"Location reference unavailable, building and room are not checked: {e}")
+        return data
+    for problem in problems:
+        logger.warning(problem)
+    return data
+
+def location_warnings(data):
+    """Problems of a payload's building and room for --validate, which do not make the payload invalid"""
+    try:
+        return check_locations(data)[1]
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        return [f'Location reference unavailable: {e}']
 
-def format_table_cell(cell, font_size=10, bold=False, alignment=WD_ALIGN_PARAGRAPH.LEFT):
+def _set_style_font(style, font_size, bold):
+    """Set an Arial font on a style, dropping theme fonts that would take precedence"""
+    rFonts = style.element.get_or_add_rPr().get_or_add_rFonts()
+    for attr in ('w:asciiTheme', 'w:hAnsiTheme'):
+        rFonts.attrib.pop(qn(attr), None)
+    style.font.name = 'Arial'
+    style.font.size = Pt(font_size)
+    style.font.bold = bold
+
+def register_report_styles(doc):
+    """Define the report's paragraph, heading and hyperlink styles in the document's styles.xml"""
+    styles = doc.styles
+    for (font_size, bold), (style_id, name) in REPORT_PARAGRAPH_STYLES.items():
+        style = styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.style_id = style_id
+        style.base_style = styles['Normal']
+        _set_style_font(style, font_size, bold)
+    
+    for name, font_size in REPORT_HEADING_STYLES.values():
+        _set_style_font(styles[name], font_size, True)
+    
+    hyperlink_style = styles.add_style('Hyperlink', WD_STYLE_TYPE.CHARACTER)
+    hyperlink_style.style_id = HYPERLINK_STYLE_ID
+    hyperlink_style.font.color.rgb = RGBColor(0x05, 0x63, 0xC1)
+    hyperlink_style.font.underline = True
+
+def base_template():
+    """Return the base template package (report styles, margins) as bytes, built once per process"""
+    global _template_blob
+    if _template_blob is None:
+        _ensure_docx()
+        doc = Document()
+        register_report_styles(doc)
+        
+        # Set document margins
+        for section in doc.sections:
+            section.top_margin = Inches(0.5)
+            section.bottom_margin = Inches(0.5)
+            section.left_margin = Inches(0.5)
+            section.right_margin = Inches(0.5)
+        
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        _template_blob = buffer.getvalue()
+    return _template_blob
+
+def new_document():
+    """Create a blank document from the base template"""
+    template = base_template()
+    _ensure_docx()
+    return Document(io.BytesIO(template))
+
+def format_paragraph(paragraph, font_size=11, bold=False, alignment=None):
+    """Apply consistent formatting to a paragraph
+    
+    Registered font size/bold combinations reference a named style from
+    REPORT_PARAGRAPH_STYLES; any other combination is applied directly to the runs.
+    """
+    style = REPORT_PARAGRAPH_STYLES.get((font_size, bold))
+    if style is not None:
+        paragraph._p.get_or_add_pPr().style = style[0]
+    else:
+        for run in paragraph.runs:
+            run.font.name = 'Arial'
+            run.font.size = Pt(font_size)
+            run.font.bold = bold
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT if alignment is None else alignment
+
+def format_table_cell(cell, font_size=10, bold=False, alignment=None):
     """Apply consistent formatting to a table cell"""
     for paragraph in cell.paragraphs:
         format_paragraph(paragraph, font_size, bold, alignment)
 
-def add_formatted_heading(doc, text, level=1, font_size=14, alignment=WD_ALIGN_PARAGRAPH.LEFT):
+def add_formatted_heading(doc, text, level=1, font_size=14, alignment=None):
     """Add a consistently formatted heading"""
+    if alignment is None:
+        alignment = WD_ALIGN_PARAGRAPH.LEFT
     heading = doc.add_heading(text, level)
-    format_paragraph(heading, font_size, bold=True, alignment=alignment)
+    if REPORT_HEADING_STYLES.get(level, (None, None))[1] == font_size:
+        # The heading style already carries the report font
+        heading.alignment = alignment
+    else:
+        for run in heading.runs:
+            run.font.name = 'Arial'
+            run.font.size = Pt(font_size)
+            run.font.bold = True
+        heading.alignment = alignment
     return heading
 
-def add_formatted_paragraph(doc, text, font_size=11, bold=False, alignment=WD_ALIGN_PARAGRAPH.LEFT):
+def add_formatted_paragraph(doc, text, font_size=11, bold=False, alignment=None):
     """Add a consistently formatted paragraph"""
     paragraph = doc.add_paragraph(text)
     format_paragraph(paragraph, font_size, bold, alignment)
     return paragraph
 
-def add_hyperlink(paragraph, url, text):
-    """Add a hyperlink to a paragraph"""
-    try:
-        part = paragraph.part
-        r_id = part.relate_to(url, "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink", is_external=True)
-        
+def hyperlink_rid(part, url):
+    """Return the rId of the external hyperlink relationship to url, creating it once per part
+    
+    Relationships are looked up in a per-part URL index instead of python-docx's
+    linear scan, so repeated URLs share a single relationship.
+    """
+    index = _hyperlink_rids.get(part)
+    if index is None:
+        index = {'rids': {}, 'next': 1}
+        for r_id, rel in part.rels.items():
+            if rel.is_external and rel.reltype == RT.HYPERLINK:
+                index['rids'].setdefault(rel.target_ref, r_id)
+        _hyperlink_rids[part] = index
+    
+    r_id = index['rids'].get(url)
+    if r_id is None:
+        while f"rId{index['next']}" in part.rels:
+            index['next'] += 1
+        r_id = f"rId{index['next']}"
+        part.rels.add_relationship(RT.HYPERLINK, url, r_id, is_external=True)
+        index['rids'][url] = r_id
+    return r_id
+
+def _new_hyperlink(r_id, text):
+    """Return a w:hyperlink element copied from a template built once per process"""
+    global _hyperlink_template
+    if _hyperlink_template is None:
         hyperlink = OxmlElement('w:hyperlink')
-        hyperlink.set(qn('r:id'), r_id)
-        
         new_run = OxmlElement('w:r')
         rPr = OxmlElement('w:rPr')
         
-        # Add hyperlink styling
-        c = OxmlElement('w:color')
-        c.set(qn('w:val'), "0563C1")
-        rPr.append(c)
-        
-        u = OxmlElement('w:u')
-        u.set(qn('w:val'), 'single')
-        rPr.append(u)
+        # Add hyperlink styling (color and underline come from the Hyperlink style)
+        rStyle = OxmlElement('w:rStyle')
+        rStyle.set(qn('w:val'), HYPERLINK_STYLE_ID)
+        rPr.append(rStyle)
         
         new_run.append(rPr)
-        new_run.text = text
         hyperlink.append(new_run)
-        paragraph._p.append(hyperlink)
-        
-        return hyperlink
-    except Exception as e:
-        print(f"Warning: Could not create hyperlink for {url}: {e}")
-        # Fallback: just add text
-        paragraph.add_run(text)
-        return None
+        _hyperlink_template = hyperlink
+    
+    hyperlink = copy.deepcopy(_hyperlink_template)
+    hyperlink.set(qn('r:id'), r_id)
+    hyperlink[0].text = text
+    return hyperlink
 
-def format_date(date_string):
-    """Format date string to DD/MM/YYYY"""
-    if not date_string:
-        return "N/A"
-    try:
-        date_obj = datetime.fromisoformat(date_string.replace('Z', '+00:00'))
-        return date_obj.strftime("%d/%m/%Y")
-    except:
-        return date_string
+def add_hyperlinks(links):
+    """Add many hyperlinks at once from (paragraph, url, text) tuples; returns the hyperlink elements"""
+    hyperlinks = []
+    for paragraph, url, text in links:
+        try:
+            hyperlink = _new_hyperlink(hyperlink_rid(paragraph.part, url), text)
+            paragraph._p.append(hyperlink)
+            hyperlinks.append(hyperlink)
+        except Exception as e:
+            logger.warning(f"Could not create hyperlink for {url}: {e}")
+            # Fallback: just add text
+            paragraph.add_run(text)
+            hyperlinks.append(None)
+    return hyperlinks
+
+def add_hyperlink(paragraph, url, text):
+    """Add a hyperlink to a paragraph"""
+    return add_hyperlinks([(paragraph, url, text)])[0]
 
-def create_hazard_table(doc, category_name, hazards_data):
-    """Create a table for hazard category with Subject, Details, Recommendations columns"""
+def add_header_shading(cell, fill="4F81BD"):
+    """Shade a table header cell, copying a shading element parsed once per process"""
+    global _header_shading
+    if _header_shading is None:
+        _header_shading = parse_xml(r'<w:shd {} w:fill="{}"/>'.format(nsdecls('w'), fill))
+    shading_elm = copy.deepcopy(_header_shading)
+    shading_elm.set(qn('w:fill'), fill)
+    cell._tc.get_or_add_tcPr().append(shading_elm)
+
+def _cell_template(width, font_size, bold, alignment, with_run=True):
+    """Return a formatted cell element to copy for every cell of a column; font_size None leaves it unformatted"""
+    key = (width, font_size, bold, alignment, with_run)
+    template = _cell_templates.get(key)
+    if template is None:
+        template = CT_Tc.new()
+        if width is not None:
+            template.width = width
+        paragraph = Paragraph(template.p_lst[0], None)
+        if with_run:
+            paragraph.add_run()
+        if font_size is not None:
+            format_paragraph(paragraph, font_size, bold, alignment)
+        _cell_templates[key] = template
+    return template
+
+def add_table_rows(table, rows, column_formats):
+    """Append data rows to a table in a single pass
+    
+    Each row is a list of cell values (text, or a TableLink for a hyperlink cell) and
+    column_formats gives the (font_size, bold, alignment) of each column. Cells are
+    copied from pre-formatted templates, producing the same XML as add_row() followed
+    by format_table_cell(), in time linear in the number of rows.
+    """
+    tbl = table._tbl
+    widths = [gridCol.w for gridCol in tbl.tblGrid.gridCol_lst]
+    text_templates = [_cell_template(width, *column_format) for width, column_format in zip(widths, column_formats)]
+    
+    links = []
+    for row in rows:
+        tr = OxmlElement('w:tr')
+        for col, value in enumerate(row):
+            if isinstance(value, TableLink):
+                tc = copy.deepcopy(_cell_template(widths[col], *column_formats[col], with_run=False))
+                links.append((Paragraph(tc.p_lst[0], table), value.url, value.text))
+            else:
+                tc = copy.deepcopy(text_templates[col])
+                tc.p_lst[0].r_lst[0].text = str(value)
+            tr.append(tc)
+        tbl.append(tr)
+    add_hyperlinks(links)
+
+def add_spanned_table(doc, rows, column_formats=None, widths=None, spans=None):
+    """Add a 'Light Grid Accent 1' table filled from rows in a single pass
+    
+    spans maps (row, column) to (rowspan, colspan) for the visible cells, as
+    summary_spans() returns it; the merges are written straight to the cells as
+    gridSpan and vMerge, where cell.merge() would rewrite the grid and move the
+    content at every call. widths are the column widths in inches, column_formats
+    the (font_size, bold, alignment) of each column, or None for unformatted cells.
+    """
+    table = doc.add_table(rows=0, cols=len(rows[0]))
+    table.style = 'Light Grid Accent 1'
+    if widths:
+        for column, width in zip(table.columns, widths):
+            column.width = Inches(width)
+    tbl = table._tbl
+    grid = [gridCol.w for gridCol in tbl.tblGrid.gridCol_lst]
+    column_formats = column_formats or [(None, False, None)] * len(grid)
+    
+    # Grid columns still covered by a vertical merge from a row above: column -> (rows left, colspan)
+    covered = {}
+    for i, row in enumerate(rows):
+        tr = OxmlElement('w:tr')
+        for j, value in enumerate(row):
+            if covered.get(j, (0,))[0]:
+                rows_left, colspan = covered[j]
+                covered[j] = (rows_left - 1, colspan)
+                tc = CT_Tc.new()
+                tc.width = sum(grid[j:j + colspan])
+                tc.grid_span = colspan
+                tc.vMerge = 'continue'
+                tr.append(tc)
+                continue
+            rowspan, colspan = (1, 1) if spans is None else spans.get((i, j), (0, 0))
+            if not rowspan:
+                continue
+            text = str(value)
+            width = sum(grid[j:j + colspan])
+            tc = copy.deepcopy(_cell_template(width, *column_formats[j], with_run=bool(text.strip())))
+            if text.strip():
+                tc.p_lst[0].r_lst[0].text = text
+            if colspan > 1:
+                tc.grid_span = colspan
+            if rowspan > 1:
+                tc.vMerge = 'restart'
+                covered[j] = (rowspan - 1, colspan)
+            tr.append(tc)
+        tbl.append(tr)
+    return table
+
+def create_hazard_table(doc, category_name, hazards):
+    """Create a table for hazard category with Subject, Details, Recommendations columns
+    
+    hazards holds the selected (hazard id, hazard data) pairs, as built by
+    selected_category_hazards().
+    """
     try:
         # Add category heading with consistent formatting
         heading = add_formatted_heading(doc, category_name, level=2, font_size=12)
@@ -127,179 +1022,148 @@ def create_hazard_table(doc, category_name, hazards_data):
         
         # Header row
         hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = 'Subject'
-        hdr_cells[1].text = 'Details'
-        hdr_cells[2].text = 'Recommendations'
+        for cell, text in zip(hdr_cells, HAZARD_TABLE_HEADER):
+            cell.text = text
         
         # Format header row with consistent styling
         for cell in hdr_cells:
             format_table_cell(cell, font_size=11, bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER)
             
             # Add professional header background (darker blue)
-            shading_elm = parse_xml(r'<w:shd {} w:fill="4F81BD"/>'.format(nsdecls('w')))
-            cell._tc.get_or_add_tcPr().append(shading_elm)
-        
-        # Add data rows for selected hazards only
-        # Convert hazards_data to a list to preserve all entries with same name
-        hazards_list = []
-        
-        for hazard_name, hazard_data in hazards_data.items():
-            selected_status = hazard_data.get('selected', False)
-            # Handle both boolean and string values for selected
-            if selected_status == True or selected_status == 'true' or selected_status == 'True':
-                hazards_list.append({
-                    'name': hazard_name,
-                    'data': hazard_data
-                })
-        
-        # Sort by name to group similar hazards together
-        hazards_list.sort(key=lambda x: x['name'])
-        
-        for hazard_entry in hazards_list:
-            hazard_name = hazard_entry['name']
-            hazard_data = hazard_entry['data']
-            
-            row_cells = table.add_row().cells
-            
-            # Subject (hazard name) - use the name from the data if available, otherwise use the key
-            display_name = hazard_data.get('name', hazard_name)
-            subject_para = row_cells[0].paragraphs[0]
-            subject_run = subject_para.runs[0] if subject_para.runs else subject_para.add_run()
-            subject_run.text = display_name
-            subject_run.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            subject_run.bold = True
-            
-            # Details
-            details_text = hazard_data.get('details', 'N/A')
-            row_cells[1].text = details_text
-            
-            # Recommendations - use user input or default from Excel data
-            recommendations_text = hazard_data.get('recommendations', '')
-            if not recommendations_text or recommendations_text.strip() == '':
-                # If no user input, use the default from Excel data
-                recommendations_text = hazard_data.get('defaultRecommendations', 'Standard safety measures apply')
-            elif recommendations_text == 'No specific safety measures available.':
-                # If it's the default placeholder, use a more appropriate text
-                recommendations_text = 'Standard safety measures apply'
-            
-            row_cells[2].text = recommendations_text
+            add_header_shading(cell)
         
-        # Format data rows with consistent styling
-        for row in table.rows[1:]:  # Skip header row
-            for i, cell in enumerate(row.cells):
-                if i == 0:  # Subject column - left align and bold
-                    format_table_cell(cell, font_size=10, bold=True, alignment=WD_ALIGN_PARAGRAPH.LEFT)
-                else:  # Details and Recommendations - left align
-                    format_table_cell(cell, font_size=10, bold=False, alignment=WD_ALIGN_PARAGRAPH.LEFT)
+        # Add data rows for the selected hazards, already filtered and sorted
+        rows = hazard_rows(hazards)
+        
+        # Subject column bold, Details and Recommendations plain - all left aligned
+        add_table_rows(table, rows, [
+            (10, True, WD_ALIGN_PARAGRAPH.LEFT),
+            (10, False, WD_ALIGN_PARAGRAPH.LEFT),
+            (10, False, WD_ALIGN_PARAGRAPH.LEFT)
+        ])
         
         # Add spacing after table
         add_formatted_paragraph(doc, '', font_size=11)
     except Exception as e:
-        print(f"Error creating hazard table for {category_name}: {e}")
+        logger.error(f"Error creating hazard table for {category_name}: {e}")
 
-def create_header_with_logo(doc, data=None):
-    """Create the header with CERN CMS Safety logo and metadata table"""
-    try:
-        print("Creating header with logo...")
-        # Get the correct path to assets directory
-        # Handle both development and PyInstaller packaged executable cases
-        if getattr(sys, 'frozen', False):
-            # Running as PyInstaller executable
-            # The executable is in public/, assets are in ../src/assets/
-            script_dir = os.path.dirname(sys.executable)
-            assets_dir = os.path.join(script_dir, '..', 'src', 'assets')
-        else:
-            # Running as Python script
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            assets_dir = os.path.join(script_dir, '..', 'src', 'assets')
-        
-        print(f"Script directory: {script_dir}")
-        print(f"Assets directory: {assets_dir}")
-        print(f"Assets directory exists: {os.path.exists(assets_dir)}")
-        
-        # Create a table for the header with 5 columns: Logos and Metadata
-        header_table = doc.add_table(rows=1, cols=5)
-        header_table.style = 'Table Grid'
-        
-        # Set table alignment
-        header_table.alignment = WD_TABLE_ALIGNMENT.CENTER
-        
-        # Set column widths
-        header_table.columns[0].width = Inches(3.0)   # CERN Logo and CMS Logo
-        header_table.columns[1].width = Inches(0.5)   # Reference
-        header_table.columns[2].width = Inches(0.5)   # EDMS
-        header_table.columns[3].width = Inches(0.5)   # Rev.
-        header_table.columns[4].width = Inches(0.5)   # Validity
-
-        # Logos cell (left side)
-        logo_cell = header_table.rows[0].cells[0]
-        
-        # Clear the cell first and create a new paragraph
-        logo_cell.text = ""
-        logo_paragraph = logo_cell.paragraphs[0]
-        
-        # Add CERN logo
-        cern_logo_path = os.path.join(assets_dir, 'CERN_logo.png')
-        print(f"Looking for CERN logo at: {cern_logo_path}")
-        if os.path.exists(cern_logo_path):
-            print("CERN logo found, adding to document...")
-            cern_run = logo_paragraph.add_run()
-            cern_run.add_picture(cern_logo_path, width=Inches(0.5), height=Inches(0.5))
-            # Add a space or line break between logos
-            logo_paragraph.add_run(" ")  # or use "\n" for line break
-        else:
-            print(f"Warning: CERN logo not found at {cern_logo_path}")
-        
-        # Add CMS logo
-        cms_logo_path = os.path.join(assets_dir, 'Logo CMS Safety.png')
-        print(f"Looking for CMS logo at: {cms_logo_path}")
-        if os.path.exists(cms_logo_path):
-            print("CMS logo found, adding to document...")
-            cms_run = logo_paragraph.add_run()
-            cms_run.add_picture(cms_logo_path, width=Inches(0.5), height=Inches(0.5))
-        else:
-            print(f"Warning: CMS logo not found at {cms_logo_path}")
-        
-        # Set logo paragraph alignment
-        logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+def _tag_picture(shape, filename):
+    """Name a picture after its file rather than the file it was read from; returns the picture's image rId"""
+    pic = shape._inline.graphic.graphicData.pic
+    pic.nvPicPr.cNvPr.set('name', filename)
+    return pic.blipFill.blip.embed
 
-        # Metadata cells (right side)
-        # Add metadata information from user input or defaults
-        reference_cell = header_table.rows[0].cells[1]
-        reference_value = data.get('reference', '') if data else ''
-        reference_cell.text = f'Reference:\n{reference_value}'
-        
-        edms_cell = header_table.rows[0].cells[2]
-        edms_value = data.get('edms', '') if data else ''
-        edms_cell.text = f'EDMS:\n{edms_value}'
-        
-        rev_cell = header_table.rows[0].cells[3]
-        rev_cell.text = 'Rev.:\n0.1'
-        
-        validity_cell = header_table.rows[0].cells[4]
-        validity_value = data.get('validity', 'EDMS') if data else 'EDMS'
-        validity_cell.text = f'Validity:\n{validity_value}'
-        
-        # Format all cells with consistent styling
-        for i, cell in enumerate(header_table.rows[0].cells):
-            if i == 0:  # Logo cell
-                format_table_cell(cell, font_size=8, alignment=WD_ALIGN_PARAGRAPH.LEFT)
-            else:  # Metadata cells
-                format_table_cell(cell, font_size=8, alignment=WD_ALIGN_PARAGRAPH.CENTER)
-        
-        # Set row height for better appearance
-        header_table.rows[0].height = Inches(0.6)
+def _build_header_table(doc, data=None):
+    """Build the header table procedurally; returns the table and its {rId: logo filename} map"""
+    assets_dir = get_assets_dir()
+    logo_rids = {}
+    
+    # Create a table for the header with 5 columns: Logos and Metadata
+    header_table = doc.add_table(rows=1, cols=5)
+    header_table.style = 'Table Grid'
+    
+    # Set table alignment
+    header_table.alignment = WD_TABLE_ALIGNMENT.CENTER
+    
+    # Set column widths
+    header_table.columns[0].width = Inches(3.0)   # CERN Logo and CMS Logo
+    header_table.columns[1].width = Inches(0.5)   # Reference
+    header_table.columns[2].width = Inches(0.5)   # EDMS
+    header_table.columns[3].width = Inches(0.5)   # Rev.
+    header_table.columns[4].width = Inches(0.5)   # Validity
 
-        # doc.add_paragraph()
-        
-        print("Header created successfully!")
+    # Logos cell (left side)
+    logo_cell = header_table.rows[0].cells[0]
+    
+    # Clear the cell first and create a new paragraph
+    logo_cell.text = ""
+    logo_paragraph = logo_cell.paragraphs[0]
+    
+    # Add CERN logo (read from disk once per process)
+    cern_logo = load_asset('CERN_logo.png')
+    if cern_logo is not None:
+        cern_run = logo_paragraph.add_run()
+        shape = cern_run.add_picture(io.BytesIO(cern_logo), width=Inches(0.5), height=Inches(0.5))
+        logo_rids[_tag_picture(shape, 'CERN_logo.png')] = 'CERN_logo.png'
+        # Add a space or line break between logos
+        logo_paragraph.add_run(" ")  # or use "\n" for line break
+    else:
+        logger.warning(f"CERN logo not found in {assets_dir}")
+    
+    # Add CMS logo
+    cms_logo = load_asset('Logo CMS Safety.png')
+    if cms_logo is not None:
+        cms_run = logo_paragraph.add_run()
+        shape = cms_run.add_picture(io.BytesIO(cms_logo), width=Inches(0.5), height=Inches(0.5))
+        logo_rids[_tag_picture(shape, 'Logo CMS Safety.png')] = 'Logo CMS Safety.png'
+    else:
+        logger.warning(f"CMS logo not found in {assets_dir}")
+    
+    # Set logo paragraph alignment
+    logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    # Metadata cells (right side)
+    # Add metadata information from user input or defaults
+    for cell, text in zip(header_table.rows[0].cells[1:], header_metadata_texts(data)):
+        cell.text = text
+    
+    # Format all cells with consistent styling
+    for i, cell in enumerate(header_table.rows[0].cells):
+        if i == 0:  # Logo cell
+            format_table_cell(cell, font_size=8, alignment=WD_ALIGN_PARAGRAPH.LEFT)
+        else:  # Metadata cells
+            format_table_cell(cell, font_size=8, alignment=WD_ALIGN_PARAGRAPH.CENTER)
+    
+    # Set row height for better appearance
+    header_table.rows[0].height = Inches(0.6)
+    return header_table, logo_rids
+
+def _clone_header_table(doc, data=None):
+    """Append a copy of the header prototype, relinked to this document's logo images"""
+    tbl = copy.deepcopy(_header_prototype['tbl'])
+    
+    # Drawing ids must stay unique within the document
+    next_id = doc.part.next_id
+    for doc_pr in tbl.iter(qn('wp:docPr')):
+        doc_pr.set('id', str(next_id))
+        doc_pr.set('name', f'Picture {next_id}')
+        next_id += 1
+    
+    # Relate the logos to this document once, then point every copy at them
+    doc_rids = _header_image_rids.setdefault(doc.part, {})
+    for blip in tbl.iter(qn('a:blip')):
+        filename = _header_prototype['logo_rids'].get(blip.get(qn('r:embed')))
+        if filename not in doc_rids:
+            doc_rids[filename], _ = doc.part.get_or_add_image(io.BytesIO(load_asset(filename)))
+        blip.set(qn('r:embed'), doc_rids[filename])
+    
+    doc.element.body._insert_tbl(tbl)
+    header_table = Table(tbl, doc._body)
+    for cell, text in zip(header_table.rows[0].cells[1:], header_metadata_texts(data)):
+        cell.paragraphs[0].runs[0].text = text
+    return header_table
+
+def create_header_with_logo(doc, data=None):
+    """Create the header with CERN CMS Safety logo and metadata table
+    
+    The table is built procedurally once per process, kept as a prototype and
+    deep-copied for every following page with only the metadata values replaced.
+    """
+    global _header_prototype
+    try:
+        if _header_prototype is not None:
+            return _clone_header_table(doc, data)
+        
+        logger.debug("Creating header prototype with logo...")
+        header_table, logo_rids = _build_header_table(doc, data)
+        _header_prototype = {'tbl': copy.deepcopy(header_table._tbl), 'logo_rids': logo_rids}
+        _header_image_rids[doc.part] = {filename: rId for rId, filename in logo_rids.items()}
+        return header_table
             
     except Exception as e:
-        print(f"Error creating header: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error creating header: {e}")
 
-def create_hazard_definitions_table(doc, data):
+def create_hazard_definitions_table(doc, data, hazard_index=None):
     """Create the hazard definitions table with Hazard, Check, Definition, Ref. columns"""
     try:
         # Create table with 4 columns: Hazard, Check, Definition, Ref.
@@ -315,18 +1179,15 @@ def create_hazard_definitions_table(doc, data):
         
         # Header row
         hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = 'Hazard'
-        hdr_cells[1].text = 'Check'
-        hdr_cells[2].text = 'Definition'
-        hdr_cells[3].text = 'Ref.'
+        for cell, text in zip(hdr_cells, DEFINITIONS_HEADER):
+            cell.text = text
         
         # Format header row with consistent styling
         for cell in hdr_cells:
             format_table_cell(cell, font_size=11, bold=True, alignment=WD_ALIGN_PARAGRAPH.CENTER)
             
             # Add professional header background (darker blue)
-            shading_elm = parse_xml(r'<w:shd {} w:fill="4F81BD"/>'.format(nsdecls('w')))
-            cell._tc.get_or_add_tcPr().append(shading_elm)
+            add_header_shading(cell)
             
             # Set text color to white for better contrast
             for paragraph in cell.paragraphs:
@@ -339,67 +1200,28 @@ def create_hazard_definitions_table(doc, data):
         
         # If no hazard definitions provided, log error and return
         if not hazard_definitions:
-            print("ERROR: No hazard definitions found in data. Please ensure Excel data is loaded properly.")
+            logger.error("No hazard definitions found in data. Please ensure Excel data is loaded properly.")
             # Add a single row indicating the error
             row_cells = table.add_row().cells
-            row_cells[0].text = "No Data"
-            row_cells[1].text = ""
-            row_cells[2].text = "Hazard definitions not loaded from Excel file"
-            row_cells[3].text = "N/A"
+            for cell, text in zip(row_cells, DEFINITIONS_MISSING_ROW):
+                cell.text = text
             return
         
-        print(f"Processing {len(hazard_definitions)} hazard definitions")
-        print(f"Selected hazards: {selected_hazards}")
-        print(f"Hazard definitions data: {hazard_definitions}")
+        logger.debug(f"Processing {len(hazard_definitions)} hazard definitions, {len(selected_hazards)} selected")
         
         # Add data rows from Excel data
-        for hazard_def in hazard_definitions:
-            row_cells = table.add_row().cells
-            
-            # Hazard name
-            hazard_name = hazard_def.get('hazard', hazard_def.get('Hazard', ''))
-            row_cells[0].text = str(hazard_name)
-            
-            # Check - mark if selected (☒ for selected, ☐ for unselected)
-            is_selected = False
-            if selected_hazards:
-                # Convert selected_hazards list to lowercase for comparison
-                selected_hazards_lower = [str(h).lower() for h in selected_hazards]
-                is_selected = hazard_name.lower() in selected_hazards_lower
-            
-            row_cells[1].text = '☒' if is_selected else '☐'
-            if is_selected:
-                # Make the checkmark bold
-                for paragraph in row_cells[1].paragraphs:
-                    for run in paragraph.runs:
-                        run.bold = True
-            
-            # Definition
-            definition = hazard_def.get('definition', hazard_def.get('Definition', ''))
-            row_cells[2].text = str(definition)
-            
-            # Ref. (Reference) - create hyperlink if it's a URL
-            ref_text = hazard_def.get('ref', hazard_def.get('Ref.', ''))
-            ref_para = row_cells[3].paragraphs[0]
-            ref_para.clear()  # Clear existing content
-            
-            if ref_text and str(ref_text).startswith('http'):
-                add_hyperlink(ref_para, str(ref_text), 'Link HSE')
-            else:
-                ref_para.text = str(ref_text) if ref_text else 'Link HSE'
+        rows = definition_rows(data, hazard_index)
         
         # Note: "Other Hazards" is now handled through the Excel data above
         # No need to add it manually as it should come from the hazardDefinitions
         
-        # Format all content cells with consistent styling
-        for row in table.rows[1:]:  # Skip header row
-            for i, cell in enumerate(row.cells):
-                if i == 1:  # Check column - center align (keep centered for checkboxes)
-                    format_table_cell(cell, font_size=10, bold=False, alignment=WD_ALIGN_PARAGRAPH.CENTER)
-                elif i == 0:  # Hazard column - left align and bold
-                    format_table_cell(cell, font_size=10, bold=True, alignment=WD_ALIGN_PARAGRAPH.LEFT)
-                else:  # Other columns - left align
-                    format_table_cell(cell, font_size=10, bold=False, alignment=WD_ALIGN_PARAGRAPH.LEFT)
+        # Hazard column bold, Check column centered for the checkboxes, others left aligned
+        add_table_rows(table, rows, [
+            (10, True, WD_ALIGN_PARAGRAPH.LEFT),
+            (10, False, WD_ALIGN_PARAGRAPH.CENTER),
+            (10, False, WD_ALIGN_PARAGRAPH.LEFT),
+            (10, False, WD_ALIGN_PARAGRAPH.LEFT)
+        ])
         
         # print(f"Hazard definitions table created with {len(table.rows)} rows")
         
@@ -407,390 +1229,1147 @@ def create_hazard_definitions_table(doc, data):
         doc.add_paragraph()
         
     except Exception as e:
-        print(f"Error creating hazard definitions table: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error creating hazard definitions table: {e}")
 
-def generate_hazard_document(data, output_path):
-    """Generate the complete hazard identification document following CERN template"""
-    try:
-        print(f"Starting document generation...")
-        print(f"Output path: {output_path}")
-        print(f"Data keys: {list(data.keys())}")
-        
-        doc = Document()
-        
-        # Set document margins
-        sections = doc.sections
-        for section in sections:
-            section.top_margin = Inches(0.5)
-            section.bottom_margin = Inches(0.5)
-            section.left_margin = Inches(0.5)
-            section.right_margin = Inches(0.5)
-        
-        # Page 1: Title Page
-        # Add header with logo
-        create_header_with_logo(doc, data)
-        
-        # Document title
-        doc.add_paragraph()  # Add a blank line before the title
-        title = add_formatted_heading(doc, 'Safety Report', level=0, font_size=16, alignment=WD_ALIGN_PARAGRAPH.CENTER)
-        
-        # Subtitle
-        subtitle = add_formatted_heading(doc, 'Hazard Identification Process in Areas', level=1, font_size=14, alignment=WD_ALIGN_PARAGRAPH.CENTER)
-        
-        # Location info
-        location_text = f"Building {data.get('building', 'XXXX')}/{data.get('room', 'XX-xxx')} {data.get('location', 'Meyrin/Prevessin/Point 5')}"
-        location_para = add_formatted_paragraph(doc, location_text, font_size=11, alignment=WD_ALIGN_PARAGRAPH.CENTER)
-        
-        # Signature table
-        sig_table = doc.add_table(rows=2, cols=3)
-        sig_table.style = 'Light Grid Accent 1'
-        sig_table.alignment = WD_TABLE_ALIGNMENT.CENTER
-        
-        # Header row
-        sig_hdr = sig_table.rows[0].cells
-        sig_hdr[0].text = 'Prepared by:'
-        sig_hdr[1].text = 'Checked by:'
-        sig_hdr[2].text = 'Approved by:'
-        
-        # Content row
-        sig_content = sig_table.rows[1].cells
-        creator_formatted = f"{data.get('creatorName', '')} ({data.get('creatorDepartment', '')})"
-        sig_content[0].text = creator_formatted
-        sig_content[1].text = ''
-        sig_content[2].text = ''
-        
-        # Format signature table
-        for row in sig_table.rows:
-            for cell in row.cells:
-                format_table_cell(cell, font_size=10, bold=False)
-        
-        # Format header row as bold
-        for cell in sig_table.rows[0].cells:
-            format_table_cell(cell, font_size=10, bold=True)
-        
-        add_formatted_paragraph(doc, 'Distribution to:', font_size=11, bold=True)
-        add_formatted_paragraph(doc, 'CMS Safety, Activity Responsible, TSO.', font_size=11)
-        
-        # Page 2: History of changes
-        doc.add_page_break()
-        # Add header with logo
-        create_header_with_logo(doc, data)
-        add_formatted_heading(doc, 'History of changes', level=1, font_size=14)
-        history_table = doc.add_table(rows=2, cols=3)
-        history_table.style = 'Light Grid Accent 1'
-        
-        history_hdr = history_table.rows[0].cells
-        history_hdr[0].text = 'Rev.'
-        history_hdr[1].text = 'Date'
-        history_hdr[2].text = 'Description of changes'
-        
-        history_content = history_table.rows[1].cells
-        history_content[0].text = '0.1'
-        history_content[1].text = datetime.now().strftime("%d/%m/%Y")
-        history_content[2].text = 'Creation of the document'
-        
-        # Format history table
-        for row in history_table.rows:
-            for cell in row.cells:
-                format_table_cell(cell, font_size=10, bold=False)
-        
-        # Format header row as bold
-        for cell in history_table.rows[0].cells:
-            format_table_cell(cell, font_size=10, bold=True)
-        
-        # Page 3: Contacts and Useful Links
-        doc.add_page_break()
-        # Add header with logo
-        create_header_with_logo(doc, data)
-        add_formatted_heading(doc, '1 CONTACTS AND USEFUL LINKS', level=1, font_size=14)
-        
-        # Get contact data from the input data, with fallback to hardcoded values
-        contact_data = data.get('contactData', {})
-        web_contacts = contact_data.get('webContacts', [
-            {'title': 'CERN HSE', 'url': 'https://hse.cern/', 'description': 'Website'},
-            {'title': 'Contacts CMS Safety', 'url': 'https://cmssafety.web.cern.ch/who-are-we', 'description': 'group of CMS Safety referents'},
-            {'title': 'CMS RP', 'url': 'https://cmssafety.web.cern.ch/radiation-protection', 'description': 'CMS radiation protection information'},
-            {'title': 'CMS Safety Training and Access Requirements', 'url': 'https://cmssafety.web.cern.ch/training-and-access-requirements', 'description': 'all mandatory and recommended training'},
-            {'title': 'CERN Learning Hub', 'url': 'https://lms.cern.ch/', 'description': 'for the catalogue and registration to available training courses'},
-            {'title': 'ADaMS', 'url': 'http://adams.web.cern.ch/adams/', 'description': 'for access requests'},
-            {'title': 'IMPACT', 'url': 'https://impact.cern.ch/impact/secure/', 'description': 'tool for the declaration of an activity'},
-            {'title': 'TREC', 'url': 'https://cmmsx.cern.ch/SSO/trec/', 'description': 'system for tracing potentially radioactive equipment'},
-            {'title': 'EDH SIT', 'url': 'https://edh.cern.ch/Document/SupplyChain/SIT', 'description': 'for Storage and/or internal transport requests'}
-        ])
-        
-        email_contacts = contact_data.get('emailContacts', [
-            {'email': 'Cms-safety@cern.ch', 'description': 'group of CMS Safety (TC, LEXGLIMOS, DLEXGLIMOS)'},
-            {'email': 'Cms-safety-team@cern.ch', 'description': 'group of CMS Safety Team (LEXGLIMOS Office)'},
-            {'email': 'Cms-rso@cern.ch', 'description': 'group of CMS Radiation Safety Officers (RSO, DRSO)'}
-        ])
-        
-        # Add web contacts
-        for contact in web_contacts:
-            para = doc.add_paragraph('• ')
-            add_hyperlink(para, contact['url'], contact['title'])
-            para.add_run(f': {contact["description"]}')
-        
-        # Add email contacts
-        for contact in email_contacts:
-            para = doc.add_paragraph('• ')
-            add_hyperlink(para, f'mailto:{contact["email"]}', contact['email'])
-            para.add_run(f': {contact["description"]}')
-        
-        # Page 4: Hazards definitions
-        doc.add_page_break()
-        # Add header with logo
-        create_header_with_logo(doc, data)
-        add_formatted_heading(doc, '2 HAZARDS DEFINITIONS', level=1, font_size=14)
-        
-        definition_text = ("According to ISO 45001 a hazard is defined as a source capable of causing injury and ill health. "
-                          "Hazards can include sources with the potential to cause harm or hazardous situations, "
-                          "or circumstances with the potential for exposure leading to injury and ill health.")
-        
-        def_para = add_formatted_paragraph(doc, definition_text, font_size=11)
-        for run in def_para.runs:
+def capture_fragment(doc, start):
+    """Copy the body elements appended since index start, with the URLs of their hyperlinks"""
+    body = doc.element.body
+    elements = [copy.deepcopy(element) for element in body[start:-1]]
+    rels = doc.part.rels
+    links = {}
+    for element in elements:
+        for hyperlink in element.iter(qn('w:hyperlink')):
+            r_id = hyperlink.get(qn('r:id'))
+            if r_id in rels:
+                links[r_id] = rels[r_id].target_ref
+    return {'elements': elements, 'links': links}
+
+def insert_fragment(doc, fragment, values=None):
+    """Append a copy of captured body elements to the document
+    
+    Hyperlinks are relinked to the document's own relationships and runs holding
+    {{placeholders}} are filled from values.
+    """
+    body = doc.element.body
+    sectPr = body.sectPr
+    
+    for element in fragment['elements']:
+        clone = copy.deepcopy(element)
+        for hyperlink in clone.iter(qn('w:hyperlink')):
+            url = fragment['links'].get(hyperlink.get(qn('r:id')))
+            if url is not None:
+                hyperlink.set(qn('r:id'), hyperlink_rid(doc.part, url))
+        if values:
+            for run in clone.iter(qn('w:r')):
+                text = run.text
+                if '{{' in text:
+                    run.text = fill_placeholders(text, values)
+        if sectPr is not None:
+            sectPr.addprevious(clone)
+        else:
+            body.append(clone)
+
+def compile_fragment(name, build):
+    """Render build(doc) once per process into a scratch document and cache its body elements"""
+    global _fragment_scratch
+    fragment = _fragments.get(name)
+    if fragment is None:
+        # All fragments share one scratch document; each takes the elements its builder appended
+        if _fragment_scratch is None:
+            _fragment_scratch = new_document()
+        start = len(_fragment_scratch.element.body) - 1
+        build(_fragment_scratch)
+        fragment = capture_fragment(_fragment_scratch, start)
+        _fragments[name] = fragment
+    return fragment
+
+def render_fragment(doc, name, build, values=None):
+    """Append a copy of a precompiled static section to the document, filling its {{placeholders}} from values"""
+    insert_fragment(doc, compile_fragment(name, build), values)
+
+def _build_title_page(doc):
+    """Title page below the header, with placeholders for the location and the creator"""
+    # Document title
+    doc.add_paragraph()  # Add a blank line before the title
+    add_formatted_heading(doc, TITLE, level=0, font_size=16, alignment=WD_ALIGN_PARAGRAPH.CENTER)
+    
+    # Subtitle
+    add_formatted_heading(doc, SUBTITLE, level=1, font_size=14, alignment=WD_ALIGN_PARAGRAPH.CENTER)
+    
+    # Location info
+    add_formatted_paragraph(doc, LOCATION_LINE, font_size=11, alignment=WD_ALIGN_PARAGRAPH.CENTER)
+    
+    # Signature table
+    sig_table = doc.add_table(rows=2, cols=3)
+    sig_table.style = 'Light Grid Accent 1'
+    sig_table.alignment = WD_TABLE_ALIGNMENT.CENTER
+    
+    # Header row, then the content row
+    for row, texts in zip(sig_table.rows, SIGNATURE_ROWS):
+        for cell, text in zip(row.cells, texts):
+            cell.text = text
+    
+    # Format signature table
+    for row in sig_table.rows:
+        for cell in row.cells:
+            format_table_cell(cell, font_size=10, bold=False)
+    
+    # Format header row as bold
+    for cell in sig_table.rows[0].cells:
+        format_table_cell(cell, font_size=10, bold=True)
+    
+    add_formatted_paragraph(doc, DISTRIBUTION_LABEL, font_size=11, bold=True)
+    add_formatted_paragraph(doc, DISTRIBUTION_TEXT, font_size=11)
+
+def _build_history_page(doc):
+    """History of changes page, with a placeholder for the creation date"""
+    add_formatted_heading(doc, HISTORY_HEADING, level=1, font_size=14)
+    history_table = doc.add_table(rows=2, cols=3)
+    history_table.style = 'Light Grid Accent 1'
+    
+    for row, texts in zip(history_table.rows, HISTORY_ROWS):
+        for cell, text in zip(row.cells, texts):
+            cell.text = text
+    
+    # Format history table
+    for row in history_table.rows:
+        for cell in row.cells:
+            format_table_cell(cell, font_size=10, bold=False)
+    
+    # Format header row as bold
+    for cell in history_table.rows[0].cells:
+        format_table_cell(cell, font_size=10, bold=True)
+
+def add_contact_links(doc, web_contacts, email_contacts):
+    """Add the bulleted web and email contact links of the contacts page"""
+    contact_links = []
+    for contact in web_contacts:
+        contact_links.append((doc.add_paragraph('• '), contact['url'], contact['title'], contact['description']))
+    for contact in email_contacts:
+        contact_links.append((doc.add_paragraph('• '), f'mailto:{contact["email"]}', contact['email'], contact['description']))
+    
+    add_hyperlinks((para, url, title) for para, url, title, _ in contact_links)
+    for para, _, _, description in contact_links:
+        para.add_run(f': {description}')
+
+def _build_default_contacts_page(doc):
+    """Contacts and useful links page with the default CMS Safety contacts"""
+    add_formatted_heading(doc, CONTACTS_HEADING, level=1, font_size=14)
+    add_contact_links(doc, DEFAULT_WEB_CONTACTS, DEFAULT_EMAIL_CONTACTS)
+
+def _build_definitions_intro(doc):
+    """Hazards definitions page text above the definitions table"""
+    add_formatted_heading(doc, DEFINITIONS_HEADING, level=1, font_size=14)
+    
+    def_para = add_formatted_paragraph(doc, ISO_DEFINITION, font_size=11)
+    for run in def_para.runs:
+        run.italic = True
+    
+    # Add ISO link
+    iso_para = add_formatted_paragraph(doc, '', font_size=11)
+    add_hyperlink(iso_para, ISO_LINK.url, ISO_LINK.text)
+    
+    for instruction in DEFINITIONS_INSTRUCTIONS:
+        add_formatted_paragraph(doc, instruction, font_size=11)
+
+def _build_area_intro(doc):
+    """Headings of the "Your area" page"""
+    add_formatted_heading(doc, AREA_HEADING, level=1, font_size=14)
+    add_formatted_heading(doc, SUMMARY_HEADING, level=2, font_size=12)
+
+def _build_guideline_note(doc):
+    """HSE guideline note closing the activity description page"""
+    guideline_para = add_formatted_paragraph(doc, GUIDELINE_TEXT, font_size=11)
+    add_hyperlink(guideline_para, GUIDELINE_LINK.url, GUIDELINE_LINK.text)
+
+def _build_hazards_intro(doc):
+    """Heading of the hazard identification page"""
+    add_formatted_heading(doc, HAZARDS_HEADING, level=1, font_size=14)
+
+def _build_annex(doc):
+    """Annex section closing the report"""
+    add_formatted_heading(doc, ANNEX_HEADING, level=1, font_size=14)
+    add_formatted_paragraph(doc, ANNEX_TEXT, font_size=11)
+
+def add_annex_pictures(doc, images):
+    """Append the downscaled annex pictures (annex_images.AnnexImage), centred, each followed by its file name"""
+    for image in images:
+        picture_para = doc.add_paragraph()
+        picture_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        shape = picture_para.add_run().add_picture(image.path, width=Emu(image.width), height=Emu(image.height))
+        # Named after the upload, not the downscaled scratch file
+        _tag_picture(shape, os.path.basename(image.name))
+        caption = add_formatted_paragraph(doc, image.name, font_size=10, alignment=WD_ALIGN_PARAGRAPH.CENTER)
+        for run in caption.runs:
             run.italic = True
-        
-        # Add ISO link
-        iso_para = add_formatted_paragraph(doc, '', font_size=11)
-        add_hyperlink(iso_para, 'https://www.iso.org/obp/ui/fr/#iso:std:iso:45001:ed-1:v1:en', 'ISO 45001')
-        
-        add_formatted_paragraph(doc, '1. In the CHECK column of the table below, please check the hazards identified for the activity.', font_size=11)
-        add_formatted_paragraph(doc, '2. For each identified hazard, please refer to the identification sheet by simply clicking on the corresponding paragraph.', font_size=11)
-        
-        # Create hazard definitions table
-        create_hazard_definitions_table(doc, data)
-        
-        # Page 5: Your Area - Activity Summary Information
-        doc.add_page_break()
-        # Add header with logo
-        create_header_with_logo(doc, data)
-        add_formatted_heading(doc, '3 YOUR AREA', level=1, font_size=14)
-        add_formatted_heading(doc, '3.1 ACTIVITY SUMMARY INFORMATION', level=2, font_size=12)
-        
-        # Activity summary table
-        summary_table = doc.add_table(rows=7, cols=5)
-        summary_table.style = 'Light Grid Accent 1'
-        
-        # Fill activity summary
-        rows_data = [
-            ['Title', data.get('title', 'Enter the name of the specific activity'), '', '', ''],
-            ['Personnel', 'Name of the activity responsible:', data.get('responsiblePerson', 'Enter the name of the person leading activity'), '', ''],
-            ['', 'Estimated number of participants:', data.get('participantCount', 'Enter the number of people performing the activity'), '', ''],
-            ['Dates', 'Start date of the activity:', format_date(data.get('startDate')), f'Estimated end date:', format_date(data.get("endDate"))],
-            ['Location', 'Building number and specific zone:', f"{data.get('building', '')}/{data.get('location', '')}", '', ''],
-            ['', 'Location details:', f"{data.get('building', '')}/{data.get('room', '')}", '', ''],
-            ['Support', 'CERN specific support (Group):', data.get('cernSupport', 'Enter the name of the CERN group'), 'CMS specific support:', data.get('cmsSupport', 'Enter CMS team')]
-        ]
-        
-        for i, row_data in enumerate(rows_data):
-            cells = summary_table.rows[i].cells
-            
-            # Fill in the cell data first
-            for j, cell_data in enumerate(row_data):
-                if j < len(cells) and str(cell_data).strip():  # Only fill non-empty cells
-                    cells[j].text = str(cell_data)
-            
-            # Merge empty cells with the previous non-empty cell
-            last_non_empty = 0
-            for j in range(1, len(row_data)):
-                if j < len(cells):
-                    if not str(row_data[j]).strip():  # Empty cell
-                        # Find the last non-empty cell to merge with
-                        for k in range(j-1, -1, -1):
-                            if str(row_data[k]).strip():
-                                last_non_empty = k
-                                break
-                        # Don't merge here, just note the position
-                    else:
-                        last_non_empty = j
-            
-            # Apply merging for consecutive empty cells
-            j = 0
-            while j < len(row_data):
-                if j < len(cells) and str(row_data[j]).strip():  # Non-empty cell
-                    # Count consecutive empty cells after this one
-                    empty_count = 0
-                    for k in range(j + 1, len(row_data)):
-                        if not str(row_data[k]).strip():
-                            empty_count += 1
-                        else:
-                            break
-                    
-                    # Merge if there are empty cells
-                    if empty_count > 0 and j + empty_count < len(cells):
-                        try:
-                            merge_cells_horizontally(summary_table, i, j, j + empty_count)
-                        except Exception as e:
-                            print(f"Could not merge cells in row {i}: {e}")
-                    
-                    j += empty_count + 1
-                else:
-                    j += 1
-        # Set column widths
-        summary_table.columns[0].width = Inches(2.0)
-        summary_table.columns[1].width = Inches(2.0)
-        summary_table.columns[2].width = Inches(2.0)
-        summary_table.columns[3].width = Inches(1.0)
-        summary_table.columns[4].width = Inches(1.0)
-        
-        # Apply vertical merging for Personnel and Location sections
-        try:
-            # Merge Personnel cells (rows 1-2, column 0)
-            personnel_cell = summary_table.cell(1, 0)  # "Personnel" cell
-            empty_personnel_cell = summary_table.cell(2, 0)  # Empty cell below
-            personnel_cell.merge(empty_personnel_cell)
-            
-            # Merge Location cells (rows 4-5, column 0) 
-            location_cell = summary_table.cell(4, 0)  # "Location" cell
-            empty_location_cell = summary_table.cell(5, 0)  # Empty cell below
-            location_cell.merge(empty_location_cell)
-            
-            print("Vertical merging completed successfully")
-        except Exception as e:
-            print(f"Error with vertical merging: {e}")
-        
-        # Format all cells with consistent styling
-        for row in summary_table.rows:
-            for i, cell in enumerate(row.cells):
-                if i == 0:  # First column headers - bold
-                    format_table_cell(cell, font_size=10, bold=True, alignment=WD_ALIGN_PARAGRAPH.LEFT)
-                else:  # Content cells
-                    format_table_cell(cell, font_size=10, bold=False, alignment=WD_ALIGN_PARAGRAPH.LEFT)
-        
-        # Documents section
-        add_formatted_heading(doc, 'Existing documents (EDMS, Indico, …)', level=3, font_size=11)
-        
-        doc_table = doc.add_table(rows=3, cols=2)
-        doc_table.style = 'Light Grid Accent 1'
-        
-        doc_rows = [
-            ['Safety file:', data.get('safetyDocuments', 'Risk assessments, certificates, training records, VICs, etc.')],
-            ['Technical documents:', data.get('technicalDocuments', 'Technical documents for tooling/equipment used')],
-            ['Other useful documents:', data.get('otherDocuments', 'Procedures, instructions, task sheets, etc.')]
-        ]
-        
-        for i, (label, content) in enumerate(doc_rows):
-            cells = doc_table.rows[i].cells
-            cells[0].text = label
-            cells[1].text = content
-        # HSE Documents
-        add_formatted_heading(doc, 'Link with HSE (including HSE-RP)', level=3, font_size=11)
-        
-        hse_table = doc.add_table(rows=2, cols=2)
-        hse_table.style = 'Light Grid Accent 1'
-        
-        hse_data = [
-            ['Support by HSE on an already existing subject of activity:', data.get('hseSupport', 'HSE-RP, HSE inspections, etc. …')],
-            ['Reference documents (if any):', data.get('referenceDocuments', 'Additional supporting documentation from HSE: reports, derogation requests, advice, etc.')]
-        ]
-        for i, (label, content) in enumerate(hse_data):
-            cells = hse_table.rows[i].cells
-            cells[0].text = label
-            cells[1].text = content
-            
-        # Page 6: Activity Description
-        doc.add_page_break()
-        # Add header with logo
-        create_header_with_logo(doc, data)
-        add_formatted_heading(doc, '3.2 DESCRIPTION OF THE ACTIVITY', level=2, font_size=12)
-        
-        description_text = data.get('activityDescription', 'Further details about the activity...')
-        add_formatted_paragraph(doc, description_text, font_size=11)
-        
-        # HSE Guideline note
-        guideline_para = add_formatted_paragraph(doc, 'For the Section below, please consider to have a look to this valuable HSE Guideline: ', font_size=11)
-        add_hyperlink(guideline_para, 'https://edms.cern.ch/document/1114042', 'https://edms.cern.ch/document/1114042')
-        
-        # Page 7: Hazard identification section
-        doc.add_page_break()
-        # Add header with logo
-        create_header_with_logo(doc, data)
-        add_formatted_heading(doc, 'IDENTIFICATION OF THE HAZARDS FOR YOUR ACTIVITY', level=1, font_size=14)
-        
-        # Process hazard details
-        hazard_details = data.get('hazardDetails', {})
-        
-        if hazard_details:
-            for category_name, category_data in hazard_details.items():
-                if category_data and isinstance(category_data, dict):
-                    # Check if any hazards are selected in this category
-                    selected_hazards = {}
-                    for k, v in category_data.items():
-                        selected_status = v.get('selected', False)
-                        if selected_status == True or selected_status == 'true' or selected_status == 'True':
-                            selected_hazards[k] = v
-                    
-                    if selected_hazards:
-                        create_hazard_table(doc, category_name, selected_hazards)
+
+# Static sections precompiled by warm_up
+STATIC_FRAGMENTS = {
+    'title_page': _build_title_page,
+    'history_page': _build_history_page,
+    'default_contacts_page': _build_default_contacts_page,
+    'definitions_intro': _build_definitions_intro,
+    'area_intro': _build_area_intro,
+    'guideline_note': _build_guideline_note,
+    'hazards_intro': _build_hazards_intro,
+    'annex': _build_annex
+}
+
+def _render_title_section(doc, inputs):
+    """Title page"""
+    render_fragment(doc, 'title_page', _build_title_page, title_values(inputs))
+
+def _render_history_section(doc, inputs):
+    """History of changes page"""
+    render_fragment(doc, 'history_page', _build_history_page, inputs)
+
+def _render_contacts_section(doc, inputs):
+    """Contacts and useful links page, with fallback to the default contacts"""
+    web_contacts, email_contacts = contact_lists(inputs)
+    if web_contacts == DEFAULT_WEB_CONTACTS and email_contacts == DEFAULT_EMAIL_CONTACTS:
+        render_fragment(doc, 'default_contacts_page', _build_default_contacts_page)
+    else:
+        add_formatted_heading(doc, CONTACTS_HEADING, level=1, font_size=14)
+        add_contact_links(doc, web_contacts, email_contacts)
+
+def _render_definitions_section(doc, inputs):
+    """Hazards definitions page"""
+    render_fragment(doc, 'definitions_intro', _build_definitions_intro)
+    create_hazard_definitions_table(doc, inputs)
+
+def _render_activity_summary_section(doc, inputs):
+    """Activity summary information page (summary, documents and HSE tables)"""
+    render_fragment(doc, 'area_intro', _build_area_intro)
+    
+    # Activity summary table, its merges laid out up front by summary_spans
+    rows = activity_summary_rows(inputs)
+    # First column headers bold, content cells plain
+    add_spanned_table(doc, rows, [(10, True, WD_ALIGN_PARAGRAPH.LEFT)] + [(10, False, WD_ALIGN_PARAGRAPH.LEFT)] * 4,
+                      widths=SUMMARY_WIDTHS, spans=summary_spans(rows))
+    
+    # Documents section
+    add_formatted_heading(doc, DOCUMENTS_HEADING, level=3, font_size=11)
+    add_spanned_table(doc, document_rows(inputs))
+    
+    # HSE Documents
+    add_formatted_heading(doc, HSE_HEADING, level=3, font_size=11)
+    add_spanned_table(doc, hse_rows(inputs))
+
+def _render_description_section(doc, inputs):
+    """Description of the activity page"""
+    add_formatted_heading(doc, DESCRIPTION_HEADING, level=2, font_size=12)
+    
+    add_formatted_paragraph(doc, description_text(inputs), font_size=11)
+    
+    # HSE Guideline note
+    render_fragment(doc, 'guideline_note', _build_guideline_note)
+
+def _render_hazards_intro_section(doc, inputs):
+    """Heading of the hazard identification page"""
+    render_fragment(doc, 'hazards_intro', _build_hazards_intro)
+
+def _render_hazard_category_section(doc, inputs):
+    """Hazard table of one category"""
+    create_hazard_table(doc, inputs['category'], inputs['hazards'])
+
+# Word renderers of the section kinds listed by report_sections
+SECTION_RENDERERS = {
+    'title': _render_title_section,
+    'history': _render_history_section,
+    'contacts': _render_contacts_section,
+    'definitions': _render_definitions_section,
+    'activity_summary': _render_activity_summary_section,
+    'description': _render_description_section,
+    'hazards_intro': _render_hazards_intro_section,
+    'hazard_category': _render_hazard_category_section
+}
+
+def section_fingerprint(inputs):
+    """Hash the inputs of a section"""
+    canonical = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=_json_default)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+def render_section(doc, key, render, inputs):
+    """Append one report section; returns True when its cached XML was reused
+    
+    In a warm process (see serve) the rendered elements of each section are kept
+    with the fingerprint of their inputs, and reused while the inputs are unchanged.
+    """
+    if not _section_caching:
+        render(doc, inputs)
+        return False
+    
+    fingerprint = section_fingerprint(inputs)
+    cached = _section_cache.get(key)
+    if cached is not None and cached['fingerprint'] == fingerprint:
+        insert_fragment(doc, cached)
+        return True
+    
+    start = len(doc.element.body) - 1
+    render(doc, inputs)
+    fragment = capture_fragment(doc, start)
+    fragment['fingerprint'] = fingerprint
+    _section_cache[key] = fragment
+    return False
+
+def document_properties(data, generated):
+    """Core document properties from the payload and the generation date, by python-docx attribute name"""
+    return {
+        'title': 'Safety Report',
+        'subject': 'Hazard Identification Process in Areas',
+        'author': data.get('creatorName', ''),
+        'last_modified_by': data.get('creatorName', ''),
+        'comments': '',
+        'revision': 1,
+        'created': generated,
+        'modified': generated
+    }
+
+def set_core_properties(doc, data, generated):
+    """Fill the document properties from the payload and the generation date"""
+    properties = doc.core_properties
+    for name, value in document_properties(data, generated).items():
+        setattr(properties, name, value)
+
+def stream_document(data, hazard_index, generated, output, timestamp=None, images=()):
+    """Write the document with the streaming OOXML backend to a stream or file path (see open_output);
+    returns the package_writer.PackageStats
+    
+    The report is built section by section as report_model blocks and serialized
+    straight into the package, without a python-docx tree; the annex images are
+    copied into it from their spooled files. With a timestamp every package member
+    is dated with it for reproducible output.
+    """
+    def on_section(key, position, total):
+        report_progress({'event': 'section', 'section': key, 'index': position + 1, 'total': total})
+    
+    blocks = report_model.report_blocks(data, hazard_index, generated, images, on_section)
+    with open_output(output) as target:
+        return ooxml_writer.write_package(blocks, base_template(), target, document_properties(data, generated),
+                                          timestamp, load_asset, _package_policy)
+
+def generate_hazard_document(data, output_path, reproducible=None, backend=None):
+    """Generate the complete hazard identification document following CERN template
+    
+    reproducible (default: the --reproducible option) pins the generation date and
+    the package metadata, so the same payload always gives the same bytes. backend
+    (default: the --backend option) is 'docx' for python-docx or 'stream' for the
+    streaming OOXML writer, whose memory use stays flat on very large reports.
+    Uploaded pictures are downscaled into a scratch directory for the annex.
+    """
+    annex_dir = None
+    try:
+        logger.info("Starting document generation...")
+        logger.debug(f"Output path: {output_path}")
+        logger.debug(f"Data keys: {list(data.keys())}")
+        
+        if reproducible is None:
+            reproducible = _reproducible_default
+        backend = backend or _backend_default
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+        if data.get('catalogueVersion'):
+            with stage('catalogue'):
+                data = resolve_catalogue(data)
+        with stage('locations'):
+            data = resolve_locations(data)
+        generated = generation_date(data, reproducible)
+        output_name = output_path if isinstance(output_path, str) else '<stream>'
+        with stage('annex_scan'):
+            pictures = annex_images.scan_files(annex_files(data))
+        
+        cache_key = None
+        if _result_cache is not None:
+            with stage('cache_lookup'):
+                cache_key = _result_cache.key(data, generated, reproducible, backend,
+                                              [digest for _, digest, _ in pictures], _image_quality,
+                                              _package_policy.as_dict())
+                blob = _result_cache.get(cache_key)
+            if blob is not None:
+                write_output(blob, output_path)
+                index_report(data, output_path, generated)
+                logger.info(f"SUCCESS: Document served from the result cache ({cache_key[:12]}): {output_name}")
+                return True
+        
+        # Normalize the hazard selection once for every table builder
+        with stage('hazard_index'):
+            hazard_index = build_hazard_index(data)
+        
+        images = []
+        if pictures:
+            report_progress({'event': 'stage', 'stage': 'annex_images'})
+            annex_dir = tempfile.mkdtemp(prefix='hazid-annex-')
+            with stage('annex_images'):
+                images = annex_images.prepare_images(pictures, annex_dir, _image_quality)
+        
+        if backend == 'stream':
+            # Stream to memory only when the result cache needs the bytes
+            target = io.BytesIO() if cache_key is not None else output_path
+            with stage('stream'):
+                stats = stream_document(data, hazard_index, generated, target, generated if reproducible else None,
+                                        images)
+            report_package(stats, output_name)
+            if cache_key is not None:
+                blob = target.getvalue()
+                write_output(blob, output_path)
+                with stage('cache_store'):
+                    _result_cache.put(cache_key, blob)
+            index_report(data, output_path, generated, hazard_index)
+            logger.info(f"SUCCESS: Document streamed successfully: {output_name}")
+            return True
+        
+        with stage('new_document'):
+            doc = new_document()
+            set_core_properties(doc, data, generated)
+        
+        sections = report_sections(data, hazard_index, generated)
+        total = len(sections)
+        rendered = set()
+        reused = 0
+        for position, (key, kind, inputs, new_page) in enumerate(sections):
+            rendered.add(key)
+            report_progress({'event': 'section', 'section': key, 'index': position + 1, 'total': total})
+            with stage(f'section:{key}'):
+                if new_page:
+                    if position > 0:
+                        doc.add_page_break()
+                    # Add header with logo
+                    with stage('header'):
+                        create_header_with_logo(doc, data)
+                if render_section(doc, key, SECTION_RENDERERS[kind], inputs):
+                    reused += 1
+        if _section_caching:
+            logger.debug(f"Reused {reused} of {total} sections")
+            # Forget sections that are no longer part of the report (e.g. deselected categories)
+            for key in set(_section_cache) - rendered:
+                del _section_cache[key]
         
         # The "Other Hazards" category is already processed above in the main loop
         # No additional processing needed since it's now part of hazardDetails
         
-        if not hazard_details:
-            doc.add_paragraph('No hazard details provided.')
+        if not data.get('hazardDetails', {}):
+            doc.add_paragraph(NO_HAZARD_DETAILS)
         
         # Annex
-        add_formatted_heading(doc, 'ANNEX: PICTURES', level=1, font_size=14)
-        add_formatted_paragraph(doc, 'Attached to EDMS Reference.', font_size=11)
+        with stage('section:annex'):
+            render_fragment(doc, 'annex', _build_annex)
+            add_annex_pictures(doc, images)
         
         # Save document
-        print(f"Saving document to: {output_path}")
-        doc.save(output_path)
-        print(f"SUCCESS: Document generated successfully: {output_path}")
+        logger.debug(f"Saving document to: {output_name}")
+        # Save to memory only when the result cache needs the bytes
+        target = io.BytesIO() if cache_key is not None else output_path
+        report_progress({'event': 'stage', 'stage': 'save'})
+        with stage('save'):
+            stats = save_document(doc, target, generated if reproducible else None)
+        report_package(stats, output_name)
+        if cache_key is not None:
+            blob = target.getvalue()
+            write_output(blob, output_path)
+            with stage('cache_store'):
+                _result_cache.put(cache_key, blob)
+        index_report(data, output_path, generated, hazard_index)
+        logger.info(f"SUCCESS: Document generated successfully: {output_name}")
         return True
+    except _job_cancelled:
+        logger.info("Document generation cancelled")
+        raise
+    except Exception as e:
+        logger.exception(f"Error generating document: {e}")
+        raise e
+    finally:
+        if annex_dir is not None:
+            shutil.rmtree(annex_dir, ignore_errors=True)
+
+def generate_hazard_preview(data, output_path=None):
+    """Render the HTML preview of the document; returns the HTML, also written to output_path if given
+    
+    The preview lays out the same report_content sections as the document, without
+    python-docx, so it is cheap enough to refresh while the form is edited.
+    """
+    try:
+        if data.get('catalogueVersion'):
+            data = resolve_catalogue(data)
+        data = resolve_locations(data)
+        with stage('preview'):
+            markup = html_preview.render_preview(data, generation_date(data))
+        if output_path is not None:
+            write_output(markup.encode('utf-8'), output_path)
+        return markup
     except Exception as e:
-        print(f"Error generating document: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error generating preview: {e}")
         raise e
 
+def read_payload(f):
+    """Parse a payload from an open file, incrementally with --stream-input (release it with close_payload)"""
+    if _stream_input:
+        return payload_stream.load_payload(f)
+    return json.load(f)
+
+def load_job_data(job):
+    """Return the payload of a job, given inline as 'data' or as an 'input' JSON file path"""
+    if 'data' in job:
+        return job['data']
+    if 'input' in job:
+        with open(job['input'], 'r', encoding='utf-8') as f:
+            return read_payload(f)
+    raise ValueError("Job must provide either 'data' or 'input'")
+
+def run_job(job):
+    """Generate the document described by a job and return a result record"""
+    started = time.perf_counter()
+    result = {'id': job.get('id'), 'ok': False, 'output': job.get('output')}
+    try:
+        if not job.get('output'):
+            raise ValueError("Job must provide an 'output' path")
+        if job['output'] == '-':
+            raise ValueError("Jobs cannot write to stdout, provide an 'output' path")
+        with _generation_lock:
+            if job.get('profile'):
+                start_profiling()
+            data = {}
+            try:
+                with stage('json_load'):
+                    data = load_job_data(job)
+                generate_hazard_document(data, job['output'], job.get('reproducible'), job.get('backend'))
+            finally:
+                payload_stream.close_payload(data)
+                if job.get('profile'):
+                    result['profile'] = stop_profiling()
+        result['ok'] = True
+    except _job_cancelled:
+        result['cancelled'] = True
+        result['error'] = 'Job cancelled'
+    except Exception as e:
+        result['error'] = str(e)
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def run_service_job(job, progress):
+    """Run a job for the job service, reporting its progress (and cancellation) through progress"""
+    global _progress_hook, _job_cancelled
+    import job_service
+    _progress_hook, _job_cancelled = progress, job_service.JobCancelled
+    try:
+        return run_job(job)
+    finally:
+        _progress_hook, _job_cancelled = None, ()
+
+def handle_serve_message(line):
+    """Handle one line of the --serve protocol; returns the result record, or None to stop"""
+    try:
+        message = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {'id': None, 'ok': False, 'error': f'Invalid JSON job: {e}'}
+    if not isinstance(message, dict):
+        return {'id': None, 'ok': False, 'error': 'Job must be a JSON object'}
+    
+    command = message.get('command')
+    if command == 'shutdown':
+        return None
+    if command == 'ping':
+        return {'id': message.get('id'), 'ok': True, 'pid': os.getpid()}
+    if command == 'validate':
+        data = {}
+        with _generation_lock:
+            try:
+                data = load_job_data(message)
+                errors = validate_payload(data)
+                warnings = location_warnings(data) if not errors else []
+            except Exception as e:
+                errors, warnings = [str(e)], []
+            finally:
+                payload_stream.close_payload(data)
+        return {'id': message.get('id'), 'ok': not errors, 'errors': errors, 'warnings': warnings}
+    if command == 'preview':
+        data = {}
+        with _generation_lock:
+            try:
+                data = load_job_data(message)
+                markup = generate_hazard_preview(data, message.get('output'))
+            except Exception as e:
+                return {'id': message.get('id'), 'ok': False, 'error': str(e)}
+            finally:
+                payload_stream.close_payload(data)
+        result = {'id': message.get('id'), 'ok': True}
+        if not message.get('output'):
+            result['html'] = markup
+        return result
+    return run_job(message)
+
+def serve_stream(stream_in, stream_out):
+    """Read newline-delimited JSON jobs from stream_in and write one JSON result line per job.
+    
+    Returns False when a shutdown command was received, True when the input was exhausted.
+    """
+    for line in stream_in:
+        line = line.strip()
+        if not line:
+            continue
+        result = handle_serve_message(line)
+        if result is None:
+            return False
+        stream_out.write(json.dumps(result) + '\n')
+        stream_out.flush()
+    return True
+
+class _ServeRequestHandler(socketserver.StreamRequestHandler):
+    """Serve the newline-delimited JSON job protocol over one socket connection"""
+    
+    def handle(self):
+        stream_in = io.TextIOWrapper(self.rfile, encoding='utf-8')
+        stream_out = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+        if not serve_stream(stream_in, stream_out):
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+def warm_up():
+    """Load the template, logo assets and static sections so the first job does not pay for them"""
+    new_document()
+    for filename in HEADER_LOGOS:
+        load_asset(filename)
+    for name, build in STATIC_FRAGMENTS.items():
+        compile_fragment(name, build)
+
+def run_job_service(host, port, socket_path=None, workers=None, queue_size=None, options=None, log_level='INFO',
+                    output_root=None):
+    """Run the local HTTP job service (see job_service) on warm worker processes
+    
+    options holds the configure_generation() arguments for the worker processes.
+    """
+    import job_service
+    service = job_service.JobService(run_service_job, _init_batch_worker, (log_level, options or {}),
+                                     workers, queue_size or job_service.DEFAULT_QUEUE_SIZE, output_root)
+    return job_service.run_service(service, host, port or job_service.DEFAULT_PORT, socket_path)
+
+def serve(socket_path=None):
+    """Run as a long-lived worker, on stdin/stdout or on a local Unix socket"""
+    global _section_caching
+    protocol_out = sys.stdout
+    # Diagnostics from the generator must not be interleaved with protocol lines
+    sys.stdout = sys.stderr
+    warm_up()
+    # Successive jobs are usually re-exports of the same draft
+    _section_caching = True
+    
+    if not socket_path:
+        logger.info(f"Serving jobs on stdin (pid {os.getpid()})")
+        serve_stream(sys.stdin, protocol_out)
+        return 0
+    
+    if not hasattr(socket, 'AF_UNIX'):
+        logger.error("Unix sockets are not supported on this platform, use --serve without --socket.")
+        return 1
+    
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, _ServeRequestHandler)
+    server.daemon_threads = True
+    logger.info(f"Serving jobs on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return 0
+
+def collect_batch_jobs(source, out_dir=None):
+    """Build the --batch job list from a directory of JSON payloads or a JSONL manifest.
+    
+    Manifest lines are jobs ({"id", "input" or "data", "output"}) or bare payloads.
+    Returns (jobs, invalid) where invalid holds result records for unreadable lines.
+    """
+    jobs = []
+    invalid = []
+    
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if not name.lower().endswith('.json'):
+                continue
+            stem = os.path.splitext(name)[0]
+            jobs.append({
+                'id': stem,
+                'input': os.path.join(source, name),
+                'output': os.path.join(out_dir or source, f'{stem}.docx')
+            })
+        return jobs, invalid
+    
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                if not isinstance(entry, dict):
+                    raise ValueError('manifest entry must be a JSON object')
+            except ValueError as e:
+                invalid.append({'id': f'line-{line_number}', 'ok': False, 'output': None,
+                                'error': f'Invalid manifest line {line_number}: {e}', 'elapsed_ms': 0.0})
+                continue
+            
+            job = dict(entry) if ('input' in entry or 'data' in entry) else {'data': entry}
+            if 'input' in job:
+                job['input'] = os.path.join(base_dir, job['input'])
+                default_id = os.path.splitext(os.path.basename(job['input']))[0]
+            else:
+                default_id = f'job-{line_number}'
+            job['id'] = str(job.get('id') or default_id)
+            if job.get('output'):
+                job['output'] = os.path.join(out_dir or base_dir, job['output'])
+            else:
+                job['output'] = os.path.join(out_dir or base_dir, f"{job['id']}.docx")
+            jobs.append(job)
+    return jobs, invalid
+
+def _init_batch_worker(log_level, options):
+    """Pool initializer: apply the logging and generation options and warm the caches"""
+    configure_logging(log_level)
+    configure_generation(**options)
+    warm_up()
+
+def print_batch_summary(results, wall_seconds, workers):
+    """Print totals, throughput and per-job timings for a batch run"""
+    succeeded = [r for r in results if r['ok']]
+    failed = [r for r in results if not r['ok']]
+    timings = [r['elapsed_ms'] for r in succeeded]
+    import statistics
+    
+    print()
+    print('Batch summary')
+    print(f'  Jobs: {len(results)} ({len(succeeded)} succeeded, {len(failed)} failed)')
+    throughput = len(succeeded) / wall_seconds if wall_seconds > 0 else 0.0
+    print(f'  Wall time: {wall_seconds:.2f} s, throughput: {throughput:.2f} documents/s with {workers} workers')
+    if timings:
+        print(f'  Job time (ms): min {min(timings):.1f}, median {statistics.median(timings):.1f}, '
+              f'mean {statistics.mean(timings):.1f}, max {max(timings):.1f}')
+    
+    print('  Per-job timings (ms, slowest first):')
+    for r in sorted(results, key=lambda r: r.get('elapsed_ms') or 0.0, reverse=True):
+        status = 'OK' if r['ok'] else 'FAILED'
+        print(f"    {r.get('elapsed_ms') or 0.0:10.1f}  {status:<6}  {r['id']}")
+    
+    if failed:
+        print('  Failures:')
+        for r in failed:
+            print(f"    {r['id']}: {r.get('error')}")
+
+def run_batch(source, out_dir=None, workers=None, verbose=False, options=None, log_level='INFO'):
+    """Generate every job of a directory or JSONL manifest across a process pool
+    
+    options holds the configure_generation() arguments for the worker processes.
+    Their per-document diagnostics are only kept (at log_level) when verbose.
+    """
+    if not os.path.exists(source):
+        logger.error(f"Batch source '{source}' not found.")
+        return 1
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    
+    jobs, results = collect_batch_jobs(source, out_dir)
+    workers = workers or os.cpu_count() or 1
+    total = len(jobs) + len(results)
+    print(f"Batch: {total} jobs from {source} with {workers} workers", flush=True)
+    for result in results:
+        print(f"[{result['id']}] FAILED {result['error']}", flush=True)
+    
+    started = time.perf_counter()
+    if jobs:
+        # Imported here: only batch runs need the process pool
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(log_level if verbose else 'WARNING', options or {})) as pool:
+            futures = {pool.submit(run_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. out of memory)
+                    result = {'id': job['id'], 'ok': False, 'output': job['output'],
+                              'error': f'Worker failure: {e}', 'elapsed_ms': None}
+                results.append(result)
+                if result['ok']:
+                    print(f"[{len(results)}/{total}] OK     {result['id']} -> {result['output']} "
+                          f"({result['elapsed_ms']:.1f} ms)", flush=True)
+                else:
+                    print(f"[{len(results)}/{total}] FAILED {result['id']}: {result['error']}", flush=True)
+    
+    print_batch_summary(results, time.perf_counter() - started, workers)
+    return 0 if all(r['ok'] for r in results) else 1
+
+def collect_patch_jobs(source, out_dir=None):
+    """List the reports to patch: source itself, or every .docx under a directory
+    
+    Reports are patched in place, or written to out_dir under their path relative to source.
+    """
+    if not os.path.isdir(source):
+        return [{'id': os.path.basename(source), 'input': source,
+                 'output': os.path.join(out_dir, os.path.basename(source)) if out_dir else source}]
+    jobs = []
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            # Skip Word's lock files and the temporary files of interrupted writes
+            if not name.lower().endswith('.docx') or name.startswith(('~$', '.')):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, source)
+            jobs.append({'id': relative, 'input': path,
+                         'output': os.path.join(out_dir, relative) if out_dir else path})
+    return jobs
+
+def run_patch_job(job, patch):
+    """Apply a patch to the report of a job and return a result record"""
+    started = time.perf_counter()
+    result = {'id': job['id'], 'ok': False, 'output': job['output']}
+    try:
+        # Read whole, so the report can be replaced in place while it is patched
+        with open(job['input'], 'rb') as f:
+            source = io.BytesIO(f.read())
+        if job['output'] != job['input']:
+            os.makedirs(os.path.dirname(job['output']) or '.', exist_ok=True)
+        with zipfile.ZipFile(source) as package:
+            parts, summary = report_patch.patch_package(package, patch)
+            if parts or job['output'] != job['input']:
+                with open_output(job['output']) as f:
+                    if parts:
+                        report_patch.write_package(package, f, parts, _package_policy)
+                    else:
+                        f.write(source.getvalue())
+        result['changed'] = bool(parts)
+        result['summary'] = summary
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = str(e)
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def _init_patch_worker(log_level, options):
+    """Pool initializer of --patch: apply the logging and package options (no generation caches to warm)"""
+    configure_logging(log_level)
+    configure_generation(**options)
+
+def run_patch(source, patch_file, out_dir=None, workers=None, verbose=False, options=None, log_level='INFO'):
+    """Apply a patch file to a report or to every report under a directory, across a process pool"""
+    try:
+        with open(patch_file, 'r', encoding='utf-8') as f:
+            patch = report_patch.parse_patch(json.load(f))
+    except (OSError, ValueError) as e:
+        logger.error(f"Invalid patch '{patch_file}': {e}")
+        return 1
+    if not source or not os.path.exists(source):
+        logger.error(f"Reports '{source}' not found.")
+        return 1
+    
+    jobs = collect_patch_jobs(source, out_dir)
+    workers = min(workers or os.cpu_count() or 1, max(len(jobs), 1))
+    print(f"Patch: {len(jobs)} reports from {source} with {workers} workers", flush=True)
+    
+    results = []
+    started = time.perf_counter()
+    if jobs:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_patch_worker,
+                                 initargs=(log_level if verbose else 'WARNING', options or {})) as pool:
+            futures = {pool.submit(run_patch_job, job, patch): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'id': job['id'], 'ok': False, 'output': job['output'],
+                              'error': f'Worker failure: {e}', 'elapsed_ms': None}
+                results.append(result)
+                if not result['ok']:
+                    print(f"[{len(results)}/{len(jobs)}] FAILED {result['id']}: {result['error']}", flush=True)
+                elif result['changed']:
+                    changes = ', '.join(f"{value} {key.replace('_', ' ')}" for key, value in result['summary'].items()
+                                        if value)
+                    print(f"[{len(results)}/{len(jobs)}] OK     {result['id']} ({changes}, "
+                          f"{result['elapsed_ms']:.1f} ms)", flush=True)
+                else:
+                    print(f"[{len(results)}/{len(jobs)}] SAME   {result['id']} (nothing to patch)", flush=True)
+    
+    print_batch_summary(results, time.perf_counter() - started, workers)
+    return 0 if all(r['ok'] for r in results) else 1
+
+def run_search(index_path, text=None, categories=(), place=None, between=None):
+    """Print the reports of the --index database matching the --search filters, one JSON line each"""
+    if not index_path or not os.path.exists(index_path):
+        logger.error(f"Report index '{index_path}' not found, generate reports with --index first.")
+        return 1
+    try:
+        import report_index
+        reports = report_index.ReportIndex(index_path).search(text, categories, place, between)
+    except Exception as e:
+        logger.error(f"Search failed: {e}")
+        return 1
+    for report in reports:
+        print(json.dumps(report, ensure_ascii=False))
+    logger.info(f"{len(reports)} matching reports")
+    return 0
+
+def run_validate(input_file):
+    """Validate a payload file (or stdin for '-') and print the JSON result"""
+    data = {}
+    try:
+        if not input_file:
+            raise ValueError('no input file given')
+        if input_file == '-':
+            data = read_payload(sys.stdin.buffer)
+        else:
+            with open(input_file, 'r', encoding='utf-8') as f:
+                data = read_payload(f)
+        errors = validate_payload(data)
+        warnings = location_warnings(data) if not errors else []
+    except (OSError, ValueError) as e:
+        errors, warnings = [f'Cannot read payload: {e}'], []
+    finally:
+        payload_stream.close_payload(data)
+    print(json.dumps({'ok': not errors, 'errors': errors, 'warnings': warnings}))
+    return 0 if not errors else 1
+
+def run_locate(query):
+    """Print what the location reference knows of 'BUILDING[/ROOM]' as JSON: TSOs, and rooms or buildings by prefix"""
+    try:
+        locations = get_locations()
+        if locations is None:
+            raise ValueError(f"Location workbook '{location_reference.LOCATION_WORKBOOK}' not found, "
+                             "pass its path with --locations")
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        print(json.dumps({'ok': False, 'error': str(e)}))
+        return 1
+    building_text, _, room = query.partition('/')
+    building = locations.building(building_text)
+    if building is None:
+        result = {'ok': False, 'error': f"Building '{building_text}' is not in the location reference",
+                  'buildings': locations.buildings_with_prefix(location_reference.parse_building(building_text)[0])}
+    else:
+        rooms = locations.rooms_with_prefix(building, room)
+        result = {'ok': bool(rooms) or not room, 'building': building.code, 'zone': building.zone,
+                  'tso': building.tso, 'dtso': building.dtso, 'rooms': rooms}
+    print(json.dumps(result, ensure_ascii=False))
+    return 0 if result['ok'] else 1
+
+def run_compile_catalogue():
+    """Compile the hazard catalogue and print its version and size as JSON"""
+    try:
+        catalogue = get_catalogue()
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        print(json.dumps({'ok': False, 'error': str(e)}))
+        return 1
+    print(json.dumps({'ok': True, **catalogue.stats()}))
+    return 0
+
 def main():
     """Main function to handle command line arguments"""
-    print(f"Python script started with args: {sys.argv}")
-    print(f"Current working directory: {os.getcwd()}")
+    parser = argparse.ArgumentParser(description='Generate a hazard identification document (.docx) from JSON data.')
+    parser.add_argument('input_file', nargs='?', help="input JSON file, or '-' for stdin")
+    parser.add_argument('output_file', nargs='?', help="output DOCX file, or '-' for stdout")
+    parser.add_argument('--output-fd', type=int, metavar='FD',
+                        help='write the DOCX bytes to this inherited file descriptor instead of a file')
+    parser.add_argument('--serve', action='store_true',
+                        help='run as a warm worker reading newline-delimited JSON jobs '
+                             '({"id", "data" or "input", "output"}) and writing one JSON result line per job')
+    parser.add_argument('--service', action='store_true',
+                        help='run the local HTTP job service: a priority queue of jobs on a pool of warm workers, '
+                             'with progress events and cancellation')
+    # job_service is only imported for --service, so its defaults are restated in the help
+    parser.add_argument('--port', type=int,
+                        help='with --service, listen on this localhost port (default: 8765)')
+    parser.add_argument('--queue-size', type=int, metavar='N',
+                        help='with --service, refuse new jobs (HTTP 429) while this many are queued '
+                             '(default: 64)')
+    parser.add_argument('--output-root', metavar='DIR',
+                        help='with --service, refuse jobs whose output is not inside this directory')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='with --serve or --service, listen on this Unix socket instead of stdin/stdout or the port')
+    parser.add_argument('--batch', metavar='SOURCE',
+                        help='generate every payload of a directory of JSON files or of a JSONL manifest')
+    parser.add_argument('--patch', metavar='PATCH_JSON',
+                        help='update existing reports in place (the input is a .docx or a directory of them): new '
+                             'header metadata, contacts list and hyperlink URLs; other package parts are copied as stored')
+    parser.add_argument('--out-dir', metavar='DIR',
+                        help='with --batch, write documents to this directory; with --patch, write the patched '
+                             'reports there instead of in place')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='with --batch, --patch or --service, number of worker processes (default: CPU count)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='with --batch or --patch, keep per-document diagnostics (on stderr)')
+    parser.add_argument('--reproducible', action='store_true',
+                        help="pin the generation date ('generationDate' in the payload, or SOURCE_DATE_EPOCH) "
+                             'and the package metadata so identical payloads give identical bytes')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='reuse documents stored in this directory for identical payloads')
+    parser.add_argument('--cache-size', type=float, metavar='MB', default=DEFAULT_CACHE_SIZE_MB,
+                        help=f'with --cache-dir, evict the least recently used documents beyond this size '
+                             f'(default: {DEFAULT_CACHE_SIZE_MB} MB)')
+    parser.add_argument('--backend', choices=BACKENDS, default='docx',
+                        help="document backend: 'docx' (python-docx, the reference) or 'stream' (writes document.xml "
+                             'straight into the package, with flat memory use on huge reports; default: docx)')
+    parser.add_argument('--image-quality', type=int, metavar='Q', default=annex_images.DEFAULT_QUALITY,
+                        help='JPEG quality (1-95) of the annex pictures, downscaled to the page width '
+                             f'(default: {annex_images.DEFAULT_QUALITY})')
+    parser.add_argument('--compress-level', type=int, metavar='N', choices=range(10),
+                        default=package_writer.DEFAULT_COMPRESS_LEVEL,
+                        help='deflate level of the package parts, 0 (store) to 9 '
+                             f'(default: {package_writer.DEFAULT_COMPRESS_LEVEL})')
+    parser.add_argument('--deflate-media', action='store_true',
+                        help='also deflate PNG/JPEG/GIF parts, which are otherwise stored as they are')
+    parser.add_argument('--fsync', action='store_true',
+                        help='flush output files and their rename to disk before reporting success')
+    parser.add_argument('--index', metavar='DB',
+                        help='record every generated report (activity, dates, place and selected hazards) in this '
+                             'SQLite database, for --search')
+    parser.add_argument('--search', nargs='?', const='', metavar='TEXT',
+                        help='list the reports of the --index database matching TEXT, a full-text query over the '
+                             "hazards ('radiation OR lifting'), and the --category, --place and --between filters")
+    parser.add_argument('--category', action='append', default=[], metavar='NAME',
+                        help='with --search, only hazards of this category (repeat for several)')
+    parser.add_argument('--place', metavar='NAME',
+                        help='with --search, only activities in this building, room or location')
+    parser.add_argument('--between', nargs=2, metavar=('FROM', 'TO'),
+                        help="with --search, only activities overlapping this period (YYYY-MM-DD, '' for open)")
+    parser.add_argument('--stream-input', action='store_true',
+                        help='parse input payloads incrementally, spooling the hazardDetails categories to a temporary '
+                             'file so memory follows the largest category (pair with --backend stream)')
+    parser.add_argument('--preview', action='store_true',
+                        help='write an HTML preview of the document to the output file instead of the DOCX')
+    parser.add_argument('--validate', action='store_true',
+                        help='only check the input payload against the schema and print a JSON result '
+                             '({"ok", "errors"}); exits 1 when it is invalid')
+    parser.add_argument('--catalogue', metavar='XLSX',
+                        help='hazard catalogue workbook for payloads that give a catalogueVersion instead of '
+                             f'hazardDefinitions (default: data/excel/{excel_catalogue.CATALOGUE_WORKBOOK})')
+    parser.add_argument('--locations', metavar='XLSX',
+                        help="building/room reference workbook giving the TSO of the report's building and checking "
+                             f'its building and room (default: data/excel/{location_reference.LOCATION_WORKBOOK})')
+    parser.add_argument('--locate', metavar='BUILDING[/ROOM]',
+                        help='print the TSOs of a building and its rooms starting with ROOM as JSON (or the '
+                             'buildings starting with BUILDING when it is unknown)')
+    parser.add_argument('--compile-catalogue', action='store_true',
+                        help='compile the hazard catalogue workbook into the cache and print its version as JSON')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='level of the diagnostics written to stderr (default: INFO)')
+    parser.add_argument('--profile', metavar='PATH',
+                        help="write a JSON report of per-stage wall time, allocations and peak RSS to PATH ('-' for stderr)")
+    args = parser.parse_args()
+    if not 1 <= args.image_quality <= 95:
+        parser.error('--image-quality must be between 1 and 95')
+    
+    configure_logging(args.log_level)
+    options = {'reproducible': args.reproducible, 'cache_dir': args.cache_dir, 'cache_size_mb': args.cache_size,
+               'catalogue': args.catalogue, 'backend': args.backend, 'image_quality': args.image_quality,
+               'compress_level': args.compress_level, 'store_media': not args.deflate_media, 'fsync': args.fsync,
+               'index': args.index, 'stream_input': args.stream_input, 'locations': args.locations}
+    configure_generation(**options)
+    
+    if args.compile_catalogue:
+        sys.exit(run_compile_catalogue())
+    if args.validate:
+        sys.exit(run_validate(args.input_file))
+    if args.locate is not None:
+        sys.exit(run_locate(args.locate))
+    if args.search is not None:
+        sys.exit(run_search(args.index, args.search, args.category, args.place, args.between))
+    if args.serve:
+        sys.exit(serve(args.socket))
+    if args.service:
+        sys.exit(run_job_service('127.0.0.1', args.port, args.socket, args.workers, args.queue_size, options,
+                                 args.log_level, args.output_root))
+    if args.batch:
+        sys.exit(run_batch(args.batch, args.out_dir, args.workers, args.verbose, options, args.log_level))
+    if args.patch:
+        sys.exit(run_patch(args.input_file, args.patch, args.out_dir, args.workers, args.verbose, options,
+                           args.log_level))
+    
+    output_stream = None
+    if args.output_fd is not None:
+        output_stream = os.fdopen(args.output_fd, 'wb', closefd=False)
+    elif args.output_file == '-':
+        output_stream = sys.stdout.buffer
+    if output_stream is not None or args.input_file == '-':
+        # Keep stdout free for the document (or the piped input's producer); diagnostics go to stderr
+        sys.stdout = sys.stderr
     
-    if len(sys.argv) != 3:
-        print("Usage: python generate_docx.py <input_json_file> <output_docx_file>")
+    logger.debug(f"Python script started with args: {sys.argv}")
+    logger.debug(f"Current working directory: {os.getcwd()}")
+    
+    if not args.input_file or not (args.output_file or output_stream):
+        print("Usage: python generate_docx.py <input_json_file|-> <output_docx_file|->")
+        print("       python generate_docx.py <input_json_file|-> --output-fd FD")
+        print("       python generate_docx.py --serve [--socket PATH]")
+        print("       python generate_docx.py --service [--port PORT | --socket PATH] [--workers N] [--queue-size N] [--output-root DIR]")
+        print("       python generate_docx.py --batch <directory|manifest.jsonl> [--out-dir DIR] [--workers N]")
+        print("       python generate_docx.py --patch <patch_json> <report.docx|directory> [--out-dir DIR] [--workers N]")
+        print("       python generate_docx.py --preview <input_json_file|-> <output_html_file|->")
+        print("       python generate_docx.py --validate <input_json_file|->")
+        print("       python generate_docx.py --index DB --search [TEXT] [--category NAME] [--place NAME] [--between FROM TO]")
+        print("       python generate_docx.py --compile-catalogue [--catalogue XLSX]")
+        print("       python generate_docx.py --locate BUILDING[/ROOM] [--locations XLSX]")
+        print("Options: --reproducible, --backend {docx,stream}, --cache-dir DIR [--cache-size MB], --catalogue XLSX, "
+              "--locations XLSX, --image-quality Q, --compress-level N, --deflate-media, --fsync, --index DB, "
+              "--stream-input, --log-level LEVEL, --profile PATH")
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    input_file = args.input_file
+    output_file = args.output_file if output_stream is None else output_stream
     
-    print(f"Input file: {input_file}")
-    print(f"Output file: {output_file}")
+    logger.debug(f"Input file: {'<stdin>' if input_file == '-' else input_file}")
+    logger.debug(f"Output file: {args.output_file if args.output_fd is None else f'<fd {args.output_fd}>'}")
     
+    if args.profile:
+        start_profiling()
+    data = {}
+    generating = False
     try:
-        # Check if input file exists
-        if not os.path.exists(input_file):
-            print(f"Error: Input file '{input_file}' not found.")
-            sys.exit(1)
+        with stage('json_load'):
+            if input_file == '-':
+                data = read_payload(sys.stdin.buffer)
+            else:
+                # Check if input file exists
+                if not os.path.exists(input_file):
+                    logger.error(f"Input file '{input_file}' not found.")
+                    sys.exit(1)
+                
+                with open(input_file, 'r', encoding='utf-8') as f:
+                    data = read_payload(f)
         
         # Check if we can write to output directory
-        output_dir = os.path.dirname(output_file)
-        if output_dir and not os.path.exists(output_dir):
-            print(f"Error: Output directory '{output_dir}' does not exist.")
-            sys.exit(1)
-        
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        print(f"Successfully loaded JSON data with {len(data)} keys")
-        generate_hazard_document(data, output_file)
-        print("Document generation completed successfully!")
+        if output_stream is None:
+            output_dir = os.path.dirname(output_file)
+            if output_dir and not os.path.exists(output_dir):
+                logger.error(f"Output directory '{output_dir}' does not exist.")
+                sys.exit(1)
+        
+        logger.debug(f"Successfully loaded JSON data with {len(data)} keys")
+        generating = True
+        if args.preview:
+            generate_hazard_preview(data, output_file)
+        else:
+            generate_hazard_document(data, output_file)
         
     except FileNotFoundError:
-        print(f"Error: Input file '{input_file}' not found.")
+        logger.error(f"Input file '{input_file}' not found.")
         sys.exit(1)
     except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON in file '{input_file}': {e}")
+        logger.error(f"Invalid JSON in file '{input_file}': {e}")
         sys.exit(1)
     except Exception as e:
-        print(f"Error generating document: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        # generate_hazard_document and generate_hazard_preview log their own errors
+        if not generating:
+            logger.exception(f"Error reading input file '{input_file}': {e}")
         sys.exit(1)
+    finally:
+        payload_stream.close_payload(data)
+        if args.profile:
+            write_profile_report(stop_profiling(), args.profile)
 
 if __name__ == "__main__":
+    # Required for the process pool in the PyInstaller executable
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
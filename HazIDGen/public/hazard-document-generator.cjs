@@ -108,28 +108,264 @@ function generateTextFallback(data) {
   return content;
 }
 
-async function generateHazardDocument(data, outputPath) {
-  try {
-    console.log('Starting document generation with standalone Python executable...');
+/**
+ * Resolve the path to the standalone Python executable
+ * 
+ * In development, use the built executable.
+ * In packaged app, it should be in the resources directory.
+ * 
+ * @returns {string} Path to generate_docx.exe
+ */
+function getPythonExePath() {
+  const { app } = require('electron');
+  
+  if (app && app.isPackaged) {
+    // In packaged app, look for the executable in resources
+    return path.join(process.resourcesPath, 'app', 'dist', 'generate_docx.exe');
+  }
+  // In development, use the local build
+  return path.join(__dirname, '..', 'dist', 'generate_docx.exe');
+}
+
+/**
+ * Resolve the directory of the generator's on-disk result cache
+ * 
+ * Identical exports are served from this cache without rendering again.
+ * 
+ * @returns {string|null} Cache directory, or null outside of Electron
+ */
+function getResultCacheDir() {
+  const { app } = require('electron');
+  
+  if (app && typeof app.getPath === 'function') {
+    return path.join(app.getPath('userData'), 'docx-cache');
+  }
+  return null;
+}
+
+/**
+ * Resolve the hazard catalogue workbook, preferring the editable external copy
+ * 
+ * Payloads that give a catalogueVersion instead of hazardDefinitions are resolved
+ * against the catalogue compiled from this workbook.
+ * 
+ * @returns {string|null} Path to the workbook, or null if none is found
+ */
+function getCataloguePath() {
+  const { app } = require('electron');
+  const fileName = 'CMS_Safety-List_Preventive_Protective_Measures.xlsx';
+  const candidates = app && app.isPackaged
+    ? [
+        path.join(process.resourcesPath, '..', 'data', 'excel', fileName),
+        path.join(process.resourcesPath, 'app', 'data', 'excel', fileName)
+      ]
+    : [path.join(process.cwd(), 'data', 'excel', fileName)];
+  return candidates.find(candidate => fs.existsSync(candidate)) || null;
+}
+
+/**
+ * Command line options shared by the warm worker and one-shot runs
+ * 
+ * @returns {string[]} Extra arguments for generate_docx
+ */
+function getGeneratorOptions() {
+  const options = [];
+  const cacheDir = getResultCacheDir();
+  if (cacheDir) {
+    options.push('--cache-dir', cacheDir);
+  }
+  const cataloguePath = getCataloguePath();
+  if (cataloguePath) {
+    options.push('--catalogue', cataloguePath);
+  }
+  return options;
+}
+
+/**
+ * Warm worker running `generate_docx --serve`
+ * 
+ * The executable is started once per session and kept alive, so repeated exports
+ * skip the interpreter start-up and imports. Jobs are written to its stdin as
+ * newline-delimited JSON and matched to result lines on stdout by id.
+ */
+let warmWorker = null;
+
+/**
+ * Start a warm worker process
+ * 
+ * @param {string} pythonExePath - Path to the standalone Python executable
+ * @returns {Object} Worker state (process, pending jobs, line buffer)
+ */
+function startWarmWorker(pythonExePath) {
+  console.log('Starting warm Python worker:', pythonExePath);
+  
+  const worker = {
+    process: spawn(pythonExePath, ['--serve', ...getGeneratorOptions()], { stdio: ['pipe', 'pipe', 'pipe'] }),
+    pending: new Map(),
+    nextId: 1,
+    buffer: ''
+  };
+  
+  const failPending = (error) => {
+    if (warmWorker === worker) {
+      warmWorker = null;
+    }
+    error.workerFailure = true;
+    worker.pending.forEach(job => job.reject(error));
+    worker.pending.clear();
+  };
+  
+  worker.process.stdout.on('data', (data) => {
+    worker.buffer += data.toString();
+    let newlineIndex;
+    while ((newlineIndex = worker.buffer.indexOf('\n')) !== -1) {
+      const line = worker.buffer.slice(0, newlineIndex).trim();
+      worker.buffer = worker.buffer.slice(newlineIndex + 1);
+      if (!line) continue;
+      
+      let result;
+      try {
+        result = JSON.parse(line);
+      } catch (error) {
+        console.log('Python worker stdout:', line);
+        continue;
+      }
+      
+      const job = worker.pending.get(result.id);
+      if (!job) continue;
+      worker.pending.delete(result.id);
+      if (result.ok) {
+        job.resolve(result);
+      } else {
+        job.reject(new Error(result.error || 'Document generation failed'));
+      }
+    }
+  });
+  
+  worker.process.stderr.on('data', (data) => {
+    console.log('Python worker stderr:', data.toString());
+  });
+  
+  worker.process.stdin.on('error', (error) => failPending(error));
+  worker.process.on('error', (error) => failPending(error));
+  worker.process.on('close', (code) => {
+    console.log('Python worker exited with code:', code);
+    failPending(new Error(`Python worker exited with code ${code}`));
+  });
+  
+  return worker;
+}
+
+/**
+ * Send a message to the warm worker, starting it if needed
+ * 
+ * @param {string} pythonExePath - Path to the standalone Python executable
+ * @param {Object} message - Job or command, without its id
+ * @returns {Promise<Object>} Result record reported by the worker
+ */
+function sendToWarmWorker(pythonExePath, message) {
+  if (!warmWorker) {
+    warmWorker = startWarmWorker(pythonExePath);
+  }
+  const worker = warmWorker;
+  const id = worker.nextId++;
+  
+  return new Promise((resolve, reject) => {
+    worker.pending.set(id, { resolve, reject });
+    worker.process.stdin.write(JSON.stringify({ id, ...message }) + '\n');
+  });
+}
+
+/**
+ * Submit a generation job to the warm worker, starting it if needed
+ * 
+ * @param {string} pythonExePath - Path to the standalone Python executable
+ * @param {Object} data - Form data for the document
+ * @param {string} outputPath - Destination .docx path
+ * @returns {Promise<Object>} Result record reported by the worker
+ */
+function generateWithWarmWorker(pythonExePath, data, outputPath) {
+  return sendToWarmWorker(pythonExePath, { data, output: outputPath });
+}
+
+/**
+ * Stop the warm worker, if one is running
+ */
+function shutdownWarmWorker() {
+  if (warmWorker) {
+    const worker = warmWorker;
+    warmWorker = null;
+    try {
+      worker.process.stdin.end(JSON.stringify({ command: 'shutdown' }) + '\n');
+    } catch (error) {
+      worker.process.kill();
+    }
+  }
+}
+
+/**
+ * Generate the document with a one-off run of the standalone executable
+ * 
+ * @param {string} pythonExePath - Path to the standalone Python executable
+ * @param {Object} data - Form data for the document
+ * @param {string} outputPath - Destination .docx path
+ * @returns {Promise<boolean>} Resolves when the executable exits successfully
+ */
+function generateWithOneShotProcess(pythonExePath, data, outputPath) {
+  // Call standalone Python executable, piping the JSON data to its stdin ('-')
+  // so no temporary file is shared between concurrent exports
+  return new Promise((resolve, reject) => {
+    const args = ['-', outputPath, ...getGeneratorOptions()];
+    console.log('Executing standalone Python executable with arguments:', args);
     
-    // Create temporary JSON file for Python script
-    const tempJsonPath = path.join(path.dirname(outputPath), 'temp_data.json');
-    fs.writeFileSync(tempJsonPath, JSON.stringify(data, null, 2));
+    const pythonProcess = spawn(pythonExePath, args, {
+      stdio: ['pipe', 'pipe', 'pipe']
+    });
     
-    // Get the path to the standalone Python executable
-    // In development, use the built executable
-    // In packaged app, it should be in the resources directory
-    const { app } = require('electron');
-    let pythonExePath;
+    let stdout = '';
+    let stderr = '';
     
-    if (app && app.isPackaged) {
-      // In packaged app, look for the executable in resources
-      pythonExePath = path.join(process.resourcesPath, 'app', 'dist', 'generate_docx.exe');
-    } else {
-      // In development, use the local build
-      pythonExePath = path.join(__dirname, '..', 'dist', 'generate_docx.exe');
-    }
+    pythonProcess.stdout.on('data', (data) => {
+      stdout += data.toString();
+      console.log('Python stdout:', data.toString());
+    });
     
+    pythonProcess.stderr.on('data', (data) => {
+      stderr += data.toString();
+      console.log('Python stderr:', data.toString());
+    });
+    
+    pythonProcess.on('close', (code) => {
+      console.log('Python process closed with code:', code);
+      
+      if (code === 0) {
+        console.log('Document generation completed successfully');
+        resolve(true);
+      } else {
+        console.error('Python executable failed with code:', code);
+        console.error('Python stderr:', stderr);
+        console.error('Python stdout:', stdout);
+        reject(new Error(`Python executable failed with code ${code}: ${stderr}`));
+      }
+    });
+    
+    pythonProcess.on('error', (error) => {
+      console.error('Failed to start Python executable:', error);
+      reject(error);
+    });
+    
+    pythonProcess.stdin.on('error', (error) => {
+      console.log('Warning: Could not write data to Python executable:', error.message);
+    });
+    pythonProcess.stdin.end(JSON.stringify(data));
+  });
+}
+
+async function generateHazardDocument(data, outputPath) {
+  try {
+    console.log('Starting document generation with standalone Python executable...');
+    
+    const pythonExePath = getPythonExePath();
     console.log('Python executable path:', pythonExePath);
     
     // Check if standalone Python executable exists
@@ -137,67 +373,19 @@ async function generateHazardDocument(data, outputPath) {
       throw new Error(`Standalone Python executable not found: ${pythonExePath}`);
     }
     
-    // Check if temp JSON was created
-    if (!fs.existsSync(tempJsonPath)) {
-      throw new Error(`Temp JSON file not created: ${tempJsonPath}`);
+    try {
+      const result = await generateWithWarmWorker(pythonExePath, data, outputPath);
+      console.log(`Document generation completed successfully in ${result.elapsed_ms} ms`);
+      return true;
+    } catch (error) {
+      if (!error.workerFailure) {
+        throw error;
+      }
+      // The worker could not be started or died - retry with a one-off process
+      console.log('Warm Python worker unavailable, using a one-off process:', error.message);
+      return await generateWithOneShotProcess(pythonExePath, data, outputPath);
     }
     
-    // Call standalone Python executable
-    return new Promise((resolve, reject) => {
-      console.log('Executing standalone Python executable with arguments:', [tempJsonPath, outputPath]);
-      
-      const pythonProcess = spawn(pythonExePath, [tempJsonPath, outputPath], {
-        stdio: ['pipe', 'pipe', 'pipe']
-      });
-      
-      let stdout = '';
-      let stderr = '';
-      
-      pythonProcess.stdout.on('data', (data) => {
-        stdout += data.toString();
-        console.log('Python stdout:', data.toString());
-      });
-      
-      pythonProcess.stderr.on('data', (data) => {
-        stderr += data.toString();
-        console.log('Python stderr:', data.toString());
-      });
-      
-      pythonProcess.on('close', (code) => {
-        console.log('Python process closed with code:', code);
-        
-        // Clean up temporary JSON file
-        try {
-          fs.unlinkSync(tempJsonPath);
-        } catch (error) {
-          console.log('Warning: Could not clean up temp file:', error.message);
-        }
-        
-        if (code === 0) {
-          console.log('Document generation completed successfully');
-          resolve(true);
-        } else {
-          console.error('Python executable failed with code:', code);
-          console.error('Python stderr:', stderr);
-          console.error('Python stdout:', stdout);
-          reject(new Error(`Python executable failed with code ${code}: ${stderr}`));
-        }
-      });
-      
-      pythonProcess.on('error', (error) => {
-        console.error('Failed to start Python executable:', error);
-        
-        // Clean up temporary JSON file
-        try {
-          fs.unlinkSync(tempJsonPath);
-        } catch (cleanupError) {
-          console.log('Warning: Could not clean up temp file:', cleanupError.message);
-        }
-        
-        reject(error);
-      });
-    });
-    
   } catch (error) {
     console.error('Error in Python-based generation:', error);
     
@@ -216,6 +404,56 @@ async function generateHazardDocument(data, outputPath) {
   }
 }
 
+/**
+ * Render the HTML preview of the document
+ * 
+ * The preview shares its content with the .docx but skips python-docx, so it can
+ * be refreshed while the form is edited. It is rendered by the warm worker, or by
+ * a one-off run writing the HTML to stdout if the worker is unavailable.
+ * 
+ * @param {Object} data - Form data for the document
+ * @returns {Promise<string>} Standalone HTML document
+ */
+async function previewHazardDocument(data) {
+  const pythonExePath = getPythonExePath();
+  if (!fs.existsSync(pythonExePath)) {
+    throw new Error(`Standalone Python executable not found: ${pythonExePath}`);
+  }
+  
+  try {
+    const result = await sendToWarmWorker(pythonExePath, { command: 'preview', data });
+    return result.html;
+  } catch (error) {
+    if (!error.workerFailure) {
+      throw error;
+    }
+  }
+  
+  return new Promise((resolve, reject) => {
+    const args = ['--preview', '-', '-', '--log-level', 'WARNING', ...getGeneratorOptions()];
+    const pythonProcess = spawn(pythonExePath, args, { stdio: ['pipe', 'pipe', 'pipe'] });
+    const chunks = [];
+    let stderr = '';
+    
+    pythonProcess.stdout.on('data', (data) => chunks.push(data));
+    pythonProcess.stderr.on('data', (data) => {
+      stderr += data.toString();
+    });
+    pythonProcess.on('error', reject);
+    pythonProcess.on('close', (code) => {
+      if (code === 0) {
+        resolve(Buffer.concat(chunks).toString('utf8'));
+      } else {
+        reject(new Error(`Preview failed with code ${code}: ${stderr}`));
+      }
+    });
+    pythonProcess.stdin.on('error', () => {});
+    pythonProcess.stdin.end(JSON.stringify(data));
+  });
+}
+
 module.exports = {
-  generateHazardDocument
+  generateHazardDocument,
+  previewHazardDocument,
+  shutdownWarmWorker
 };
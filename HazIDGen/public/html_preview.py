@@ -0,0 +1,219 @@
+"""HTML preview of the hazard identification report
+
+Lays out the sections of report_content.report_sections() as HTML pages with the
+same headers, tables, merges and check boxes as the Word document, without
+python-docx, so a preview can be refreshed on every edit of the form.
+"""
+import base64
+import html
+import os
+import pathlib
+from datetime import datetime
+
+from report_content import (
+    ANNEX_HEADING, ANNEX_TEXT, AREA_HEADING, CONTACTS_HEADING, DEFINITIONS_HEADER,
+    DEFINITIONS_HEADING, DEFINITIONS_INSTRUCTIONS, DEFINITIONS_MISSING_ROW, DEFINITIONS_WIDTHS,
+    DESCRIPTION_HEADING, DISTRIBUTION_LABEL, DISTRIBUTION_TEXT, DOCUMENTS_HEADING, GUIDELINE_LINK,
+    GUIDELINE_TEXT, HAZARD_TABLE_HEADER, HAZARD_TABLE_WIDTHS, HAZARDS_HEADING, HEADER_LOGOS,
+    HEADER_WIDTHS, HISTORY_HEADING, HISTORY_ROWS, HSE_HEADING, ISO_DEFINITION, ISO_LINK,
+    LOCATION_LINE, NO_HAZARD_DETAILS, SIGNATURE_ROWS, SUBTITLE, SUMMARY_HEADING, SUMMARY_WIDTHS,
+    TITLE, TableLink, activity_summary_rows, annex_files, build_hazard_index, contact_lists, definition_rows,
+    description_text, document_rows, fill_placeholders, hazard_rows, header_metadata_texts,
+    hse_rows, load_asset, report_sections, summary_spans, title_values
+)
+
+# Page geometry and fonts of the Word template (0.5" margins, Arial)
+PREVIEW_CSS = """
+body { background: #e8e8e8; margin: 0; padding: 16px 0; font-family: Arial, sans-serif; font-size: 11pt; }
+.page { background: #fff; width: 7.5in; min-height: 10in; margin: 0 auto 16px; padding: 0.5in; box-shadow: 0 1px 4px rgba(0,0,0,.3); }
+h1, h2, h3, .title { font-weight: bold; margin: 12pt 0 6pt; }
+.title { font-size: 16pt; } h1 { font-size: 14pt; } h2 { font-size: 12pt; } h3 { font-size: 11pt; }
+.center { text-align: center; }
+p { margin: 0 0 8pt; }
+table { border-collapse: collapse; margin: 0 auto 8pt; table-layout: fixed; }
+td, th { border: 1px solid #7ba0cd; padding: 2pt 5pt; font-size: 10pt; text-align: left; vertical-align: top; font-weight: normal; }
+th, td.bold { font-weight: bold; }
+th.shaded { background: #4f81bd; font-size: 11pt; text-align: center; }
+td.check { text-align: center; }
+table.header td { border-color: #000; font-size: 8pt; text-align: center; vertical-align: middle; height: 0.6in; }
+table.header td.logos { text-align: left; }
+table.header .logo { display: inline-block; width: 0.5in; height: 0.5in; margin-right: 4px; background-size: contain; }
+figure { margin: 0 0 8pt; text-align: center; }
+figure img { max-width: 7.5in; max-height: 8.5in; }
+figcaption { font-size: 10pt; font-style: italic; }
+"""
+
+# Style rules of the header logos, encoded once per process
+_logo_css = None
+
+def _text(value):
+    """Escape a text, keeping its line breaks"""
+    return html.escape(str(value)).replace('\n', '<br>')
+
+def _link(link):
+    return f'<a href="{html.escape(link.url)}">{_text(link.text)}</a>'
+
+def _value(value):
+    return _link(value) if isinstance(value, TableLink) else _text(value)
+
+def _heading(text, level):
+    return f'<h{level}>{_text(text)}</h{level}>'
+
+def _paragraph(content, css_class=None):
+    class_attr = f' class="{css_class}"' if css_class else ''
+    return f'<p{class_attr}>{content}</p>'
+
+def _colgroup(widths):
+    return '<colgroup>' + ''.join(f'<col style="width:{width}in">' for width in widths) + '</colgroup>'
+
+def _table(rows, widths=None, header=None, shaded=False, column_classes=(), spans=None):
+    """Return a table; spans maps (row, column) to (rowspan, colspan), covered cells are left out"""
+    parts = ['<table>']
+    if widths:
+        parts.append(_colgroup(widths))
+    if header:
+        shaded_attr = ' class="shaded"' if shaded else ''
+        parts.append('<tr>' + ''.join(f'<th{shaded_attr}>{_text(text)}</th>' for text in header) + '</tr>')
+    for i, row in enumerate(rows):
+        cells = []
+        for j, value in enumerate(row):
+            attrs = ''
+            if spans is not None:
+                if (i, j) not in spans:
+                    continue
+                rowspan, colspan = spans[(i, j)]
+                if rowspan > 1:
+                    attrs += f' rowspan="{rowspan}"'
+                if colspan > 1:
+                    attrs += f' colspan="{colspan}"'
+            css_class = column_classes[j] if j < len(column_classes) else None
+            if css_class:
+                attrs += f' class="{css_class}"'
+            cells.append(f'<td{attrs}>{_value(value)}</td>')
+        parts.append('<tr>' + ''.join(cells) + '</tr>')
+    parts.append('</table>')
+    return ''.join(parts)
+
+def logo_css():
+    """Style rules holding the header logos as data URIs, so each page header only references them"""
+    global _logo_css
+    if _logo_css is None:
+        rules = []
+        for index, filename in enumerate(HEADER_LOGOS):
+            blob = load_asset(filename)
+            if blob is not None:
+                uri = 'data:image/png;base64,' + base64.b64encode(blob).decode('ascii')
+                rules.append(f'.logo-{index} {{ background-image: url({uri}); }}')
+        _logo_css = '\n'.join(rules)
+    return _logo_css
+
+def render_header(data):
+    """Logo and metadata table at the top of every page"""
+    logos = ''.join(f'<span class="logo logo-{index}"></span>'
+                    for index, filename in enumerate(HEADER_LOGOS) if load_asset(filename) is not None)
+    metadata = ''.join(f'<td>{_text(text)}</td>' for text in header_metadata_texts(data))
+    return (f'<table class="header">{_colgroup(HEADER_WIDTHS)}'
+            f'<tr><td class="logos">{logos}</td>{metadata}</tr></table>')
+
+def _render_title_section(inputs):
+    values = title_values(inputs)
+    signature_rows = [[fill_placeholders(text, values) for text in row] for row in SIGNATURE_ROWS]
+    return ''.join([
+        '<p>&nbsp;</p>',
+        f'<div class="title center">{_text(TITLE)}</div>',
+        f'<h1 class="center">{_text(SUBTITLE)}</h1>',
+        _paragraph(_text(fill_placeholders(LOCATION_LINE, values)), 'center'),
+        _table(signature_rows[1:], header=signature_rows[0]),
+        _paragraph(f'<b>{_text(DISTRIBUTION_LABEL)}</b>'),
+        _paragraph(_text(fill_placeholders(DISTRIBUTION_TEXT, values)))
+    ])
+
+def _render_history_section(inputs):
+    rows = [[fill_placeholders(text, inputs) for text in row] for row in HISTORY_ROWS]
+    return _heading(HISTORY_HEADING, 1) + _table(rows[1:], header=rows[0])
+
+def _render_contacts_section(inputs):
+    web_contacts, email_contacts = contact_lists(inputs)
+    links = [(TableLink(contact['url'], contact['title']), contact['description']) for contact in web_contacts]
+    links += [(TableLink(f'mailto:{contact["email"]}', contact['email']), contact['description'])
+              for contact in email_contacts]
+    return _heading(CONTACTS_HEADING, 1) + ''.join(
+        _paragraph(f'• {_link(link)}: {_text(description)}') for link, description in links)
+
+def _render_definitions_section(inputs):
+    rows = definition_rows(inputs) if inputs.get('hazardDefinitions') else [DEFINITIONS_MISSING_ROW]
+    return ''.join([
+        _heading(DEFINITIONS_HEADING, 1),
+        _paragraph(f'<i>{_text(ISO_DEFINITION)}</i>'),
+        _paragraph(_link(ISO_LINK)),
+        *(_paragraph(_text(instruction)) for instruction in DEFINITIONS_INSTRUCTIONS),
+        _table(rows, DEFINITIONS_WIDTHS, DEFINITIONS_HEADER, shaded=True, column_classes=('bold', 'check'))
+    ])
+
+def _render_activity_summary_section(inputs):
+    rows = activity_summary_rows(inputs)
+    return ''.join([
+        _heading(AREA_HEADING, 1),
+        _heading(SUMMARY_HEADING, 2),
+        _table(rows, SUMMARY_WIDTHS, column_classes=('bold',), spans=summary_spans(rows)),
+        _heading(DOCUMENTS_HEADING, 3),
+        _table(document_rows(inputs)),
+        _heading(HSE_HEADING, 3),
+        _table(hse_rows(inputs))
+    ])
+
+def _render_description_section(inputs):
+    return ''.join([
+        _heading(DESCRIPTION_HEADING, 2),
+        _paragraph(_text(description_text(inputs))),
+        _paragraph(_text(GUIDELINE_TEXT) + _link(GUIDELINE_LINK))
+    ])
+
+def _render_hazards_intro_section(inputs):
+    return _heading(HAZARDS_HEADING, 1)
+
+def _render_hazard_category_section(inputs):
+    return (_heading(inputs['category'], 2) +
+            _table(hazard_rows(inputs['hazards']), HAZARD_TABLE_WIDTHS, HAZARD_TABLE_HEADER,
+                   shaded=True, column_classes=('bold',)))
+
+# HTML renderers of the section kinds listed by report_sections
+SECTION_RENDERERS = {
+    'title': _render_title_section,
+    'history': _render_history_section,
+    'contacts': _render_contacts_section,
+    'definitions': _render_definitions_section,
+    'activity_summary': _render_activity_summary_section,
+    'description': _render_description_section,
+    'hazards_intro': _render_hazards_intro_section,
+    'hazard_category': _render_hazard_category_section
+}
+
+def render_annex_pictures(data):
+    """Annex pictures, linked to the uploaded files rather than embedded, so the preview stays small"""
+    figures = []
+    for name, path in annex_files(data):
+        if not os.path.exists(path):
+            continue
+        uri = pathlib.Path(os.path.abspath(path)).as_uri()
+        figures.append(f'<figure><img src="{html.escape(uri)}" alt="{html.escape(name)}">'
+                       f'<figcaption>{_text(name)}</figcaption></figure>')
+    return ''.join(figures)
+
+def render_preview(data, generated=None):
+    """Return the preview of a report as a standalone HTML document"""
+    generated = generated or datetime.now()
+    header = render_header(data)
+    pages = []
+    for key, kind, inputs, new_page in report_sections(data, build_hazard_index(data), generated):
+        if new_page:
+            pages.append([header])
+        pages[-1].append(SECTION_RENDERERS[kind](inputs))
+    if not data.get('hazardDetails', {}):
+        pages[-1].append(_paragraph(_text(NO_HAZARD_DETAILS)))
+    pages[-1].append(_heading(ANNEX_HEADING, 1) + _paragraph(_text(ANNEX_TEXT)) + render_annex_pictures(data))
+    
+    title = _text(data.get('title') or TITLE)
+    body = ''.join(f'<section class="page">{"".join(page)}</section>' for page in pages)
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title>'
+            f'<style>{PREVIEW_CSS}{logo_css()}</style></head><body>{body}</body></html>')
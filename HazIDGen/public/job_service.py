@@ -0,0 +1,515 @@
+"""Local job service for generate_docx.py
+
+Runs jobs of the --serve/--batch shape ({"id", "data" or "input", "output", ...})
+on a bounded pool of warm worker processes, behind HTTP on localhost or on a
+Unix socket, so that several users of one workstation share the generator:
+
+    POST   /jobs              submit a job; 202 with its record, 429 when the queue is full
+    GET    /jobs              records of the queued, running and recent jobs
+    GET    /jobs/<id>         record of one job
+    GET    /jobs/<id>/events  newline-delimited JSON progress events, streamed until the job ends
+    DELETE /jobs/<id>         cancel a queued or running job
+    GET    /status            workers, queue length and job counts
+    POST   /shutdown          stop accepting jobs, cancel the queue and exit
+
+POST bodies must be sent as application/json. Requests carrying an Origin
+header, or a Host other than localhost, are refused, so web pages open in a
+browser on the workstation cannot submit jobs or stop the service. With an
+output root, jobs may only write below that directory.
+
+Queued jobs run by priority ("interactive" before "normal" before "bulk", or
+an integer, lower first), then in submission order. The queue is bounded:
+submissions beyond it are refused with a Retry-After hint instead of piling
+up. Running jobs report an event per report section through the progress
+callback, which is also where cancellation takes effect, so a cancelled job
+stops at its next section and leaves no partial output behind.
+
+The module knows nothing about documents: generate_docx passes the function
+that runs a job and the initializer of the worker processes.
+"""
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import deque
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('generate_docx')
+
+PRIORITIES = {'interactive': 0, 'normal': 1, 'bulk': 2}
+DEFAULT_PRIORITY = 'normal'
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_PORT = 8765
+# Finished jobs kept for GET /jobs/<id>, oldest forgotten first
+FINISHED_HISTORY = 256
+# Host header names accepted on the TCP port (anything else is a rebound DNS name)
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised by the progress callback of a job that was cancelled while running"""
+
+class QueueFull(Exception):
+    """The service has as many queued jobs as it accepts"""
+
+class Job:
+    """A submitted job and everything reported about it"""
+    __slots__ = ('id', 'spec', 'priority', 'status', 'events', 'result', 'submitted', 'started', 'finished',
+                 'worker')
+    
+    def __init__(self, job_id, spec, priority):
+        self.id = job_id
+        self.spec = spec
+        self.priority = priority
+        self.status = QUEUED
+        self.events = []
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.worker = None
+    
+    def record(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'priority': self.priority,
+            'output': self.spec.get('output'),
+            'progress': self.events[-1] if self.events else None,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'result': self.result
+        }
+
+def parse_priority(value):
+    """Return the numeric priority of a job's 'priority' field (a name of PRIORITIES or an integer)"""
+    if value is None:
+        value = DEFAULT_PRIORITY
+    if isinstance(value, str) and value in PRIORITIES:
+        return PRIORITIES[value]
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"Unknown priority {value!r}, expected an integer or one of {', '.join(PRIORITIES)}")
+
+def _worker_main(conn, cancel_event, initializer, initargs, run):
+    """Worker process: run the jobs received on conn, sending ('progress', event) and ('result', record) back"""
+    if initializer is not None:
+        initializer(*initargs)
+    
+    def progress(event):
+        if cancel_event.is_set():
+            raise JobCancelled()
+        conn.send(('progress', event))
+    
+    while True:
+        try:
+            spec = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if spec is None:
+            break
+        try:
+            result = run(spec, progress)
+        except JobCancelled:
+            result = {'id': spec.get('id'), 'ok': False, 'cancelled': True, 'error': 'Job cancelled'}
+        except Exception as e:
+            result = {'id': spec.get('id'), 'ok': False, 'error': str(e)}
+        conn.send(('result', result))
+
+class _Worker:
+    """One worker process and the thread of this process that feeds it jobs"""
+    
+    def __init__(self, service, number):
+        self.service = service
+        self.number = number
+        self.context = multiprocessing.get_context()
+        self.cancel_event = self.context.Event()
+        self.process = None
+        self.conn = None
+        self.thread = threading.Thread(target=self._run, name=f'job-worker-{number}', daemon=True)
+    
+    def _start_process(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main, name=f'generate_docx-worker-{self.number}', daemon=True,
+            args=(child_conn, self.cancel_event, self.service.initializer, self.service.initargs, self.service.run))
+        self.process.start()
+        child_conn.close()
+    
+    def start(self):
+        self._start_process()
+        self.thread.start()
+    
+    def _run(self):
+        while True:
+            job = self.service._next_job(self)
+            if job is None:
+                break
+            try:
+                self.conn.send(job.spec)
+                while True:
+                    kind, payload = self.conn.recv()
+                    if kind == 'progress':
+                        self.service._progress(job, payload)
+                    else:
+                        self.service._finish(job, payload)
+                        break
+            except (EOFError, OSError) as e:
+                # The worker process died (e.g. out of memory): fail its job and start a fresh one
+                logger.error(f"Worker {self.number} exited while running job {job.id}: {e}")
+                self.service._finish(job, {'id': job.id, 'ok': False, 'error': 'Worker process exited'})
+                self.process.join(1)
+                self._start_process()
+        self.stop_process()
+    
+    def stop_process(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+class JobService:
+    """Priority queue of jobs in front of a bounded pool of worker processes
+    
+    run(spec, progress) runs one job in a worker process and returns its result
+    record ({"id", "ok", ...}); progress(event) reports a JSON event and raises
+    JobCancelled once the job is cancelled. initializer(*initargs) prepares each
+    worker process. With output_root, job outputs are resolved from and must lie inside that directory.
+    """
+    
+    def __init__(self, run, initializer=None, initargs=(), workers=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 output_root=None):
+        self.run = run
+        self.output_root = os.path.realpath(output_root) if output_root else None
+        self.initializer = initializer
+        self.initargs = initargs
+        self.queue_size = queue_size
+        self.workers = [_Worker(self, number) for number in range(1, (workers or os.cpu_count() or 1) + 1)]
+        self.jobs = {}
+        self._queue = []
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._finished = deque()
+        self._accepting = True
+        self._lock = threading.Condition()
+    
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+    
+    def stop(self):
+        """Cancel the queued jobs, let the running ones finish and stop the workers"""
+        with self._lock:
+            self._accepting = False
+            for _, _, job in self._queue:
+                if job.status == QUEUED:
+                    self._set_final(job, CANCELLED, {'id': job.id, 'ok': False, 'cancelled': True,
+                                                     'error': 'Service stopped'})
+            self._queue.clear()
+            self._queued = 0
+            self._lock.notify_all()
+        for worker in self.workers:
+            worker.thread.join()
+    
+    def submit(self, spec):
+        """Queue a job spec; returns its Job, raises QueueFull or ValueError"""
+        if not isinstance(spec, dict):
+            raise ValueError('Job must be a JSON object')
+        if not spec.get('output'):
+            raise ValueError("Job must provide an 'output' path")
+        if 'data' not in spec and 'input' not in spec:
+            raise ValueError("Job must provide either 'data' or 'input'")
+        if self.output_root:
+            # Relative outputs are taken from the root
+            output = os.path.realpath(os.path.join(self.output_root, str(spec['output'])))
+            if os.path.commonpath([output, self.output_root]) != self.output_root or output == self.output_root:
+                raise ValueError(f"Job output must be inside {self.output_root}")
+            spec = dict(spec, output=output)
+        priority = parse_priority(spec.get('priority'))
+        with self._lock:
+            if not self._accepting:
+                raise QueueFull('The service is shutting down')
+            if self._queued >= self.queue_size:
+                raise QueueFull(f'{self._queued} jobs are already queued')
+            job_id = str(spec.get('id') or uuid.uuid4().hex[:12])
+            if job_id in self.jobs and self.jobs[job_id].status not in FINAL_STATES:
+                raise ValueError(f"Job '{job_id}' is already queued or running")
+            job = Job(job_id, dict(spec, id=job_id), priority)
+            self.jobs[job_id] = job
+            heapq.heappush(self._queue, (priority, next(self._sequence), job))
+            self._queued += 1
+            self._lock.notify_all()
+            return job
+    
+    def cancel(self, job_id):
+        """Cancel a queued job at once, or a running one at its next progress event; returns the Job or None"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == QUEUED:
+                # Left in the heap and skipped by _next_job
+                self._queued -= 1
+                self._set_final(job, CANCELLED, {'id': job.id, 'ok': False, 'cancelled': True,
+                                                 'error': 'Job cancelled'})
+            elif job.status == RUNNING:
+                job.worker.cancel_event.set()
+            return job
+    
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return job.record() if job else None
+    
+    def records(self):
+        with self._lock:
+            return [job.record() for job in self.jobs.values()]
+    
+    def retry_after(self):
+        """Seconds a refused client should wait: the recent mean job time per worker slot"""
+        with self._lock:
+            times = [job.finished - job.started for job in self.jobs.values() if job.started and job.finished]
+            queued = self._queued
+        mean = sum(times) / len(times) if times else 1.0
+        return max(1, round(mean * queued / len(self.workers)))
+    
+    def status(self):
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {'pid': os.getpid(), 'workers': len(self.workers), 'queue_size': self.queue_size,
+                    'queued': self._queued, 'jobs': counts, 'accepting': self._accepting}
+    
+    def events(self, job_id, timeout=None):
+        """Yield the events of a job as they arrive, then its final record"""
+        position = 0
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            while True:
+                while position < len(job.events):
+                    event = job.events[position]
+                    position += 1
+                    self._lock.release()
+                    try:
+                        yield event
+                    finally:
+                        self._lock.acquire()
+                if job.status in FINAL_STATES:
+                    record = job.record()
+                    break
+                if not self._lock.wait(timeout) and timeout is not None:
+                    record = job.record()
+                    break
+        yield {'event': 'end', **record}
+    
+    def _next_job(self, worker):
+        """Block until a queued job is available for worker; None once the service stops"""
+        with self._lock:
+            while True:
+                while self._queue:
+                    _, _, job = heapq.heappop(self._queue)
+                    if job.status != QUEUED:
+                        continue
+                    self._queued -= 1
+                    job.status = RUNNING
+                    job.started = time.time()
+                    job.worker = worker
+                    worker.cancel_event.clear()
+                    self._lock.notify_all()
+                    return job
+                if not self._accepting:
+                    return None
+                self._lock.wait()
+    
+    def _progress(self, job, event):
+        with self._lock:
+            job.events.append(event)
+            self._lock.notify_all()
+    
+    def _finish(self, job, result):
+        with self._lock:
+            if result.get('cancelled'):
+                status = CANCELLED
+            else:
+                status = DONE if result.get('ok') else FAILED
+            self._set_final(job, status, result)
+    
+    def _set_final(self, job, status, result):
+        """Record the end of a job and forget the oldest finished jobs; called with the lock held"""
+        job.status = status
+        job.result = result
+        job.finished = time.time()
+        job.worker = None
+        self._finished.append(job.id)
+        while len(self._finished) > FINISHED_HISTORY:
+            old_id = self._finished.popleft()
+            old = self.jobs.get(old_id)
+            if old is not None and old.status in FINAL_STATES and old_id not in self._finished:
+                del self.jobs[old_id]
+        self._lock.notify_all()
+
+class _ServiceRequestHandler(BaseHTTPRequestHandler):
+    """JSON API of a JobService (see the module docstring)"""
+    server_version = 'HazIDJobService/1.0'
+    
+    def log_message(self, format, *args):
+        logger.debug(f"{self.command} {self.path}: " + format % args)
+    
+    def _send_json(self, status, body, headers=None):
+        payload = (json.dumps(body) + '\n').encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _error(self, status, message, headers=None):
+        self._send_json(status, {'ok': False, 'error': message}, headers)
+    
+    def _route(self):
+        return [part for part in self.path.split('?', 1)[0].split('/') if part]
+    
+    def _refuse_foreign(self, body=False):
+        """Answer requests from browsers (Origin, foreign Host) or with a non-JSON body; True when refused"""
+        if self.headers.get('Origin') is not None:
+            self._error(HTTPStatus.FORBIDDEN, 'Cross-origin requests are not accepted')
+            return True
+        host = self.headers.get('Host')
+        if host and not isinstance(self.server, _UnixHTTPServer):
+            name = host.rsplit(':', 1)[0] if not host.endswith(']') else host
+            if name.strip('[]').lower() not in LOCAL_HOSTS:
+                self._error(HTTPStatus.FORBIDDEN, f"Host '{host}' is not accepted")
+                return True
+        if body:
+            content_type = (self.headers.get('Content-Type') or '').split(';', 1)[0].strip().lower()
+            if content_type != 'application/json':
+                self._error(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, 'Content-Type must be application/json')
+                return True
+        return False
+    
+    def do_GET(self):
+        if self._refuse_foreign():
+            return
+        service = self.server.service
+        parts = self._route()
+        if parts == ['status']:
+            self._send_json(HTTPStatus.OK, service.status())
+        elif parts == ['jobs']:
+            self._send_json(HTTPStatus.OK, service.records())
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            record = service.get(parts[1])
+            if record is None:
+                self._error(HTTPStatus.NOT_FOUND, f"Unknown job '{parts[1]}'")
+            else:
+                self._send_json(HTTPStatus.OK, record)
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            if service.get(parts[1]) is None:
+                self._error(HTTPStatus.NOT_FOUND, f"Unknown job '{parts[1]}'")
+                return
+            # HTTP/1.0 without a length: the stream ends when the connection closes
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            try:
+                for event in service.events(parts[1]):
+                    self.wfile.write((json.dumps(event) + '\n').encode('utf-8'))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            self._error(HTTPStatus.NOT_FOUND, f'No route for GET {self.path}')
+    
+    def do_POST(self):
+        if self._refuse_foreign(body=True):
+            return
+        service = self.server.service
+        parts = self._route()
+        if parts == ['shutdown']:
+            self._send_json(HTTPStatus.OK, {'ok': True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if parts != ['jobs']:
+            self._error(HTTPStatus.NOT_FOUND, f'No route for POST {self.path}')
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            spec = json.loads(self.rfile.read(length) or b'null')
+            job = service.submit(spec)
+        except QueueFull as e:
+            self._error(HTTPStatus.TOO_MANY_REQUESTS, str(e), {'Retry-After': str(service.retry_after())})
+            return
+        except ValueError as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        self._send_json(HTTPStatus.ACCEPTED, service.get(job.id), {'Location': f'/jobs/{job.id}'})
+    
+    def do_DELETE(self):
+        if self._refuse_foreign():
+            return
+        parts = self._route()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            self._error(HTTPStatus.NOT_FOUND, f'No route for DELETE {self.path}')
+            return
+        job = self.server.service.cancel(parts[1])
+        if job is None:
+            self._error(HTTPStatus.NOT_FOUND, f"Unknown job '{parts[1]}'")
+        else:
+            self._send_json(HTTPStatus.ACCEPTED, self.server.service.get(job.id))
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects an (address, port) pair
+        return request, ('local', 0)
+
+def run_service(service, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None):
+    """Serve a JobService over HTTP until POST /shutdown or Ctrl+C, then stop it; returns the exit code"""
+    if socket_path:
+        if not hasattr(socket, 'AF_UNIX'):
+            logger.error("Unix sockets are not supported on this platform, use --port instead.")
+            return 1
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixHTTPServer(socket_path, _ServiceRequestHandler)
+        address = socket_path
+    else:
+        server = ThreadingHTTPServer((host, port), _ServiceRequestHandler)
+        server.daemon_threads = True
+        address = f'http://{host}:{server.server_address[1]}'
+    server.service = service
+    
+    service.start()
+    logger.info(f"Job service on {address} with {len(service.workers)} workers, "
+                f"queue of {service.queue_size} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return 0
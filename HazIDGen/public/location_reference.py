@@ -0,0 +1,203 @@
+"""Compiled building/room reference for generate_docx.py
+
+Reads the CMS Safety location workbook (CMS_Safety-Location_TSO_Links_Reference.xlsx)
+the way src/utils/hazardLoader.js does: the Territorial Safety Officer and
+deputy of each building ("TSO Overview"), the rooms of each building ("Building
+Room Info") and the contacts and useful links ("Web Contacts", "Email Contacts").
+The compiled reference is cached like the hazard catalogue (see
+excel_catalogue.load_compiled), so a change to the workbook recompiles it and
+batch workers only unmarshal it.
+
+Buildings are looked up by number or by the zone name the workbook gives next
+to it ('3524 (USC55)'), rooms by building; both exactly through dicts, or by
+prefix through sorted lists.
+"""
+import bisect
+import collections
+import io
+import os
+import re
+import threading
+
+from excel_catalogue import Workbook, load_compiled
+
+LOCATION_WORKBOOK = 'CMS_Safety-Location_TSO_Links_Reference.xlsx'
+TSO_SHEET = 'TSO Overview'
+ROOMS_SHEET = 'Building Room Info'
+WEB_CONTACTS_SHEET = 'Web Contacts'
+EMAIL_CONTACTS_SHEET = 'Email Contacts'
+
+# Bump when the compiled layout changes, so older cache files are recompiled
+CACHE_FORMAT = 1
+CACHE_MAGIC = b'HZLOC'
+CACHE_EXTENSION = 'loc'
+
+# 'Building 3524', 'bldg. 40'
+_BUILDING_PREFIX = re.compile(r'^(?:BUILDING|BLDG\.?|BAT\.?)\s*')
+# '3524 (USC55)'
+_BUILDING_ZONE = re.compile(r'^([^\s(]+)\s*(?:\(\s*([^)]*?)\s*\))?$')
+
+# A building of the TSO sheet; rooms is the sorted tuple of its known rooms (empty when not listed)
+Building = collections.namedtuple('Building', ['code', 'zone', 'tso', 'dtso', 'rooms'])
+
+# Compiled references of this process, per workbook path: (mtime_ns, size, LocationReference)
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def location_key(value):
+    """Normalize a building, zone or room for lookups: trimmed, single-spaced and upper-case"""
+    if value is None:
+        return ''
+    return ' '.join(str(value).replace('\xa0', ' ').split()).upper()
+
+def parse_building(value):
+    """Return the (code, zone) of a building value ('3524', 'Building 3524', '3524 (USC55)'), normalized"""
+    text = _BUILDING_PREFIX.sub('', location_key(value))
+    match = _BUILDING_ZONE.match(text)
+    if not match:
+        return text, ''
+    return match.group(1), match.group(2) or ''
+
+def _text(value):
+    return ' '.join(str(value).replace('\xa0', ' ').split()) if value is not None else ''
+
+def compile_locations(source, version):
+    """Compile the workbook at source (bytes) into a location reference dict"""
+    rooms = {}
+    buildings = []
+    web_contacts = []
+    email_contacts = []
+    with Workbook(io.BytesIO(source)) as workbook:
+        for item in workbook.records(ROOMS_SHEET):
+            code, _ = parse_building(item.get('Building'))
+            room = location_key(item.get('Room'))
+            if code and room:
+                rooms.setdefault(code, set()).add(room)
+        
+        for item in workbook.records(TSO_SHEET):
+            code, zone = parse_building(item.get('Building'))
+            if code:
+                buildings.append([code, zone, _text(item.get('TSO')), _text(item.get('dTSO'))])
+        
+        # Optional sheets, as in hazardLoader.js loadContactData
+        if WEB_CONTACTS_SHEET in workbook.sheets:
+            for item in workbook.records(WEB_CONTACTS_SHEET):
+                if item.get('Title') and item.get('URL'):
+                    web_contacts.append({'title': _text(item['Title']), 'url': _text(item['URL']),
+                                         'description': _text(item.get('Description'))})
+        if EMAIL_CONTACTS_SHEET in workbook.sheets:
+            for item in workbook.records(EMAIL_CONTACTS_SHEET):
+                if item.get('Email'):
+                    email_contacts.append({'email': _text(item['Email']),
+                                           'description': _text(item.get('Description'))})
+    
+    return {
+        'version': version,
+        'buildings': buildings,
+        'rooms': {code: sorted(names) for code, names in rooms.items()},
+        'webContacts': web_contacts,
+        'emailContacts': email_contacts
+    }
+
+class LocationReference:
+    """Compiled location reference with the lookups generate_docx.py needs"""
+    
+    def __init__(self, compiled, path=None):
+        self.version = compiled['version']
+        self.web_contacts = compiled['webContacts']
+        self.email_contacts = compiled['emailContacts']
+        self.path = path
+        self._rooms = {code: (tuple(names), frozenset(names)) for code, names in compiled['rooms'].items()}
+        # Buildings by code and by zone; buildings with rooms but no TSO are known too
+        self._buildings = {}
+        for code, zone, tso, dtso in compiled['buildings']:
+            building = Building(code, zone, tso, dtso, self._rooms.get(code, ((), None))[0])
+            self._buildings.setdefault(code, building)
+            if zone:
+                self._buildings.setdefault(zone, building)
+        for code, (names, _) in self._rooms.items():
+            self._buildings.setdefault(code, Building(code, '', '', '', names))
+        self._building_keys = sorted(self._buildings)
+    
+    def building(self, value):
+        """Return the Building of a number or zone ('3524', 'USC55', '3524 (USC55)'), or None if unknown"""
+        code, zone = parse_building(value)
+        return self._buildings.get(code) or (self._buildings.get(zone) if zone else None)
+    
+    def buildings_with_prefix(self, prefix, limit=None):
+        """Building numbers and zones starting with prefix, sorted"""
+        return _prefixed(self._building_keys, location_key(prefix), limit)
+    
+    def has_room(self, building, room):
+        """Whether a Building lists room; None when the workbook lists no rooms for it"""
+        rooms = self._rooms.get(building.code)
+        if rooms is None:
+            return None
+        return location_key(room) in rooms[1]
+    
+    def rooms_with_prefix(self, building, prefix='', limit=None):
+        """Rooms of a Building starting with prefix, sorted"""
+        return _prefixed(building.rooms, location_key(prefix), limit)
+    
+    def resolve(self, building=None, room=None, location=None):
+        """Resolve the building, room and location fields of a payload
+        
+        A room may carry its building ('3524/U0-101'), and a missing or unknown
+        building may be named by its zone in location. Returns (Building or None,
+        normalized room or None, problems), where problems describe the values the
+        reference does not know.
+        """
+        problems = []
+        room_key = location_key(room) or None
+        if room_key and '/' in room_key:
+            room_building, room_key = room_key.rsplit('/', 1)
+            building = building or room_building
+        found = self.building(building) if location_key(building) else None
+        if found is None and location_key(location):
+            found = self.building(location)
+        if found is None:
+            if location_key(building):
+                candidates = self.buildings_with_prefix(parse_building(building)[0][:2], 5)
+                hint = f" (did you mean {', '.join(candidates)}?)" if candidates else ''
+                problems.append(f"Building '{_text(building)}' is not in the location reference{hint}")
+            return None, room_key, problems
+        if room_key and self.has_room(found, room_key) is False:
+            candidates = self.rooms_with_prefix(found, room_key.split('-')[0], 5)
+            hint = f" (did you mean {', '.join(candidates)}?)" if candidates else ''
+            problems.append(f"Room '{_text(room)}' is not listed for building {found.code}{hint}")
+        return found, room_key, problems
+    
+    def stats(self):
+        return {
+            'version': self.version,
+            'source': self.path,
+            'buildings': len({building.code for building in self._buildings.values()}),
+            'rooms': sum(len(names) for names, _ in self._rooms.values()),
+            'webContacts': len(self.web_contacts),
+            'emailContacts': len(self.email_contacts)
+        }
+
+def _prefixed(keys, prefix, limit=None):
+    """The entries of the sorted keys starting with prefix, at most limit"""
+    start = bisect.bisect_left(keys, prefix)
+    matches = []
+    for key in keys[start:]:
+        if not key.startswith(prefix) or (limit is not None and len(matches) >= limit):
+            break
+        matches.append(key)
+    return matches
+
+def load_locations(path, cache_dir=None):
+    """Return the LocationReference of a workbook, compiling it only when the workbook changed"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    with _loaded_lock:
+        loaded = _loaded.get(path)
+        if loaded and loaded[:2] == (stat.st_mtime_ns, stat.st_size):
+            return loaded[2]
+        
+        compiled = load_compiled(path, stat, compile_locations, cache_dir, CACHE_EXTENSION, CACHE_MAGIC,
+                                 CACHE_FORMAT)
+        reference = LocationReference(compiled, path)
+        _loaded[path] = (stat.st_mtime_ns, stat.st_size, reference)
+        return reference
@@ -0,0 +1,287 @@
+"""Streaming OOXML backend for the report_model document model
+
+word/document.xml is written element by element straight into the zip member
+as the blocks come from report_model.report_blocks(), so memory use does not
+grow with the size of the report. The other parts (styles, numbering, theme,
+settings) are copied from the base template package built by python-docx, which
+stays the reference backend; relationships, media, the core properties and the
+content types are written once the body is complete, so every part matches the
+python-docx one. Parts are compressed by package_writer under the caller's
+PackagePolicy.
+"""
+import io
+import os
+import re
+import shutil
+import zipfile
+from xml.sax.saxutils import escape
+
+from package_writer import PackageWriter
+from report_model import (
+    HEADER_FILL, HYPERLINK_STYLE_ID, Hyperlink, PageBreak, Paragraph, Picture, Run, Table
+)
+
+DOCUMENT_PART = 'word/document.xml'
+DOCUMENT_RELS_PART = 'word/_rels/document.xml.rels'
+CORE_PROPERTIES_PART = 'docProps/core.xml'
+CONTENT_TYPES_PART = '[Content_Types].xml'
+
+REL_IMAGE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+REL_HYPERLINK = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink'
+
+# Image formats the writer can embed, by file extension
+IMAGE_CONTENT_TYPES = {'png': 'image/png', 'jpeg': 'image/jpeg', 'gif': 'image/gif'}
+
+# Serialized XML is handed to the zip member in chunks of about this size
+CHUNK_SIZE = 64 * 1024
+
+# Default entry of [Content_Types].xml: (extension, content type)
+_DEFAULT_CONTENT_TYPE = re.compile(r'<Default Extension="([^"]+)" ContentType="([^"]+)"/>')
+
+# Characters XML 1.0 cannot hold, dropped from the text
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+_TABLE_LOOK = ('<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+               'w:noHBand="0" w:noVBand="1" w:val="04A0"/>')
+_PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+_PICTURE = (
+    '<w:r><w:drawing><wp:inline xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{id}" name="Picture {id}"/>'
+    '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+    '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<pic:pic><pic:nvPicPr><pic:cNvPr id="0" name="{name}"/><pic:cNvPicPr/></pic:nvPicPr>'
+    '<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+    '<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+    '<a:prstGeom prst="rect"/></pic:spPr></pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r>'
+)
+_CORE_PROPERTIES = (
+    "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+    '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+    'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/" '
+    'xmlns:dcmitype="http://purl.org/dc/dcmitype/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+    '<dc:title>{title}</dc:title><dc:subject>{subject}</dc:subject><dc:creator>{author}</dc:creator>'
+    '<cp:keywords/><dc:description>{comments}</dc:description>'
+    '<cp:lastModifiedBy>{last_modified_by}</cp:lastModifiedBy><cp:revision>{revision}</cp:revision>'
+    '<dcterms:created xsi:type="dcterms:W3CDTF">{created}</dcterms:created>'
+    '<dcterms:modified xsi:type="dcterms:W3CDTF">{modified}</dcterms:modified><cp:category/></cp:coreProperties>'
+)
+
+def _text(value):
+    return escape(_INVALID_XML_CHARS.sub('', str(value)))
+
+def _attr(value):
+    return escape(_INVALID_XML_CHARS.sub('', str(value)), {'"': '&quot;'})
+
+def _run_text(text):
+    """Text elements of a run, with line breaks and tabs as w:br and w:tab"""
+    parts = []
+    for line_number, line in enumerate(text.split('\n')):
+        if line_number:
+            parts.append('<w:br/>')
+        for piece_number, piece in enumerate(line.split('\t')):
+            if piece_number:
+                parts.append('<w:tab/>')
+            if piece:
+                space = ' xml:space="preserve"' if piece != piece.strip() else ''
+                parts.append(f'<w:t{space}>{_text(piece)}</w:t>')
+    return ''.join(parts)
+
+def _run(text, italic=False, style=None):
+    properties = (f'<w:rStyle w:val="{style}"/>' if style else '') + ('<w:i/>' if italic else '')
+    content = (f'<w:rPr>{properties}</w:rPr>' if properties else '') + _run_text(text)
+    return f'<w:r>{content}</w:r>' if content else '<w:r/>'
+
+class _XmlStream:
+    """Buffer serialized XML and write it to a binary stream in CHUNK_SIZE pieces"""
+    
+    def __init__(self, target):
+        self.target = target
+        self.parts = []
+        self.size = 0
+    
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= CHUNK_SIZE:
+            self.flush()
+    
+    def flush(self):
+        if self.parts:
+            self.target.write(''.join(self.parts).encode('utf-8'))
+            self.parts = []
+            self.size = 0
+
+class DocumentWriter:
+    """Serialize model blocks as WordprocessingML, collecting the relationships they need
+    
+    Hyperlinks share one relationship per URL and images one relationship and
+    media part per file, numbered after the template's own relationships. Image
+    bytes are only read when the package is written (see write_media).
+    """
+    
+    def __init__(self, template_rels, load_image):
+        self.load_image = load_image
+        self.next_rid = max((int(n) for n in re.findall(r'Id="rId(\d+)"', template_rels)), default=0) + 1
+        self.next_drawing_id = 1
+        self.hyperlink_rids = {}
+        self.image_rids = {}
+        # (rId, relationship type, target, external) in creation order, and (part name, Picture) of the images
+        self.relationships = []
+        self.media = []
+    
+    def _new_rid(self, reltype, target, external=False):
+        r_id = f'rId{self.next_rid}'
+        self.next_rid += 1
+        self.relationships.append((r_id, reltype, target, external))
+        return r_id
+    
+    def hyperlink_rid(self, url):
+        r_id = self.hyperlink_rids.get(url)
+        if r_id is None:
+            r_id = self.hyperlink_rids[url] = self._new_rid(REL_HYPERLINK, url, external=True)
+        return r_id
+    
+    def image_rid(self, picture):
+        source = picture.path or picture.filename
+        r_id = self.image_rids.get(source)
+        if r_id is None:
+            extension = source.rsplit('.', 1)[-1].lower()
+            extension = 'jpeg' if extension == 'jpg' else extension
+            partname = f'media/image{len(self.media) + 1}.{extension}'
+            self.media.append((f'word/{partname}', picture))
+            r_id = self.image_rids[source] = self._new_rid(REL_IMAGE, partname)
+        return r_id
+    
+    def media_extensions(self):
+        return {name.rsplit('.', 1)[-1] for name, _ in self.media}
+    
+    def write_media(self, package):
+        """Write the image parts one at a time to a PackageWriter, copying files given by path straight into it"""
+        for name, picture in self.media:
+            if picture.path:
+                with open(picture.path, 'rb') as source, package.open(name) as part:
+                    shutil.copyfileobj(source, part, CHUNK_SIZE)
+            else:
+                package.write(name, self.load_image(picture.filename))
+    
+    def paragraph(self, paragraph):
+        parts = ['<w:p>']
+        properties = ''
+        if paragraph.style:
+            properties += f'<w:pStyle w:val="{paragraph.style}"/>'
+        if paragraph.alignment:
+            properties += f'<w:jc w:val="{paragraph.alignment}"/>'
+        if properties:
+            parts.append(f'<w:pPr>{properties}</w:pPr>')
+        for item in paragraph.content:
+            if isinstance(item, Run):
+                parts.append(_run(item.text, item.italic))
+            elif isinstance(item, Hyperlink):
+                parts.append(f'<w:hyperlink r:id="{self.hyperlink_rid(item.url)}">'
+                             f'{_run(item.text, style=HYPERLINK_STYLE_ID)}</w:hyperlink>')
+            elif isinstance(item, Picture):
+                drawing_id = self.next_drawing_id
+                self.next_drawing_id += 1
+                parts.append(_PICTURE.format(cx=item.width, cy=item.height, id=drawing_id,
+                                             name=_attr(os.path.basename(item.filename)), rid=self.image_rid(item)))
+        if len(parts) == 1:
+            return '<w:p/>'
+        parts.append('</w:p>')
+        return ''.join(parts)
+    
+    def cell(self, cell):
+        properties = f'<w:tcW w:type="dxa" w:w="{cell.width}"/>'
+        if cell.colspan > 1:
+            properties += f'<w:gridSpan w:val="{cell.colspan}"/>'
+        if cell.vmerge == 'restart':
+            properties += '<w:vMerge w:val="restart"/>'
+        elif cell.vmerge:
+            properties += '<w:vMerge/>'
+        if cell.shaded:
+            properties += f'<w:shd w:fill="{HEADER_FILL}"/>'
+        return f'<w:tc><w:tcPr>{properties}</w:tcPr>{self.paragraph(cell.paragraph)}</w:tc>'
+    
+    def write_table(self, stream, table):
+        alignment = f'<w:jc w:val="{table.alignment}"/>' if table.alignment else ''
+        grid = ''.join(f'<w:gridCol w:w="{width}"/>' for width in table.widths)
+        stream.write(f'<w:tbl><w:tblPr><w:tblStyle w:val="{table.style}"/><w:tblW w:type="auto" w:w="0"/>'
+                     f'{alignment}{_TABLE_LOOK}</w:tblPr><w:tblGrid>{grid}</w:tblGrid>')
+        for row in table.rows:
+            height = f'<w:trPr><w:trHeight w:val="{row.height}"/></w:trPr>' if row.height else ''
+            stream.write(f'<w:tr>{height}{"".join(self.cell(cell) for cell in row.cells)}</w:tr>')
+        stream.write('</w:tbl>')
+    
+    def write_block(self, stream, block):
+        if isinstance(block, Paragraph):
+            stream.write(self.paragraph(block))
+        elif isinstance(block, Table):
+            self.write_table(stream, block)
+        elif isinstance(block, PageBreak):
+            stream.write(_PAGE_BREAK)
+        else:
+            raise TypeError(f'Unsupported block {type(block).__name__}')
+    
+    def relationships_xml(self, template_rels):
+        """The template's relationships part with the document's own relationships appended"""
+        added = []
+        for r_id, reltype, target, external in self.relationships:
+            mode = ' TargetMode="External"' if external else ''
+            added.append(f'<Relationship Id="{r_id}" Type="{reltype}" Target="{_attr(target)}"{mode}/>')
+        return template_rels.replace('</Relationships>', ''.join(added) + '</Relationships>')
+
+def content_types_xml(template_types, media_extensions=()):
+    """The template's content types with a default for the media extensions, defaults sorted as python-docx does"""
+    defaults = dict(_DEFAULT_CONTENT_TYPE.findall(template_types))
+    for extension in media_extensions:
+        defaults.setdefault(extension, IMAGE_CONTENT_TYPES.get(extension, f'image/{extension}'))
+    added = ''.join(f'<Default Extension="{extension}" ContentType="{defaults[extension]}"/>'
+                    for extension in sorted(defaults))
+    return _DEFAULT_CONTENT_TYPE.sub('', template_types).replace('<Override ', added + '<Override ', 1)
+
+def core_properties_xml(properties):
+    """docProps/core.xml from the title, subject, author, comments, last_modified_by, revision, created, modified values"""
+    values = {name: _text(value) for name, value in properties.items()}
+    for name in ('created', 'modified'):
+        values[name] = properties[name].strftime('%Y-%m-%dT%H:%M:%SZ')
+    return _CORE_PROPERTIES.format(**values)
+
+def write_package(blocks, template, target, properties, timestamp=None, load_image=None, policy=None):
+    """Write a .docx package for the model blocks to a binary stream; returns the package_writer.PackageStats
+    
+    template is the base package (bytes or a file object) whose parts are reused,
+    properties the core properties (see core_properties_xml) and load_image maps a
+    Picture filename to its bytes. Every member is dated timestamp, or now, and
+    compressed under policy (a package_writer.PackagePolicy, default if None).
+    """
+    if isinstance(template, bytes):
+        template = io.BytesIO(template)
+    generated_parts = {CONTENT_TYPES_PART, DOCUMENT_PART, DOCUMENT_RELS_PART, CORE_PROPERTIES_PART}
+    
+    with zipfile.ZipFile(template) as source, PackageWriter(target, policy, timestamp) as package:
+        template_rels = source.read(DOCUMENT_RELS_PART).decode('utf-8')
+        document = source.read(DOCUMENT_PART).decode('utf-8')
+        # The template body holds nothing but the section properties
+        body_start = document.index('<w:body>') + len('<w:body>')
+        prolog, epilog = document[:body_start], document[document.index('<w:sectPr', body_start):]
+        
+        for name in source.namelist():
+            if name not in generated_parts:
+                package.write(name, source.read(name))
+        
+        writer = DocumentWriter(template_rels, load_image)
+        with package.open(DOCUMENT_PART) as part:
+            stream = _XmlStream(part)
+            stream.write(prolog)
+            for block in blocks:
+                writer.write_block(stream, block)
+            stream.write(epilog)
+            stream.flush()
+        
+        package.write(DOCUMENT_RELS_PART, writer.relationships_xml(template_rels))
+        writer.write_media(package)
+        # Written last, once the media parts are known
+        package.write(CONTENT_TYPES_PART, content_types_xml(source.read(CONTENT_TYPES_PART).decode('utf-8'),
+                                                            writer.media_extensions()))
+        package.write(CORE_PROPERTIES_PART, core_properties_xml(properties))
+    return package.stats
@@ -0,0 +1,215 @@
+"""Zip package writer shared by the document backends
+
+Parts are compressed according to a PackagePolicy: deflated at a configurable
+level, or stored when they are already compressed media (PNG, JPEG, GIF) that
+deflate would only spend time on. Every member gets the same attributes and a
+fixed date when one is given, so reproducible output stays byte-identical. The
+writer counts the bytes it writes and the time spent compressing them. Members
+of an existing package can also be copied as they are stored, without being
+decompressed, when only some of its parts change.
+"""
+import contextlib
+import struct
+import time
+import zipfile
+from datetime import datetime
+
+DEFAULT_COMPRESS_LEVEL = 6
+# Parts that are compressed already, stored as they are under the default policy
+STORED_EXTENSIONS = ('.png', '.jpeg', '.jpg', '.gif')
+# Bytes read at a time when copying a member from another package
+COPY_CHUNK = 1024 * 1024
+
+class PackagePolicy:
+    """How the parts of a package are compressed: deflate level 0 (store) to 9, and whether media is stored"""
+    __slots__ = ('compress_level', 'store_media')
+    
+    def __init__(self, compress_level=DEFAULT_COMPRESS_LEVEL, store_media=True):
+        if not 0 <= compress_level <= 9:
+            raise ValueError(f'Compression level must be between 0 and 9, not {compress_level}')
+        self.compress_level = compress_level
+        self.store_media = store_media
+    
+    def compression(self, name):
+        """(zip compression method, level) of a part"""
+        if self.compress_level == 0 or (self.store_media and name.lower().endswith(STORED_EXTENSIONS)):
+            return zipfile.ZIP_STORED, None
+        return zipfile.ZIP_DEFLATED, self.compress_level
+    
+    def as_dict(self):
+        return {'compress_level': self.compress_level, 'store_media': self.store_media}
+
+class PackageStats:
+    """Parts written, how many were stored or copied from another package, their size before and after
+    compression, the size of the whole package (headers included) and the time spent compressing"""
+    __slots__ = ('parts', 'stored_parts', 'copied_parts', 'uncompressed_bytes', 'compressed_bytes', 'bytes_written',
+                 'compress_seconds')
+    
+    def __init__(self):
+        self.parts = 0
+        self.stored_parts = 0
+        self.copied_parts = 0
+        self.uncompressed_bytes = 0
+        self.compressed_bytes = 0
+        self.bytes_written = 0
+        self.compress_seconds = 0.0
+    
+    def as_dict(self):
+        return {
+            'parts': self.parts,
+            'stored_parts': self.stored_parts,
+            'copied_parts': self.copied_parts,
+            'uncompressed_bytes': self.uncompressed_bytes,
+            'compressed_bytes': self.compressed_bytes,
+            'bytes_written': self.bytes_written,
+            'compress_ms': round(self.compress_seconds * 1000, 2)
+        }
+
+class _TimedMember:
+    """Writable zip member that adds the time spent in its writes to the package stats"""
+    
+    def __init__(self, member, stats):
+        self.member = member
+        self.stats = stats
+    
+    def write(self, data):
+        started = time.perf_counter()
+        written = self.member.write(data)
+        self.stats.compress_seconds += time.perf_counter() - started
+        return written
+
+class PackageWriter:
+    """Write the parts of a .docx package to a binary stream under a PackagePolicy
+    
+    Members are dated date_time (a datetime, clamped to the zip epoch), or now.
+    Use as a context manager; stats holds the totals once it is closed.
+    """
+    
+    def __init__(self, target, policy=None, date_time=None):
+        self.policy = policy or PackagePolicy()
+        self.date_time = max(date_time or datetime.now(), datetime(1980, 1, 1)).timetuple()[:6]
+        self.stats = PackageStats()
+        self.zip = zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED)
+        self._start = self.zip.start_dir
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _info(self, name):
+        name = str(name).lstrip('/')
+        info = zipfile.ZipInfo(name, self.date_time)
+        info.compress_type, level = self.policy.compression(name)
+        # Public from Python 3.13, private before
+        if hasattr(info, 'compress_level'):
+            info.compress_level = level
+        else:
+            info._compresslevel = level
+        info.create_system = 0
+        info.external_attr = 0
+        return info
+    
+    def _count(self, info):
+        self.stats.parts += 1
+        self.stats.stored_parts += info.compress_type == zipfile.ZIP_STORED
+        self.stats.uncompressed_bytes += info.file_size
+        self.stats.compressed_bytes += info.compress_size
+    
+    def write(self, name, blob):
+        """Write a whole part; name may be a part name with or without its leading '/'"""
+        info = self._info(name)
+        started = time.perf_counter()
+        self.zip.writestr(info, blob)
+        self.stats.compress_seconds += time.perf_counter() - started
+        self._count(info)
+    
+    @contextlib.contextmanager
+    def open(self, name):
+        """Yield a writable stream for a part written in pieces"""
+        info = self._info(name)
+        member = self.zip.open(info, 'w')
+        try:
+            yield _TimedMember(member, self.stats)
+        finally:
+            # Closing flushes the compressor
+            started = time.perf_counter()
+            member.close()
+            self.stats.compress_seconds += time.perf_counter() - started
+        self._count(info)
+    
+    def copy(self, source, info):
+        """Copy the member info of the open ZipFile source with its compressed bytes, without decompressing it"""
+        fp = source.fp
+        fp.seek(info.header_offset)
+        header = struct.unpack(zipfile.structFileHeader, fp.read(zipfile.sizeFileHeader))
+        if header[0] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f'Bad local header of {info.filename}')
+        # Skip the file name and extra field of the local header (fields 10 and 11)
+        fp.seek(header[10] + header[11], 1)
+        
+        member = zipfile.ZipInfo(info.filename, info.date_time)
+        for attr in ('compress_type', 'CRC', 'compress_size', 'file_size', 'create_system', 'create_version',
+                     'extract_version', 'internal_attr', 'external_attr'):
+            setattr(member, attr, getattr(info, attr))
+        # Sizes and CRC are known, so the copy goes without the trailing data descriptor
+        member.flag_bits = info.flag_bits & ~0x08
+        zip64 = member.file_size > zipfile.ZIP64_LIMIT or member.compress_size > zipfile.ZIP64_LIMIT
+        
+        target = self.zip.fp
+        member.header_offset = target.tell()
+        target.write(member.FileHeader(zip64))
+        remaining = info.compress_size
+        while remaining:
+            chunk = fp.read(min(remaining, COPY_CHUNK))
+            if not chunk:
+                raise zipfile.BadZipFile(f'Truncated member {info.filename}')
+            target.write(chunk)
+            remaining -= len(chunk)
+        
+        # Register the member as ZipFile.writestr() would, so the central directory lists it
+        self.zip.filelist.append(member)
+        self.zip.NameToInfo[member.filename] = member
+        self.zip.start_dir = target.tell()
+        self.zip._didModify = True
+        self.stats.copied_parts += 1
+        self._count(member)
+    
+    def close(self):
+        # The zip file keeps its own position, also over unseekable streams, and leaves the stream open
+        stream = self.zip.fp
+        self.zip.close()
+        if stream is not None:
+            self.stats.bytes_written = stream.tell() - self._start
+
+def docx_parts(doc):
+    """(part name, bytes) of a python-docx document, in the order python-docx saves them"""
+    from docx.opc.pkgwriter import _ContentTypesItem
+    from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+    
+    package = doc.part.package
+    for part in package.parts:
+        part.before_marshal()
+    parts = list(package.parts)
+    yield CONTENT_TYPES_URI, _ContentTypesItem.from_parts(parts).blob
+    yield PACKAGE_URI.rels_uri, package.rels.xml
+    for part in parts:
+        yield part.partname, part.blob
+        if len(part.rels):
+            yield part.partname.rels_uri, part.rels.xml
+
+def write_docx(doc, target, policy=None, date_time=None, sort=False):
+    """Write a python-docx document to a binary stream under a policy; returns the PackageStats
+    
+    With sort, [Content_Types].xml comes first followed by the other parts sorted
+    by name, for a stable member order.
+    """
+    parts = docx_parts(doc)
+    if sort:
+        parts = sorted(((str(name).lstrip('/'), blob) for name, blob in parts),
+                       key=lambda item: (item[0] != '[Content_Types].xml', item[0]))
+    with PackageWriter(target, policy, date_time) as writer:
+        for name, blob in parts:
+            writer.write(name, blob)
+    return writer.stats
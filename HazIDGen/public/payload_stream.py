@@ -0,0 +1,220 @@
+"""Incremental payload ingest for generate_docx.py (--stream-input)
+
+json.load() holds the whole payload at once, and on large campaigns most of it
+is hazardDetails: every category with the details and recommendations of every
+hazard. load_payload() parses the payload from a stream instead, value by
+value. The small fields are kept as usual, while the categories of hazardDetails
+are spooled to an anonymous temporary file as they are parsed and read back one
+at a time by the table builders, so memory follows the largest category rather
+than the whole payload.
+
+The spooled hazardDetails is a read-only mapping (SpooledCategories). It also
+records which categories have a selected hazard, so report_content lists the
+hazard sections without loading the other categories.
+"""
+import collections.abc
+import hashlib
+import io
+import json
+import re
+import tempfile
+
+from report_content import selected_category_hazards
+
+# Characters read from the stream at a time; a value longer than the buffer doubles the next read
+CHUNK_SIZE = 64 * 1024
+# Payload fields whose object value is spooled entry by entry
+SPOOLED_FIELDS = ('hazardDetails',)
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# What may still follow the part of a number decoded so far ('12' of '12.5e3')
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+_decoder = json.JSONDecoder()
+
+class _Reader:
+    """JSON tokens and values read from a text stream through a sliding buffer"""
+    
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        # Stream position of the buffer, lines before it and start of its first line
+        self.offset = 0
+        self.lines = 0
+        self.line_start = 0
+        self.eof = False
+    
+    def _fill(self):
+        """Append the next chunk to the unread part of the buffer; False at the end of the stream"""
+        if self.eof:
+            return False
+        chunk = self.stream.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        consumed = self.buffer[:self.pos]
+        newline = consumed.rfind('\n')
+        if newline >= 0:
+            self.lines += consumed.count('\n')
+            self.line_start = self.offset + newline + 1
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def error(self, message, pos=None):
+        """A JSONDecodeError at pos in the buffer (default: the current position), located in the whole stream"""
+        pos = self.pos if pos is None else pos
+        error = json.JSONDecodeError(message, self.buffer, pos)
+        head = self.buffer[:pos]
+        newline = head.rfind('\n')
+        error.pos = self.offset + pos
+        error.lineno = self.lines + head.count('\n') + 1
+        error.colno = pos - newline if newline >= 0 else error.pos - self.line_start + 1
+        error.args = (f'{message}: line {error.lineno} column {error.colno} (char {error.pos})',)
+        return error
+    
+    def peek(self):
+        """The next character after whitespace, not consumed; '' at the end of the stream"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+    
+    def expect(self, characters):
+        """Consume the next character, which must be one of characters; returns it"""
+        char = self.peek()
+        if not char or char not in characters:
+            raise self.error(f"Expected {' or '.join(repr(c) for c in characters)}")
+        self.pos += 1
+        return char
+    
+    def value(self, source=False):
+        """Decode the next complete value; with source, return (value, its JSON text)"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise self.error(e.msg, e.pos) from None
+            # A number that runs to the end of the buffer ('12' or '12.' of '12.5') may go on in the next chunk
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and _NUMBER_TAIL.fullmatch(self.buffer, end) and self._fill()):
+                continue
+            start, self.pos = self.pos, end
+            return (value, self.buffer[start:end]) if source else value
+    
+    def members(self):
+        """Yield the keys of an object one at a time, leaving the reader on each value"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise self.error('Expected an object key')
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+class SpooledCategories(collections.abc.Mapping):
+    """hazardDetails categories spooled to a temporary file, loaded one at a time when looked up
+    
+    Categories keep the order of the payload. digest identifies the content (for
+    the result cache) and selected_names() the categories with a selected hazard.
+    """
+    
+    def __init__(self, spool=None, entries=None, transform=None):
+        self.spool = spool or tempfile.TemporaryFile()
+        # name -> (offset, length, has a selected hazard, SHA-256 of the category)
+        self.entries = {} if entries is None else entries
+        self.transform = transform
+    
+    def add(self, name, category, source=None):
+        """Spool a category, as its JSON source text when given"""
+        if source is None:
+            source = json.dumps(category, ensure_ascii=False)
+        blob = source.encode('utf-8')
+        self.spool.seek(0, io.SEEK_END)
+        offset = self.spool.tell()
+        self.spool.write(blob)
+        selected = isinstance(category, dict) and bool(selected_category_hazards(category))
+        self.entries[name] = (offset, len(blob), selected, hashlib.sha256(blob).hexdigest())
+    
+    def __getitem__(self, name):
+        offset, length, _, _ = self.entries[name]
+        self.spool.seek(offset)
+        category = json.loads(self.spool.read(length).decode('utf-8'))
+        return category if self.transform is None else self.transform(name, category)
+    
+    def __iter__(self):
+        return iter(self.entries)
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def selected_names(self):
+        """Names of the categories with at least one selected hazard, in payload order"""
+        return [name for name, entry in self.entries.items() if entry[2]]
+    
+    @property
+    def digest(self):
+        digest = hashlib.sha256()
+        for name, entry in self.entries.items():
+            digest.update(json.dumps([name, entry[3]]).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def transformed(self, transform):
+        """A view whose categories go through transform(name, category) when loaded; it must keep the selection"""
+        inner = self.transform
+        if inner is None:
+            return SpooledCategories(self.spool, self.entries, transform)
+        
+        def chained(name, category):
+            return transform(name, inner(name, category))
+        return SpooledCategories(self.spool, self.entries, chained)
+    
+    def close(self):
+        self.spool.close()
+
+def load_payload(stream, chunk_size=CHUNK_SIZE):
+    """Parse a JSON payload object from a text or binary stream, spooling the SPOOLED_FIELDS objects
+    
+    Raises json.JSONDecodeError for malformed JSON, like json.load(). Release the
+    spools with close_payload() once the report is written.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    reader = _Reader(stream, chunk_size)
+    payload = {}
+    try:
+        if reader.peek() != '{':
+            raise reader.error('A payload must be a JSON object')
+        for key in reader.members():
+            if key in SPOOLED_FIELDS and reader.peek() == '{':
+                spooled = payload[key] = SpooledCategories()
+                for name in reader.members():
+                    spooled.add(name, *reader.value(source=True))
+            else:
+                payload[key] = reader.value()
+        if reader.peek():
+            raise reader.error('Extra data after the payload')
+    except BaseException:
+        close_payload(payload)
+        raise
+    return payload
+
+def close_payload(payload):
+    """Delete the spool files of a payload read by load_payload(); other values are left alone"""
+    if not isinstance(payload, dict):
+        return
+    for value in payload.values():
+        if isinstance(value, SpooledCategories):
+            value.close()
@@ -0,0 +1,403 @@
+"""Report content shared by the DOCX generator and the HTML preview
+
+Everything the report says is decided here, from the payload alone: the static
+texts, the rows of every table and the list of sections in document order. The
+backends (generate_docx.py for Word, html_preview.py for the preview) only lay
+that content out, so both always show the same report.
+"""
+import collections
+import os
+import re
+import sys
+from datetime import datetime
+
+# Assets read once per process (see load_asset)
+_asset_cache = {}
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+# Contacts page used when the payload does not provide its own contactData
+DEFAULT_WEB_CONTACTS = [
+    {'title': 'CERN HSE', 'url': 'https://hse.cern/', 'description': 'Website'},
+    {'title': 'Contacts CMS Safety', 'url': 'https://cmssafety.web.cern.ch/who-are-we', 'description': 'group of CMS Safety referents'},
+    {'title': 'CMS RP', 'url': 'https://cmssafety.web.cern.ch/radiation-protection', 'description': 'CMS radiation protection information'},
+    {'title': 'CMS Safety Training and Access Requirements', 'url': 'https://cmssafety.web.cern.ch/training-and-access-requirements', 'description': 'all mandatory and recommended training'},
+    {'title': 'CERN Learning Hub', 'url': 'https://lms.cern.ch/', 'description': 'for the catalogue and registration to available training courses'},
+    {'title': 'ADaMS', 'url': 'http://adams.web.cern.ch/adams/', 'description': 'for access requests'},
+    {'title': 'IMPACT', 'url': 'https://impact.cern.ch/impact/secure/', 'description': 'tool for the declaration of an activity'},
+    {'title': 'TREC', 'url': 'https://cmmsx.cern.ch/SSO/trec/', 'description': 'system for tracing potentially radioactive equipment'},
+    {'title': 'EDH SIT', 'url': 'https://edh.cern.ch/Document/SupplyChain/SIT', 'description': 'for Storage and/or internal transport requests'}
+]
+DEFAULT_EMAIL_CONTACTS = [
+    {'email': 'Cms-safety@cern.ch', 'description': 'group of CMS Safety (TC, LEXGLIMOS, DLEXGLIMOS)'},
+    {'email': 'Cms-safety-team@cern.ch', 'description': 'group of CMS Safety Team (LEXGLIMOS Office)'},
+    {'email': 'Cms-rso@cern.ch', 'description': 'group of CMS Radiation Safety Officers (RSO, DRSO)'}
+]
+
+# A table cell holding a hyperlink rather than plain text
+TableLink = collections.namedtuple('TableLink', ['url', 'text'])
+
+# Header logos, left to right
+HEADER_LOGOS = ('CERN_logo.png', 'Logo CMS Safety.png')
+
+# Column widths of the report tables, in inches
+HEADER_WIDTHS = (3.0, 0.5, 0.5, 0.5, 0.5)
+DEFINITIONS_WIDTHS = (1.2, 0.6, 3.5, 0.8)
+SUMMARY_WIDTHS = (2.0, 2.0, 2.0, 1.0, 1.0)
+HAZARD_TABLE_WIDTHS = (2.2, 2.8, 3.5)
+
+# Title page
+TITLE = 'Safety Report'
+SUBTITLE = 'Hazard Identification Process in Areas'
+LOCATION_LINE = 'Building {{building}}/{{room}} {{location}}'
+SIGNATURE_ROWS = [['Prepared by:', 'Checked by:', 'Approved by:'], ['{{creatorFormatted}}', '', '']]
+DISTRIBUTION_LABEL = 'Distribution to:'
+DISTRIBUTION_TEXT = 'CMS Safety, Activity Responsible, {{tsoFormatted}}.'
+
+# History of changes page
+HISTORY_HEADING = 'History of changes'
+HISTORY_ROWS = [['Rev.', 'Date', 'Description of changes'], ['0.1', '{{creationDate}}', 'Creation of the document']]
+
+CONTACTS_HEADING = '1 CONTACTS AND USEFUL LINKS'
+
+# Hazards definitions page
+DEFINITIONS_HEADING = '2 HAZARDS DEFINITIONS'
+ISO_DEFINITION = ("According to ISO 45001 a hazard is defined as a source capable of causing injury and ill health. "
+                  "Hazards can include sources with the potential to cause harm or hazardous situations, "
+                  "or circumstances with the potential for exposure leading to injury and ill health.")
+ISO_LINK = TableLink('https://www.iso.org/obp/ui/fr/#iso:std:iso:45001:ed-1:v1:en', 'ISO 45001')
+DEFINITIONS_INSTRUCTIONS = [
+    '1. In the CHECK column of the table below, please check the hazards identified for the activity.',
+    '2. For each identified hazard, please refer to the identification sheet by simply clicking on the corresponding paragraph.'
+]
+DEFINITIONS_HEADER = ['Hazard', 'Check', 'Definition', 'Ref.']
+DEFINITIONS_MISSING_ROW = ['No Data', '', 'Hazard definitions not loaded from Excel file', 'N/A']
+CHECKED, UNCHECKED = '☒', '☐'
+
+# Your area pages
+AREA_HEADING = '3 YOUR AREA'
+SUMMARY_HEADING = '3.1 ACTIVITY SUMMARY INFORMATION'
+DOCUMENTS_HEADING = 'Existing documents (EDMS, Indico, …)'
+HSE_HEADING = 'Link with HSE (including HSE-RP)'
+DESCRIPTION_HEADING = '3.2 DESCRIPTION OF THE ACTIVITY'
+GUIDELINE_TEXT = 'For the Section below, please consider to have a look to this valuable HSE Guideline: '
+GUIDELINE_LINK = TableLink('https://edms.cern.ch/document/1114042', 'https://edms.cern.ch/document/1114042')
+
+# Hazard identification pages
+HAZARDS_HEADING = 'IDENTIFICATION OF THE HAZARDS FOR YOUR ACTIVITY'
+HAZARD_TABLE_HEADER = ['Subject', 'Details', 'Recommendations']
+NO_HAZARD_DETAILS = 'No hazard details provided.'
+
+ANNEX_HEADING = 'ANNEX: PICTURES'
+ANNEX_TEXT = 'Attached to EDMS Reference.'
+# Uploaded files embedded as annex pictures, by MIME type and by extension
+ANNEX_IMAGE_TYPES = ('image/jpeg', 'image/png')
+ANNEX_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+ACTIVITY_SUMMARY_KEYS = (
+    'title', 'responsiblePerson', 'participantCount', 'startDate', 'endDate',
+    'building', 'location', 'room', 'cernSupport', 'cmsSupport',
+    'safetyDocuments', 'technicalDocuments', 'otherDocuments',
+    'hseSupport', 'referenceDocuments'
+)
+
+def get_assets_dir():
+    """Resolve the assets directory for both script and PyInstaller executable runs"""
+    if getattr(sys, 'frozen', False):
+        # Running as PyInstaller executable
+        # The executable is in public/, assets are in ../src/assets/
+        script_dir = os.path.dirname(sys.executable)
+    else:
+        # Running as Python script
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, '..', 'src', 'assets')
+
+def load_asset(filename):
+    """Read an asset file once per process and return its bytes, or None if missing"""
+    if filename not in _asset_cache:
+        asset_path = os.path.join(get_assets_dir(), filename)
+        if os.path.exists(asset_path):
+            with open(asset_path, 'rb') as f:
+                _asset_cache[filename] = f.read()
+        else:
+            _asset_cache[filename] = None
+    return _asset_cache[filename]
+
+def fill_placeholders(text, values):
+    """Replace the {{placeholders}} of a text with values (missing ones become empty)"""
+    return PLACEHOLDER_PATTERN.sub(lambda m: str(values.get(m.group(1), '')), text)
+
+def format_date(date_string):
+    """Format date string to DD/MM/YYYY"""
+    if not date_string:
+        return "N/A"
+    try:
+        date_obj = datetime.fromisoformat(date_string.replace('Z', '+00:00'))
+        return date_obj.strftime("%d/%m/%Y")
+    except:
+        return date_string
+
+def hazard_key(name):
+    """Canonical key for matching hazard names: whitespace-collapsed and case-folded"""
+    return ' '.join(str(name).split()).casefold()
+
+def is_selected(value):
+    """Coerce a 'selected' flag given as a boolean or as a 'true'/'True' string"""
+    if isinstance(value, str):
+        return value.strip().lower() == 'true'
+    return value == True
+
+def selected_category_hazards(category_data):
+    """Return the selected (hazard id, hazard data) pairs of a category, sorted by id"""
+    hazards = [
+        (hazard_name, hazard_data)
+        for hazard_name, hazard_data in category_data.items()
+        if isinstance(hazard_data, dict) and is_selected(hazard_data.get('selected', False))
+    ]
+    # Sort by name to group similar hazards together
+    hazards.sort(key=lambda hazard: hazard[0])
+    return hazards
+
+class SelectedCategories:
+    """(category name, selected hazards) pairs of a hazardDetails that loads its categories on lookup
+    
+    For payloads read by payload_stream: the categories with a selected hazard are
+    known up front, and each is loaded when the iteration reaches it, so only one
+    is held at a time. Every iteration loads them again.
+    """
+    
+    def __init__(self, hazard_details):
+        self.hazard_details = hazard_details
+        self.names = hazard_details.selected_names()
+    
+    def __iter__(self):
+        for category_name in self.names:
+            yield category_name, selected_category_hazards(self.hazard_details[category_name])
+    
+    def __len__(self):
+        return len(self.names)
+
+def build_hazard_index(data):
+    """Normalize the hazard selection of a payload once, for all the builders
+    
+    Returns a dict with 'selected_keys', the hazard_key() set of selectedHazards
+    used by the definitions table, and 'categories', the (category name, selected
+    hazards) pairs of hazardDetails that have at least one selected hazard: a list,
+    or SelectedCategories when hazardDetails is spooled by payload_stream.
+    """
+    hazard_details = data.get('hazardDetails') or {}
+    if hasattr(hazard_details, 'selected_names'):
+        categories = SelectedCategories(hazard_details)
+    else:
+        categories = []
+        for category_name, category_data in hazard_details.items():
+            if category_data and isinstance(category_data, dict):
+                hazards = selected_category_hazards(category_data)
+                if hazards:
+                    categories.append((category_name, hazards))
+    
+    return {
+        'selected_keys': frozenset(hazard_key(h) for h in data.get('selectedHazards') or []),
+        'categories': categories
+    }
+
+def header_metadata_texts(data=None):
+    """Return the text of the header metadata cells (Reference, EDMS, Rev., Validity)"""
+    reference_value = data.get('reference', '') if data else ''
+    edms_value = data.get('edms', '') if data else ''
+    validity_value = data.get('validity', 'EDMS') if data else 'EDMS'
+    return [
+        f'Reference:\n{reference_value}',
+        f'EDMS:\n{edms_value}',
+        'Rev.:\n0.1',
+        f'Validity:\n{validity_value}'
+    ]
+
+def title_values(inputs):
+    """Placeholder values of the title page"""
+    return {
+        'building': inputs.get('building', 'XXXX'),
+        'room': inputs.get('room', 'XX-xxx'),
+        'location': inputs.get('location', 'Meyrin/Prevessin/Point 5'),
+        'creatorFormatted': f"{inputs.get('creatorName', '')} ({inputs.get('creatorDepartment', '')})",
+        'tsoFormatted': format_safety_officers(inputs.get('safetyOfficers'))
+    }
+
+def format_safety_officers(officers):
+    """Return the TSO part of the distribution list, naming the TSO and dTSO of the building when known"""
+    officers = officers or {}
+    names = [f'{role} ({officers[key]})' for key, role in (('tso', 'TSO'), ('dtso', 'dTSO')) if officers.get(key)]
+    return ', '.join(names) or 'TSO'
+
+def contact_lists(inputs):
+    """Return the (web contacts, email contacts) of the contacts page, with fallback to the defaults"""
+    contact_data = inputs.get('contactData', {})
+    return (contact_data.get('webContacts', DEFAULT_WEB_CONTACTS),
+            contact_data.get('emailContacts', DEFAULT_EMAIL_CONTACTS))
+
+def definition_rows(inputs, hazard_index=None):
+    """Rows of the hazard definitions table: hazard, check box, definition and reference
+    
+    The reference is a TableLink when it is a URL. Returns an empty list when the
+    payload has no hazard definitions.
+    """
+    if hazard_index is None:
+        hazard_index = build_hazard_index(inputs)
+    selected_keys = hazard_index['selected_keys']
+    
+    rows = []
+    for hazard_def in inputs.get('hazardDefinitions', []):
+        # Hazard name
+        hazard_name = hazard_def.get('hazard', hazard_def.get('Hazard', ''))
+        
+        # Check - mark if selected (☒ for selected, ☐ for unselected)
+        checked = hazard_key(hazard_name) in selected_keys
+        
+        # Definition
+        definition = hazard_def.get('definition', hazard_def.get('Definition', ''))
+        
+        # Ref. (Reference) - create hyperlink if it's a URL
+        ref_text = hazard_def.get('ref', hazard_def.get('Ref.', ''))
+        if ref_text and str(ref_text).startswith('http'):
+            ref_value = TableLink(str(ref_text), 'Link HSE')
+        else:
+            ref_value = str(ref_text) if ref_text else 'Link HSE'
+        
+        rows.append([hazard_name, CHECKED if checked else UNCHECKED, definition, ref_value])
+    return rows
+
+def activity_summary_rows(inputs):
+    """Rows of the 7x5 activity summary table; empty cells are covered by their neighbours (see summary_spans)"""
+    return [
+        ['Title', inputs.get('title', 'Enter the name of the specific activity'), '', '', ''],
+        ['Personnel', 'Name of the activity responsible:', inputs.get('responsiblePerson', 'Enter the name of the person leading activity'), '', ''],
+        ['', 'Estimated number of participants:', inputs.get('participantCount', 'Enter the number of people performing the activity'), '', ''],
+        ['Dates', 'Start date of the activity:', format_date(inputs.get('startDate')), 'Estimated end date:', format_date(inputs.get("endDate"))],
+        ['Location', 'Building number and specific zone:', f"{inputs.get('building', '')}/{inputs.get('location', '')}", '', ''],
+        ['', 'Location details:', f"{inputs.get('building', '')}/{inputs.get('room', '')}", '', ''],
+        ['Support', 'CERN specific support (Group):', inputs.get('cernSupport', 'Enter the name of the CERN group'), 'CMS specific support:', inputs.get('cmsSupport', 'Enter CMS team')]
+    ]
+
+def summary_spans(rows):
+    """Return {(row, column): (rowspan, colspan)} for the visible cells of the activity summary table
+    
+    An empty cell widens the non-empty cell before it in its row, except in the
+    first column, where the label above spans the rows of its group. Cells left
+    out of the result are covered by a span.
+    """
+    spans = {}
+    label = None
+    for i, row in enumerate(rows):
+        anchor = None
+        for j, value in enumerate(row):
+            if j == 0 and not str(value).strip() and label is not None:
+                spans[label] = (spans[label][0] + 1, 1)
+            elif str(value).strip() or anchor is None:
+                anchor = (i, j)
+                spans[anchor] = (1, 1)
+                if j == 0:
+                    label = anchor
+            else:
+                spans[anchor] = (1, spans[anchor][1] + 1)
+    return spans
+
+def document_rows(inputs):
+    """Rows of the existing documents table"""
+    return [
+        ['Safety file:', inputs.get('safetyDocuments', 'Risk assessments, certificates, training records, VICs, etc.')],
+        ['Technical documents:', inputs.get('technicalDocuments', 'Technical documents for tooling/equipment used')],
+        ['Other useful documents:', inputs.get('otherDocuments', 'Procedures, instructions, task sheets, etc.')]
+    ]
+
+def hse_rows(inputs):
+    """Rows of the link with HSE table"""
+    return [
+        ['Support by HSE on an already existing subject of activity:', inputs.get('hseSupport', 'HSE-RP, HSE inspections, etc. …')],
+        ['Reference documents (if any):', inputs.get('referenceDocuments', 'Additional supporting documentation from HSE: reports, derogation requests, advice, etc.')]
+    ]
+
+def description_text(inputs):
+    """Text of the activity description section"""
+    return inputs.get('activityDescription', 'Further details about the activity...')
+
+def hazard_rows(hazards):
+    """Rows of a hazard category table from its selected (hazard id, hazard data) pairs"""
+    rows = []
+    for hazard_name, hazard_data in hazards:
+        # Subject (hazard name) - use the name from the data if available, otherwise use the key
+        display_name = hazard_data.get('name', hazard_name)
+        
+        # Details
+        details_text = hazard_data.get('details', 'N/A')
+        
+        # Recommendations - use user input or default from Excel data
+        recommendations_text = hazard_data.get('recommendations', '')
+        if not recommendations_text or recommendations_text.strip() == '':
+            # If no user input, use the default from Excel data
+            recommendations_text = hazard_data.get('defaultRecommendations', 'Standard safety measures apply')
+        elif recommendations_text == 'No specific safety measures available.':
+            # If it's the default placeholder, use a more appropriate text
+            recommendations_text = 'Standard safety measures apply'
+        
+        rows.append([display_name, details_text, recommendations_text])
+    return rows
+
+def annex_files(data):
+    """(name, path) of the uploaded pictures saved to disk, in upload order"""
+    files = []
+    for upload in data.get('uploadedFiles') or []:
+        path = upload.get('savedPath') if isinstance(upload, dict) else None
+        if not path or upload.get('status', 'saved') != 'saved':
+            continue
+        name = upload.get('name') or os.path.basename(path)
+        if upload.get('type') in ANNEX_IMAGE_TYPES or os.path.splitext(path)[1].lower() in ANNEX_IMAGE_EXTENSIONS:
+            files.append((name, path))
+    return files
+
+def _payload_slice(data, keys):
+    """Return the entries of the payload a section reads, leaving missing keys out so defaults still apply"""
+    return {key: data[key] for key in keys if key in data}
+
+class ReportSections:
+    """Sections of a report whose hazard categories are loaded as the iteration reaches them"""
+    
+    def __init__(self, sections, categories):
+        self.sections = sections
+        self.categories = categories
+    
+    def __iter__(self):
+        yield from self.sections
+        for category_name, hazards in self.categories:
+            yield _hazard_category_section(category_name, hazards)
+    
+    def __len__(self):
+        return len(self.sections) + len(self.categories)
+
+def _hazard_category_section(category_name, hazards):
+    return (f'hazards:{category_name}', 'hazard_category', {'category': category_name, 'hazards': hazards}, False)
+
+def report_sections(data, hazard_index, generated):
+    """Return the (key, kind, inputs, new_page) sections of a report, in document order
+    
+    A backend renders a section with its renderer for kind, which reads nothing
+    but inputs, the slice of the payload the section depends on, so the section
+    can be fingerprinted by it. Sections with new_page start a page with the logo
+    header. With SelectedCategories the result is a ReportSections, which loads
+    one hazard category at a time; iterate it rather than indexing it.
+    """
+    sections = [
+        ('title', 'title',
+         _payload_slice(data, ('building', 'room', 'location', 'creatorName', 'creatorDepartment', 'safetyOfficers')),
+         True),
+        ('history', 'history', {'creationDate': generated.strftime("%d/%m/%Y")}, True),
+        ('contacts', 'contacts', _payload_slice(data, ('contactData',)), True),
+        ('definitions', 'definitions', _payload_slice(data, ('hazardDefinitions', 'selectedHazards')), True),
+        ('activity_summary', 'activity_summary', _payload_slice(data, ACTIVITY_SUMMARY_KEYS), True),
+        ('description', 'description', _payload_slice(data, ('activityDescription',)), True),
+        ('hazards', 'hazards_intro', {}, True)
+    ]
+    if isinstance(hazard_index['categories'], SelectedCategories):
+        return ReportSections(sections, hazard_index['categories'])
+    for category_name, hazards in hazard_index['categories']:
+        sections.append(_hazard_category_section(category_name, hazards))
+    return sections
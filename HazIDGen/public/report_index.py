@@ -0,0 +1,212 @@
+"""SQLite index of generated reports (generate_docx.py --index, --search)
+
+With --index, every report written by generate_docx.py also gets a row in a
+local SQLite database: the activity metadata (title, responsible person,
+building, room, location and dates) and, per category, the selected hazards with
+their details and recommendations, as they appear in the report. Searches are
+then answered from the indexes instead of by opening the documents:
+
+    python generate_docx.py --index reports.sqlite --search "radiation OR lifting" --place "Point 5" \\
+        --between 2026-10-17 2026-11-17
+
+The hazard texts are searchable through an FTS5 table when SQLite provides it;
+without FTS5 a text search falls back to a substring match with a warning. A
+report generated again to the same path replaces its row. Batch and service
+workers write to the same database, serialized by SQLite's locking.
+"""
+import logging
+import os
+import sqlite3
+from datetime import date, datetime
+
+from report_content import hazard_key, hazard_rows
+
+logger = logging.getLogger('generate_docx')
+
+# Seconds a writer waits for another process holding the database lock
+BUSY_TIMEOUT = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    document TEXT NOT NULL UNIQUE,
+    generated TEXT NOT NULL,
+    title TEXT,
+    responsible TEXT,
+    creator TEXT,
+    building TEXT COLLATE NOCASE,
+    room TEXT COLLATE NOCASE,
+    location TEXT COLLATE NOCASE,
+    start_date TEXT,
+    end_date TEXT
+);
+CREATE INDEX IF NOT EXISTS reports_building ON reports (building);
+CREATE INDEX IF NOT EXISTS reports_room ON reports (room);
+CREATE INDEX IF NOT EXISTS reports_location ON reports (location);
+CREATE INDEX IF NOT EXISTS reports_dates ON reports (start_date, end_date);
+CREATE TABLE IF NOT EXISTS hazards (
+    id INTEGER PRIMARY KEY,
+    report_id INTEGER NOT NULL REFERENCES reports (id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    category_key TEXT NOT NULL,
+    hazard TEXT NOT NULL,
+    details TEXT,
+    recommendations TEXT
+);
+CREATE INDEX IF NOT EXISTS hazards_report ON hazards (report_id);
+CREATE INDEX IF NOT EXISTS hazards_category ON hazards (category_key, report_id);
+"""
+# Full-text index of the hazard texts, its rowids those of the hazards table
+_FTS_SCHEMA = 'CREATE VIRTUAL TABLE IF NOT EXISTS hazard_text USING fts5(category, hazard, details, recommendations)'
+
+_REPORT_COLUMNS = ('generated', 'title', 'responsible', 'creator', 'building', 'room', 'location', 'start_date',
+                   'end_date')
+
+def iso_date(value):
+    """The YYYY-MM-DD date of a payload date ('2026-01-12', '2026-03-27T00:00:00Z'), or None"""
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value.strip()[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+def _text(value):
+    text = str(value).strip() if value is not None else ''
+    return text or None
+
+def report_record(data, hazard_index, generated):
+    """(report columns, hazard rows) indexed for a payload
+    
+    Hazards are (category, hazard, details, recommendations), with the texts the
+    report tables show (see hazard_rows).
+    """
+    report = {
+        'generated': generated.isoformat(),
+        'title': _text(data.get('title')),
+        'responsible': _text(data.get('responsiblePerson')),
+        'creator': _text(data.get('creatorName')),
+        'building': _text(data.get('building')),
+        'room': _text(data.get('room')),
+        'location': _text(data.get('location')),
+        'start_date': iso_date(data.get('startDate')),
+        'end_date': iso_date(data.get('endDate'))
+    }
+    hazards = [(category, *(str(value) for value in row))
+               for category, category_hazards in hazard_index['categories']
+               for row in hazard_rows(category_hazards)]
+    return report, hazards
+
+class ReportIndex:
+    """Report index in the SQLite database at path, created on first use"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.fts = None
+    
+    def connect(self):
+        """Open a connection, creating the schema when the database is new"""
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        connection.execute('PRAGMA foreign_keys = ON')
+        if self.fts is None:
+            # Readers keep going while a worker writes
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.executescript(_SCHEMA)
+            try:
+                connection.execute(_FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                logger.warning(f"SQLite has no FTS5 ({e}), text searches of {self.path} will scan the hazards")
+                self.fts = False
+            connection.commit()
+        return connection
+    
+    def add(self, document, data, hazard_index, generated):
+        """Index a report written to document (its path or another unique name), replacing a previous row"""
+        report, hazards = report_record(data, hazard_index, generated)
+        connection = self.connect()
+        try:
+            with connection:
+                row = connection.execute('SELECT id FROM reports WHERE document = ?', (document,)).fetchone()
+                if row is None:
+                    report_id = connection.execute(
+                        f"INSERT INTO reports (document, {', '.join(_REPORT_COLUMNS)}) "
+                        f"VALUES (?{', ?' * len(_REPORT_COLUMNS)})",
+                        (document, *(report[column] for column in _REPORT_COLUMNS))).lastrowid
+                else:
+                    report_id = row[0]
+                    connection.execute(
+                        f"UPDATE reports SET {', '.join(f'{column} = ?' for column in _REPORT_COLUMNS)} WHERE id = ?",
+                        (*(report[column] for column in _REPORT_COLUMNS), report_id))
+                    if self.fts:
+                        connection.execute('DELETE FROM hazard_text WHERE rowid IN '
+                                           '(SELECT id FROM hazards WHERE report_id = ?)', (report_id,))
+                    connection.execute('DELETE FROM hazards WHERE report_id = ?', (report_id,))
+                for category, hazard, details, recommendations in hazards:
+                    hazard_id = connection.execute(
+                        'INSERT INTO hazards (report_id, category, category_key, hazard, details, recommendations) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (report_id, category, hazard_key(category), hazard, details, recommendations)).lastrowid
+                    if self.fts:
+                        connection.execute('INSERT INTO hazard_text (rowid, category, hazard, details, '
+                                           'recommendations) VALUES (?, ?, ?, ?, ?)',
+                                           (hazard_id, category, hazard, details, recommendations))
+        finally:
+            connection.close()
+        return len(hazards)
+    
+    def search(self, text=None, categories=(), place=None, between=None):
+        """Return the reports matching every given filter, ordered by start date
+        
+        text is an FTS5 query over the category, hazard name, details and
+        recommendations of the hazards (e.g. 'radiation OR lifting'); categories
+        are category names, matched case-insensitively; place is a building,
+        room or location; between is a (first day, last day) period the activity
+        overlaps, either end may be None. Each report is a dict with its indexed
+        columns and 'hazards', {category: [hazard names]} of the hazards matching
+        the text and categories (all of them without these filters).
+        """
+        conditions, parameters = [], []
+        if place:
+            conditions.append('(r.building = ? OR r.room = ? OR r.location = ?)')
+            parameters += [place.strip()] * 3
+        if between:
+            first, last = (iso_date(day) if day else None for day in between)
+            if last:
+                conditions.append('r.start_date <= ?')
+                parameters.append(last)
+            if first:
+                conditions.append('COALESCE(r.end_date, r.start_date) >= ?')
+                parameters.append(first)
+        hazard_filters = bool(text or categories)
+        if categories:
+            keys = [hazard_key(category) for category in categories]
+            conditions.append(f"h.category_key IN ({', '.join('?' * len(keys))})")
+            parameters += keys
+        connection = self.connect()
+        try:
+            if text and self.fts:
+                conditions.append('h.id IN (SELECT rowid FROM hazard_text WHERE hazard_text MATCH ?)')
+                parameters.append(text)
+            elif text:
+                conditions.append("(h.category || ' ' || h.hazard || ' ' || COALESCE(h.details, '') || ' ' || "
+                                  "COALESCE(h.recommendations, '')) LIKE ?")
+                parameters.append(f'%{text}%')
+            query = (f"SELECT r.id, r.document, {', '.join(f'r.{column}' for column in _REPORT_COLUMNS)}, "
+                     f"h.category, h.hazard FROM reports r {'' if hazard_filters else 'LEFT '}JOIN hazards h "
+                     f"ON h.report_id = r.id{' WHERE ' + ' AND '.join(conditions) if conditions else ''} "
+                     f"ORDER BY r.start_date, r.id, h.id")
+            reports = {}
+            for row in connection.execute(query, parameters):
+                report = reports.get(row[0])
+                if report is None:
+                    report = reports[row[0]] = dict(zip(('document', *_REPORT_COLUMNS), row[1:-2]))
+                    report['hazards'] = {}
+                category, hazard = row[-2:]
+                if category is not None:
+                    report['hazards'].setdefault(category, []).append(hazard)
+            return list(reports.values())
+        finally:
+            connection.close()
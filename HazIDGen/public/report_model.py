@@ -0,0 +1,338 @@
+"""Intermediate document model of the hazard identification report
+
+The section builders turn the content of report_content.report_sections() into
+small nodes (paragraphs, runs, hyperlinks, pictures, tables and page breaks)
+that carry only what the Word layout needs: style ids, alignment, column widths
+in twips and cell spans. A backend such as ooxml_writer serializes the nodes as
+they come, so a report never has to exist as one tree in memory.
+"""
+from report_content import (
+    ANNEX_HEADING, ANNEX_TEXT, AREA_HEADING, CONTACTS_HEADING, DEFINITIONS_HEADER,
+    DEFINITIONS_HEADING, DEFINITIONS_INSTRUCTIONS, DEFINITIONS_MISSING_ROW, DEFINITIONS_WIDTHS,
+    DESCRIPTION_HEADING, DISTRIBUTION_LABEL, DISTRIBUTION_TEXT, DOCUMENTS_HEADING, GUIDELINE_LINK,
+    GUIDELINE_TEXT, HAZARD_TABLE_HEADER, HAZARD_TABLE_WIDTHS, HAZARDS_HEADING, HEADER_LOGOS,
+    HEADER_WIDTHS, HISTORY_HEADING, HISTORY_ROWS, HSE_HEADING, ISO_DEFINITION, ISO_LINK,
+    LOCATION_LINE, NO_HAZARD_DETAILS, SIGNATURE_ROWS, SUBTITLE, SUMMARY_HEADING, SUMMARY_WIDTHS,
+    TITLE, TableLink, activity_summary_rows, contact_lists, definition_rows, description_text,
+    document_rows, fill_placeholders, hazard_rows, header_metadata_texts, hse_rows, load_asset,
+    report_sections, summary_spans, title_values
+)
+
+# Named report styles, registered once in styles.xml of the base document (see generate_docx.register_report_styles)
+# (font size, bold) -> (style id, style name) of the paragraph style used by format_paragraph
+REPORT_PARAGRAPH_STYLES = {
+    (11, False): ('HazIDBody', 'HazID Body'),
+    (11, True): ('HazIDBodyBold', 'HazID Body Bold'),
+    (10, False): ('HazIDTableText', 'HazID Table Text'),
+    (10, True): ('HazIDTableTextBold', 'HazID Table Text Bold'),
+    (8, False): ('HazIDHeaderText', 'HazID Header Text'),
+}
+# Heading level -> (built-in style name, font size) used by add_formatted_heading
+REPORT_HEADING_STYLES = {
+    0: ('Title', 16),
+    1: ('Heading 1', 14),
+    2: ('Heading 2', 12),
+    3: ('Heading 3', 11),
+}
+# Character style of hyperlink runs
+HYPERLINK_STYLE_ID = 'Hyperlink'
+
+# Style ids of the built-in table styles of the template
+GRID_TABLE_STYLE = 'LightGrid-Accent1'
+HEADER_TABLE_STYLE = 'TableGrid'
+
+# Text width of the page (8.5" less two 0.5" margins), in twips, shared by columns without a width
+PAGE_TEXT_WIDTH = 10800
+# Header row height (0.6") and logo size (0.5", in EMU)
+HEADER_ROW_HEIGHT = 864
+LOGO_SIZE = 457200
+# Fill of the shaded table header rows
+HEADER_FILL = '4F81BD'
+
+LEFT, CENTER = 'left', 'center'
+
+def twips(inches):
+    return round(inches * 1440)
+
+class Run:
+    """Text with an optional italic face; line breaks and tabs are kept"""
+    __slots__ = ('text', 'italic')
+    
+    def __init__(self, text, italic=False):
+        self.text = text
+        self.italic = italic
+
+class Hyperlink:
+    """External link run in the hyperlink character style"""
+    __slots__ = ('url', 'text')
+    
+    def __init__(self, url, text):
+        self.url = url
+        self.text = text
+
+class Picture:
+    """Inline image, size in EMU; read from path when given, otherwise from the assets by filename"""
+    __slots__ = ('filename', 'width', 'height', 'path')
+    
+    def __init__(self, filename, width, height=None, path=None):
+        self.filename = filename
+        self.width = width
+        self.height = height or width
+        self.path = path
+
+class Paragraph:
+    """Runs, hyperlinks and pictures under a paragraph style id (None for the default style)"""
+    __slots__ = ('content', 'style', 'alignment')
+    
+    def __init__(self, content=(), style=None, alignment=None):
+        self.content = content
+        self.style = style
+        self.alignment = alignment
+
+class Cell:
+    """Table cell of one paragraph; colspan covers grid columns, vmerge is None, 'restart' or 'continue'"""
+    __slots__ = ('paragraph', 'width', 'colspan', 'vmerge', 'shaded')
+    
+    def __init__(self, paragraph, width, colspan=1, vmerge=None, shaded=False):
+        self.paragraph = paragraph
+        self.width = width
+        self.colspan = colspan
+        self.vmerge = vmerge
+        self.shaded = shaded
+
+class Row:
+    __slots__ = ('cells', 'height')
+    
+    def __init__(self, cells, height=None):
+        self.cells = cells
+        self.height = height
+
+class Table:
+    """Table with column widths in twips; rows may be any iterable, consumed once when written"""
+    __slots__ = ('widths', 'rows', 'style', 'alignment')
+    
+    def __init__(self, widths, rows, style=GRID_TABLE_STYLE, alignment=None):
+        self.widths = widths
+        self.rows = rows
+        self.style = style
+        self.alignment = alignment
+
+class PageBreak:
+    """Start of a new page"""
+    __slots__ = ()
+
+PAGE_BREAK = PageBreak()
+
+def paragraph_style(font_size=11, bold=False):
+    return REPORT_PARAGRAPH_STYLES[(font_size, bold)][0]
+
+def heading(text, level, alignment=LEFT):
+    style = REPORT_HEADING_STYLES[level][0].replace(' ', '')
+    return Paragraph([Run(text)], style, alignment)
+
+def paragraph(text, font_size=11, bold=False, alignment=LEFT, italic=False):
+    return Paragraph([Run(text, italic)] if text else [], paragraph_style(font_size, bold), alignment)
+
+def _inline(value):
+    """Run or hyperlink of a table value"""
+    if isinstance(value, TableLink):
+        return Hyperlink(value.url, value.text)
+    return Run(str(value))
+
+def _column_widths(widths, columns):
+    if widths:
+        return [twips(width) for width in widths]
+    return [PAGE_TEXT_WIDTH // columns] * columns
+
+def _first_row_widths(columns):
+    """Cell widths of a row created with its table: python-docx gives them an equal share of the
+    text width, and the column widths set afterwards only reach the grid"""
+    return _column_widths(None, columns)
+
+def text_table(rows, widths=None, columns=None, formats=None, header=None, shaded=True, alignment=None):
+    """Table of text or TableLink values
+    
+    formats gives the (font size, bold, alignment) of each column, or None for
+    unformatted cells. The header row is shaded and centred, or only bold when
+    shaded is False.
+    """
+    widths = _column_widths(widths, columns or len(header or rows[0]))
+    
+    def table_rows():
+        if header:
+            style = paragraph_style(11, True) if shaded else paragraph_style(10, True)
+            header_alignment = CENTER if shaded else LEFT
+            yield Row([Cell(Paragraph([Run(text)], style, header_alignment), width, shaded=shaded)
+                       for text, width in zip(header, _first_row_widths(len(widths)))])
+        for row in rows:
+            cells = []
+            for col, value in enumerate(row):
+                if formats:
+                    font_size, bold, cell_alignment = formats[col]
+                    cell_paragraph = Paragraph([_inline(value)], paragraph_style(font_size, bold), cell_alignment)
+                else:
+                    cell_paragraph = Paragraph([_inline(value)])
+                cells.append(Cell(cell_paragraph, widths[col]))
+            yield Row(cells)
+    
+    return Table(widths, table_rows(), alignment=alignment)
+
+def header_table(data):
+    """Logo and metadata table at the top of every page"""
+    widths = _column_widths(HEADER_WIDTHS, 5)
+    cell_widths = _first_row_widths(5)
+    # The logo cell is cleared to an empty run before the logos are added
+    logos = [Run('')]
+    for filename in HEADER_LOGOS:
+        if load_asset(filename) is not None:
+            logos.append(Picture(filename, LOGO_SIZE))
+            # Every logo but the last is followed by a space
+            if filename != HEADER_LOGOS[-1]:
+                logos.append(Run(' '))
+    style = paragraph_style(8)
+    cells = [Cell(Paragraph(logos, style, LEFT), cell_widths[0])]
+    for text, width in zip(header_metadata_texts(data), cell_widths[1:]):
+        cells.append(Cell(Paragraph([Run(text)], style, CENTER), width))
+    return Table(widths, [Row(cells, HEADER_ROW_HEIGHT)], HEADER_TABLE_STYLE, CENTER)
+
+def _title_blocks(inputs):
+    values = title_values(inputs)
+    signature_rows = [[fill_placeholders(text, values) for text in row] for row in SIGNATURE_ROWS]
+    return [
+        Paragraph(),
+        heading(TITLE, 0, CENTER),
+        heading(SUBTITLE, 1, CENTER),
+        paragraph(fill_placeholders(LOCATION_LINE, values), alignment=CENTER),
+        text_table(signature_rows[1:], formats=[(10, False, LEFT)] * 3, header=signature_rows[0], shaded=False,
+                   alignment=CENTER),
+        paragraph(DISTRIBUTION_LABEL, bold=True),
+        paragraph(fill_placeholders(DISTRIBUTION_TEXT, values))
+    ]
+
+def _history_blocks(inputs):
+    rows = [[fill_placeholders(text, inputs) for text in row] for row in HISTORY_ROWS]
+    return [heading(HISTORY_HEADING, 1),
+            text_table(rows[1:], formats=[(10, False, LEFT)] * 3, header=rows[0], shaded=False)]
+
+def _contacts_blocks(inputs):
+    web_contacts, email_contacts = contact_lists(inputs)
+    links = [(Hyperlink(contact['url'], contact['title']), contact['description']) for contact in web_contacts]
+    links += [(Hyperlink(f'mailto:{contact["email"]}', contact['email']), contact['description'])
+              for contact in email_contacts]
+    return [heading(CONTACTS_HEADING, 1)] + [
+        Paragraph([Run('• '), link, Run(f': {description}')]) for link, description in links]
+
+def _definitions_blocks(inputs):
+    blocks = [
+        heading(DEFINITIONS_HEADING, 1),
+        paragraph(ISO_DEFINITION, italic=True),
+        Paragraph([Hyperlink(ISO_LINK.url, ISO_LINK.text)], paragraph_style(), LEFT),
+        *(paragraph(instruction) for instruction in DEFINITIONS_INSTRUCTIONS)
+    ]
+    if not inputs.get('hazardDefinitions'):
+        blocks.append(text_table([DEFINITIONS_MISSING_ROW], DEFINITIONS_WIDTHS, header=DEFINITIONS_HEADER,
+                                 alignment=CENTER))
+        return blocks
+    formats = [(10, True, LEFT), (10, False, CENTER), (10, False, LEFT), (10, False, LEFT)]
+    blocks.append(text_table(definition_rows(inputs), DEFINITIONS_WIDTHS, formats=formats,
+                             header=DEFINITIONS_HEADER, alignment=CENTER))
+    blocks.append(Paragraph())
+    return blocks
+
+def summary_table(rows):
+    """Activity summary table, with the merges of report_content.summary_spans"""
+    widths = _column_widths(SUMMARY_WIDTHS, 5)
+    spans = summary_spans(rows)
+    # Grid columns still covered by a vertical merge from a row above: column -> rows left
+    covered = {}
+    table_rows = []
+    for i, row in enumerate(rows):
+        cells = []
+        for j, value in enumerate(row):
+            style = paragraph_style(10, j == 0)
+            if covered.get(j):
+                covered[j] -= 1
+                cells.append(Cell(Paragraph(), widths[j], vmerge='continue'))
+                continue
+            if (i, j) not in spans:
+                continue
+            rowspan, colspan = spans[(i, j)]
+            vmerge = None
+            if rowspan > 1:
+                covered[j] = rowspan - 1
+                vmerge = 'restart'
+            text = str(value)
+            cells.append(Cell(Paragraph([Run(text)] if text.strip() else [], style, LEFT),
+                              sum(widths[j:j + colspan]), colspan, vmerge))
+        table_rows.append(Row(cells))
+    return Table(widths, table_rows)
+
+def _activity_summary_blocks(inputs):
+    return [
+        heading(AREA_HEADING, 1),
+        heading(SUMMARY_HEADING, 2),
+        summary_table(activity_summary_rows(inputs)),
+        heading(DOCUMENTS_HEADING, 3),
+        text_table(document_rows(inputs), columns=2),
+        heading(HSE_HEADING, 3),
+        text_table(hse_rows(inputs), columns=2)
+    ]
+
+def _description_blocks(inputs):
+    return [
+        heading(DESCRIPTION_HEADING, 2),
+        paragraph(description_text(inputs)),
+        Paragraph([Run(GUIDELINE_TEXT), Hyperlink(GUIDELINE_LINK.url, GUIDELINE_LINK.text)], paragraph_style(), LEFT)
+    ]
+
+def _hazards_intro_blocks(inputs):
+    return [heading(HAZARDS_HEADING, 1)]
+
+def _hazard_category_blocks(inputs):
+    formats = [(10, True, LEFT), (10, False, LEFT), (10, False, LEFT)]
+    return [
+        heading(inputs['category'], 2),
+        text_table(hazard_rows(inputs['hazards']), HAZARD_TABLE_WIDTHS, formats=formats,
+                   header=HAZARD_TABLE_HEADER, alignment=CENTER),
+        paragraph('')
+    ]
+
+# Model builders of the section kinds listed by report_sections
+SECTION_BUILDERS = {
+    'title': _title_blocks,
+    'history': _history_blocks,
+    'contacts': _contacts_blocks,
+    'definitions': _definitions_blocks,
+    'activity_summary': _activity_summary_blocks,
+    'description': _description_blocks,
+    'hazards_intro': _hazards_intro_blocks,
+    'hazard_category': _hazard_category_blocks
+}
+
+def annex_blocks(images):
+    """Centred annex pictures (annex_images.AnnexImage), each followed by its file name"""
+    blocks = []
+    for image in images:
+        blocks.append(Paragraph([Picture(image.name, image.width, image.height, image.path)], None, CENTER))
+        blocks.append(paragraph(image.name, font_size=10, alignment=CENTER, italic=True))
+    return blocks
+
+def report_blocks(data, hazard_index, generated, annex_images=(), on_section=None):
+    """Yield the blocks of the whole report in document order, one section at a time
+    
+    on_section(key, position, total) is called before the blocks of each section are built.
+    """
+    sections = report_sections(data, hazard_index, generated)
+    for position, (key, kind, inputs, new_page) in enumerate(sections):
+        if on_section is not None:
+            on_section(key, position, len(sections))
+        if new_page:
+            if position > 0:
+                yield PAGE_BREAK
+            yield header_table(data)
+        yield from SECTION_BUILDERS[kind](inputs)
+    if not data.get('hazardDetails', {}):
+        yield Paragraph([Run(NO_HAZARD_DETAILS)])
+    yield heading(ANNEX_HEADING, 1)
+    yield paragraph(ANNEX_TEXT)
+    yield from annex_blocks(annex_images)
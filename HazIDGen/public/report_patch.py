@@ -0,0 +1,354 @@
+"""In-place patches of generated reports (generate_docx.py --patch)
+
+Archived reports are updated without their payloads: a patch names the new
+header metadata values, the new contacts list and the hyperlink URLs to replace,
+for example
+
+    {
+        "header": {"edms": "2874512", "validity": "2027"},
+        "contactData": {"webContacts": [{"title": ..., "url": ..., "description": ...}],
+                        "emailContacts": [{"email": ..., "description": ...}]},
+        "urls": {"https://old.cern.ch/page": "https://new.cern.ch/page"}
+    }
+
+Only word/document.xml and its relationships are parsed and rewritten; every
+other member of the package (styles, logos, annex pictures, ...) is copied as it
+is stored, without being decompressed. The parts are recognised by the content
+generate_docx.py writes: the header tables by their metadata labels, the
+contacts list as the bulleted links that follow the contacts heading.
+
+lxml comes with python-docx and is imported when a report is patched.
+"""
+import copy
+import logging
+import re
+import zipfile
+from datetime import datetime
+
+from package_writer import PackageWriter
+from report_content import CONTACTS_HEADING, header_metadata_texts
+
+logger = logging.getLogger('generate_docx')
+
+DOCUMENT_PART = 'word/document.xml'
+DOCUMENT_RELS_PART = 'word/_rels/document.xml.rels'
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+REL_HYPERLINK = R_NS + '/hyperlink'
+W = '{%s}' % W_NS
+R_ID = '{%s}id' % R_NS
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+# Payload keys of the header metadata cells, in the order of header_metadata_texts()
+HEADER_KEYS = ('reference', 'edms', None, 'validity')
+HEADER_LABELS = tuple(text.split('\n')[0] for text in header_metadata_texts())
+PATCH_KEYS = ('header', 'contactData', 'urls')
+
+_RID_PATTERN = re.compile(r'rId(\d+)$')
+
+def _check_contacts(contacts, name, fields):
+    if not isinstance(contacts, list) or not all(isinstance(c, dict) for c in contacts):
+        raise ValueError(f'contactData.{name} must be a list of objects')
+    for number, contact in enumerate(contacts, 1):
+        missing = [field for field in fields if not isinstance(contact.get(field), str)]
+        if missing:
+            raise ValueError(f'contactData.{name}[{number}] needs the text fields {", ".join(missing)}')
+
+def parse_patch(spec):
+    """Check a patch and return it with only the parts it changes; raises ValueError"""
+    if not isinstance(spec, dict):
+        raise ValueError('a patch must be a JSON object')
+    unknown = set(spec) - set(PATCH_KEYS)
+    if unknown:
+        raise ValueError(f'unknown patch keys: {", ".join(sorted(unknown))} (expected {", ".join(PATCH_KEYS)})')
+    patch = {}
+    header = spec.get('header') or {}
+    known = [key for key in HEADER_KEYS if key]
+    if not isinstance(header, dict) or set(header) - set(known) or not all(isinstance(v, str) for v in header.values()):
+        raise ValueError(f'header must map {", ".join(known)} to text')
+    if header:
+        patch['header'] = dict(header)
+    contact_data = spec.get('contactData') or {}
+    if not isinstance(contact_data, dict) or set(contact_data) - {'webContacts', 'emailContacts'}:
+        raise ValueError('contactData may only give webContacts and emailContacts')
+    if 'webContacts' in contact_data:
+        _check_contacts(contact_data['webContacts'], 'webContacts', ('title', 'url', 'description'))
+    if 'emailContacts' in contact_data:
+        _check_contacts(contact_data['emailContacts'], 'emailContacts', ('email', 'description'))
+    if contact_data:
+        patch['contactData'] = dict(contact_data)
+    urls = spec.get('urls') or {}
+    if not isinstance(urls, dict) or not all(isinstance(v, str) and v for v in urls.values()):
+        raise ValueError('urls must map old URLs to new URLs')
+    if urls:
+        patch['urls'] = dict(urls)
+    if not patch:
+        raise ValueError('the patch changes nothing')
+    return patch
+
+def _text(element):
+    """Text of a run or paragraph, with w:br and w:tab as line breaks and tabs"""
+    parts = []
+    for node in element.iter(W + 't', W + 'br', W + 'tab'):
+        if node.tag == W + 't':
+            parts.append(node.text or '')
+        else:
+            parts.append('\n' if node.tag == W + 'br' else '\t')
+    return ''.join(parts)
+
+def _set_text(run, text):
+    """Replace the text of a run, keeping its properties (as python-docx's Run.text does)"""
+    from lxml import etree
+    
+    for node in run.findall(W + 't') + run.findall(W + 'br') + run.findall(W + 'tab'):
+        run.remove(node)
+    for line_number, line in enumerate(text.split('\n')):
+        if line_number:
+            etree.SubElement(run, W + 'br')
+        for piece_number, piece in enumerate(line.split('\t')):
+            if piece_number:
+                etree.SubElement(run, W + 'tab')
+            if piece:
+                node = etree.SubElement(run, W + 't')
+                node.text = piece
+                if piece != piece.strip():
+                    node.set(XML_SPACE, 'preserve')
+
+class _Relationships:
+    """Hyperlink relationships of the document part, looked up by rId and by URL"""
+    
+    def __init__(self, root):
+        self.root = root
+        self.by_rid = {}
+        self.by_url = {}
+        self.next = 1
+        for rel in root:
+            match = _RID_PATTERN.match(rel.get('Id', ''))
+            if match:
+                self.next = max(self.next, int(match.group(1)) + 1)
+            if rel.get('Type') == REL_HYPERLINK:
+                self.by_rid[rel.get('Id')] = rel
+                self.by_url.setdefault(rel.get('Target'), rel.get('Id'))
+        self.changed = False
+    
+    def target(self, r_id):
+        rel = self.by_rid.get(r_id)
+        return None if rel is None else rel.get('Target')
+    
+    def rid(self, url):
+        """rId of the hyperlink relationship to url, added when the document has none"""
+        from lxml import etree
+        
+        r_id = self.by_url.get(url)
+        if r_id is None:
+            r_id = f'rId{self.next}'
+            self.next += 1
+            self.by_rid[r_id] = etree.SubElement(self.root, '{%s}Relationship' % RELS_NS, Id=r_id,
+                                                 Type=REL_HYPERLINK, Target=url, TargetMode='External')
+            self.by_url[url] = r_id
+            self.changed = True
+        return r_id
+    
+    def retarget(self, urls):
+        """Point the relationships to the old URLs of urls at the new ones; returns {rId: old URL}"""
+        retargeted = {}
+        for r_id, rel in self.by_rid.items():
+            new_url = urls.get(rel.get('Target'))
+            if new_url is not None and new_url != rel.get('Target'):
+                retargeted[r_id] = rel.get('Target')
+                rel.set('Target', new_url)
+        if retargeted:
+            self.by_url = {}
+            for r_id, rel in self.by_rid.items():
+                self.by_url.setdefault(rel.get('Target'), r_id)
+            self.changed = True
+        return retargeted
+    
+    def drop_unused(self, candidates, document):
+        """Remove the relationships among candidates no longer referenced by the document"""
+        used = {value for element in document.iter() for name, value in element.attrib.items()
+                if name.startswith('{%s}' % R_NS)}
+        for r_id in set(candidates) - used:
+            rel = self.by_rid.pop(r_id, None)
+            if rel is not None:
+                self.root.remove(rel)
+                if self.by_url.get(rel.get('Target')) == r_id:
+                    del self.by_url[rel.get('Target')]
+                self.changed = True
+
+def _patch_header(document, values):
+    """Rewrite the metadata cells of every header table; returns the number of cells changed"""
+    changed = 0
+    for tr in document.iter(W + 'tr'):
+        cells = tr.findall(W + 'tc')
+        if len(cells) != len(HEADER_KEYS) + 1:
+            continue
+        texts = [_text(tc) for tc in cells[1:]]
+        if not all(text.split('\n')[0] == label for text, label in zip(texts, HEADER_LABELS)):
+            continue
+        current = {key: text.partition('\n')[2] for key, text in zip(HEADER_KEYS, texts) if key}
+        current.update(values)
+        for tc, old, new in zip(cells[1:], texts, header_metadata_texts(current)):
+            if old == new:
+                continue
+            runs = list(tc.iter(W + 'r'))
+            if not runs:
+                continue
+            for run in runs[1:]:
+                run.getparent().remove(run)
+            _set_text(runs[0], new)
+            changed += 1
+    return changed
+
+def _contact_paragraphs(document):
+    """The bulleted link paragraphs that follow the contacts heading"""
+    body = document.find(W + 'body')
+    if body is None:
+        return None, []
+    heading = next((p for p in body.iterchildren(W + 'p') if _text(p) == CONTACTS_HEADING), None)
+    if heading is None:
+        return None, []
+    paragraphs = []
+    for element in heading.itersiblings():
+        if element.tag != W + 'p' or element.find(W + 'hyperlink') is None or not _text(element).startswith('• '):
+            break
+        paragraphs.append(element)
+    return heading, paragraphs
+
+def _contact_paragraph(template, r_id, text, description):
+    paragraph = copy.deepcopy(template)
+    hyperlink = paragraph.find(W + 'hyperlink')
+    hyperlink.set(R_ID, r_id)
+    link_runs = hyperlink.findall(W + 'r')
+    for run in link_runs[1:]:
+        hyperlink.remove(run)
+    _set_text(link_runs[0], text)
+    runs = [run for run in paragraph.findall(W + 'r') if paragraph.index(run) > paragraph.index(hyperlink)]
+    if runs:
+        for run in runs[1:]:
+            paragraph.remove(run)
+        _set_text(runs[0], f': {description}')
+    return paragraph
+
+def _contact_entry(paragraph, rels):
+    """(url, link text, description) of a contacts list paragraph"""
+    hyperlink = paragraph.find(W + 'hyperlink')
+    description = ''.join(_text(run) for run in hyperlink.itersiblings(W + 'r'))
+    return rels.target(hyperlink.get(R_ID)) or '', _text(hyperlink), description.removeprefix(': ')
+
+def _patch_contacts(document, rels, contact_data):
+    """Replace the web and/or email contacts
+    
+    Returns (contacts written, rIds of the replaced links); (0, []) when the list
+    is already the one given, and None when the document has no contacts list.
+    """
+    heading, paragraphs = _contact_paragraphs(document)
+    if not paragraphs:
+        return None
+    
+    groups = {'webContacts': [], 'emailContacts': []}
+    for paragraph in paragraphs:
+        entry = _contact_entry(paragraph, rels)
+        groups['emailContacts' if entry[0].startswith('mailto:') else 'webContacts'].append((paragraph, entry))
+    
+    wanted = {}
+    for key, contacts in contact_data.items():
+        if key == 'webContacts':
+            wanted[key] = [(c['url'], c['title'], c['description']) for c in contacts]
+        else:
+            wanted[key] = [(f'mailto:{c["email"]}', c['email'], c['description']) for c in contacts]
+    if all([entry for _, entry in groups[key]] == entries for key, entries in wanted.items()):
+        return 0, []
+    
+    replaced = []
+    new_paragraphs = []
+    for key, kept in groups.items():
+        if key not in wanted:
+            new_paragraphs.extend(paragraph for paragraph, _ in kept)
+            continue
+        replaced.extend(paragraph for paragraph, _ in kept)
+        for url, text, description in wanted[key]:
+            new_paragraphs.append(_contact_paragraph(paragraphs[0], rels.rid(url), text, description))
+    
+    old_rids = [paragraph.find(W + 'hyperlink').get(R_ID) for paragraph in replaced]
+    body = heading.getparent()
+    for paragraph in paragraphs:
+        body.remove(paragraph)
+    position = body.index(heading)
+    for offset, paragraph in enumerate(new_paragraphs, 1):
+        body.insert(position + offset, paragraph)
+    return sum(len(entries) for entries in wanted.values()), old_rids
+
+def _patch_urls(document, rels, urls):
+    """Retarget the hyperlinks to replaced URLs, and their text where it shows the URL; returns the number changed"""
+    retargeted = rels.retarget(urls)
+    for hyperlink in document.iter(W + 'hyperlink'):
+        old_url = retargeted.get(hyperlink.get(R_ID))
+        runs = hyperlink.findall(W + 'r')
+        if old_url is not None and runs and _text(hyperlink) == old_url:
+            for run in runs[1:]:
+                hyperlink.remove(run)
+            _set_text(runs[0], urls[old_url])
+    return len(retargeted)
+
+def _serialize(root):
+    from lxml import etree
+    return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+def patch_parts(document_xml, rels_xml, patch):
+    """Apply a patch to the document part and its relationships
+    
+    Returns (document.xml, document.xml.rels, summary), the parts as bytes or
+    None when they are unchanged, and summary counting what was changed.
+    """
+    from lxml import etree
+    
+    parser = etree.XMLParser(huge_tree=True)
+    document = etree.fromstring(document_xml, parser)
+    rels = _Relationships(etree.fromstring(rels_xml, parser))
+    summary = {}
+    
+    if 'header' in patch:
+        summary['header_cells'] = _patch_header(document, patch['header'])
+    if 'contactData' in patch:
+        contacts = _patch_contacts(document, rels, patch['contactData'])
+        if contacts is None:
+            logger.warning('No contacts list found, contacts left as they are')
+        else:
+            summary['contacts'], old_rids = contacts
+            rels.drop_unused(old_rids, document)
+    if 'urls' in patch:
+        summary['links'] = _patch_urls(document, rels, patch['urls'])
+    
+    document_changed = summary.get('header_cells') or summary.get('contacts') or summary.get('links')
+    return (_serialize(document) if document_changed else None,
+            _serialize(rels.root) if rels.changed else None,
+            summary)
+
+def patch_package(package, patch):
+    """Apply a patch to an open ZipFile report
+    
+    Returns ({part name: bytes} of the rewritten parts, summary of the changes);
+    the parts are empty when the patch changes nothing in this report.
+    """
+    document_xml, rels_xml, summary = patch_parts(package.read(DOCUMENT_PART), package.read(DOCUMENT_RELS_PART),
+                                                  patch)
+    parts = {name: blob for name, blob in ((DOCUMENT_PART, document_xml), (DOCUMENT_RELS_PART, rels_xml)) if blob}
+    return parts, summary
+
+def write_package(package, target, parts, policy=None):
+    """Write an open ZipFile report to a binary stream with parts replaced; returns the PackageStats
+    
+    The replaced parts are compressed under policy and keep the date of the
+    original document part; every other member is copied as stored.
+    """
+    date_time = datetime(*package.getinfo(DOCUMENT_PART).date_time)
+    with PackageWriter(target, policy, date_time) as writer:
+        for info in package.infolist():
+            if info.filename in parts:
+                writer.write(info.filename, parts[info.filename])
+            else:
+                writer.copy(package, info)
+    return writer.stats
@@ -0,0 +1,59 @@
+"""Tests that the docx and stream backends of generate_docx.py write the same package"""
+import copy
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'public'))
+sys.path.insert(0, os.path.join(HERE, '..', 'benchmarks'))
+
+import generate_docx
+from make_payload import make_payload
+
+@unittest.skipUnless(importlib.util.find_spec('docx'), 'python-docx is not installed')
+class BackendsTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='hazid-test-')
+        self.payload = make_payload(200, seed=1)
+        self.payload['generationDate'] = '2026-01-05T08:30:00Z'
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def generate(self, backend):
+        path = os.path.join(self.directory, f'{backend}.docx')
+        generate_docx.generate_hazard_document(copy.deepcopy(self.payload), path, reproducible=True, backend=backend)
+        with zipfile.ZipFile(path) as package:
+            return {name: package.read(name) for name in package.namelist()}
+    
+    def assertSamePackage(self):
+        reference = self.generate('docx')
+        streamed = self.generate('stream')
+        self.assertEqual(sorted(streamed), sorted(reference))
+        for name in reference:
+            with self.subTest(part=name):
+                self.assertEqual(streamed[name].decode('utf-8', 'replace'), reference[name].decode('utf-8', 'replace'))
+    
+    def test_sample_payload(self):
+        self.assertSamePackage()
+    
+    @unittest.skipUnless(importlib.util.find_spec('PIL'), 'Pillow is not installed')
+    def test_annex_pictures(self):
+        from PIL import Image
+        uploads = []
+        for name, color in (('photo.jpg', 'red'), ('plan.png', 'blue')):
+            path = os.path.join(self.directory, name)
+            Image.new('RGB', (40, 30), color).save(path)
+            uploads.append({'name': name, 'type': 'image/' + name.rsplit('.', 1)[1], 'savedPath': path,
+                            'status': 'saved'})
+        self.payload['uploadedFiles'] = uploads
+        self.assertSamePackage()
+
+if __name__ == '__main__':
+    unittest.main()
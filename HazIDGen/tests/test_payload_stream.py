@@ -0,0 +1,62 @@
+"""Tests of the incremental payload parser (public/payload_stream.py)"""
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'public'))
+
+import payload_stream
+
+PAYLOAD = ('{"a": 12.5, "b": -1e-3, "c": [1.25E+2, 3, true, null], "title": "Caf\\u00e9 é",\n'
+           ' "hazardDetails": {"chemical": {"chemical_0": {"selected": true, "name": "Acids", "weight": 0.5}},\n'
+           '                   "fire": {"fire_0": {"selected": false, "name": "Welding"}}},\n'
+           ' "participantCount": 12}')
+
+def plain(payload):
+    return {key: dict(value) if isinstance(value, payload_stream.SpooledCategories) else value
+            for key, value in payload.items()}
+
+class LoadPayloadTest(unittest.TestCase):
+    
+    def test_every_chunk_size(self):
+        expected = json.loads(PAYLOAD)
+        for chunk_size in range(1, len(PAYLOAD) + 2):
+            with self.subTest(chunk_size=chunk_size):
+                payload = payload_stream.load_payload(io.StringIO(PAYLOAD), chunk_size)
+                try:
+                    self.assertEqual(plain(payload), expected)
+                    self.assertEqual(payload['hazardDetails'].selected_names(), ['chemical'])
+                finally:
+                    payload_stream.close_payload(payload)
+    
+    def test_binary_stream(self):
+        payload = payload_stream.load_payload(io.BytesIO(PAYLOAD.encode('utf-8-sig')), 7)
+        try:
+            self.assertEqual(plain(payload), json.loads(PAYLOAD))
+        finally:
+            payload_stream.close_payload(payload)
+    
+    def test_malformed_json(self):
+        for text in ('{"a": 1,\n "b": [1,\n2,]}', '{"a": 1}x', '[1]', '{"hazardDetails": {"c": {}}'):
+            for chunk_size in (1, 3, 64):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    with self.assertRaises(json.JSONDecodeError):
+                        payload_stream.load_payload(io.StringIO(text), chunk_size)
+    
+    def test_error_position(self):
+        text = '{"a": 1,\n "b": [1,\n2,]}'
+        with self.assertRaises(json.JSONDecodeError) as expected:
+            json.loads(text)
+        with self.assertRaises(json.JSONDecodeError) as raised:
+            payload_stream.load_payload(io.StringIO(text), 2)
+        self.assertEqual((raised.exception.lineno, raised.exception.colno, raised.exception.pos),
+                         (expected.exception.lineno, expected.exception.colno, expected.exception.pos))
+    
+    def test_close_payload_ignores_other_values(self):
+        for payload in ([1], 'text', None):
+            payload_stream.close_payload(payload)
+
+if __name__ == '__main__':
+    unittest.main()